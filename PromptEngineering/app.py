@@ -8,16 +8,16 @@ import subprocess
 import base64
 import time
 import tempfile
+import json
+import hashlib
 
 from pathlib import Path
 from flask import (
     Flask, render_template_string, jsonify, request,
-    abort, url_for, send_file, Response, make_response
+    abort, url_for, send_file, Response, make_response, stream_with_context, g
 )
 from flask_cors import CORS, cross_origin
-from pdf_utils import cleanup_old_pdfs
 
-import fitz  # PyMuPDF
 from elevenlabs import ElevenLabs
 import google.generativeai as genai
 try:
@@ -25,31 +25,44 @@ try:
 except Exception:
     google_speech = None
 
-def extract_pdf_text(pdf_path):
-    """Extract all text content from a PDF file"""
+def extract_pdf_text(pdf_path, doc_id=None):
+    """Extract all text content from a PDF file (via its shared parsed artifact)"""
     try:
-        doc = fitz.open(pdf_path)
-        full_text = ""
-        for page_num in range(doc.page_count):
-            page = doc.load_page(page_num)
-            page_text = page.get_text()
-            full_text += page_text + "\n\n"
-        doc.close()
-        return full_text.strip()
+        return get_parsed_document(pdf_path, doc_id).full_text()
     except Exception as e:
         logging.error(f"Failed to extract text from PDF: {e}")
         return ""
 
-from rag import reload_rag_model, get_contextual_definition, chat_with_doc
-from data_extraction import extract_sections
+from rag import (
+    reload_rag_model, get_contextual_definition, get_contextual_definitions,
+    chat_with_doc, stream_chat_with_doc, chat_with_doc_hindi, stream_chat_with_doc_hindi,
+    DocumentLoading
+)
+from parsed_document import get_parsed_document
+from doc_registry import file_sha256
+from mindmap_cache import get_mindmap_cache
+from mindmap_mapreduce import summarize_sections, use_map_reduce
+from mindmap_stream import MindMapStreamParser
+from tts_cache import StandInTTSClient, get_tts_cache, tts_key
+from tts_pipeline import get_tts_metrics, pipelined_audio, split_segments, use_pipeline
+from disk_cache import get_disk_cache
+from load_jobs import LoadQueueFull, get_load_jobs
+from prefetch import get_prefetcher
 from Research_paper_function import generate_short_query
 from Search_Papers_Arvix import search_arxiv_papers
-from pdf_utils import ensure_pdf_loaded, current_pdf_path, model_loading, download_pdf
+from pdf_utils import PDFTooLarge
+from sessions import get_sessions
 from API_KEY import ELEVENLABS_API_KEY
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # ─── Flask Setup ───────────────────────────────────────────────────────────────
 app = Flask(__name__)
+# Reverse proxies in front of the app (Cloud Run: 1). Only then is the
+# client address taken from X-Forwarded-For; clients can forge the header.
+PROXY_HOPS = int(os.environ.get("PROXY_HOPS", "0"))
+if PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
 # Permissive CORS for Cloud Run + local dev (no credentials with wildcard)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "*"]}}, supports_credentials=False)
 logging.basicConfig(level=logging.INFO)
@@ -62,7 +75,7 @@ def _handle_preflight():
         resp.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
         resp.headers['Vary'] = 'Origin'
         resp.headers['Access-Control-Allow-Headers'] = request.headers.get(
-            'Access-Control-Request-Headers', 'Content-Type, Authorization'
+            'Access-Control-Request-Headers', 'Content-Type, Authorization, X-Session-Id'
         )
         resp.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
         return resp
@@ -75,34 +88,79 @@ def _add_cors_headers(resp):
         resp.headers.setdefault('Access-Control-Allow-Origin', origin)
         resp.headers.setdefault('Vary', 'Origin')
         resp.headers.setdefault('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        resp.headers.setdefault('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        resp.headers.setdefault('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Session-Id')
     except Exception:
         pass
     return resp
 
-def start_cleanup_thread(interval=30, max_age=60):
-    def run_cleanup():
-        while True:
-            cleanup_old_pdfs(max_age=max_age)
-            time.sleep(interval)
-
-    thread = threading.Thread(target=run_cleanup, daemon=True)
-    thread.start()
+# ─── Sessions ──────────────────────────────────────────────────────────────────
+def current_session():
+    """
+    The caller's DocumentSession. Clients identify themselves with an
+    X-Session-Id header (or ?session= / {"sessionId": ...}); the frontend
+    sends a random per-tab id. Legacy clients without one fall back to a
+    client id derived from address and user agent.
+    """
+    if 'doc_session' not in g:
+        data = request.get_json(silent=True) if request.is_json else None
+        sid = (request.headers.get('X-Session-Id') or request.args.get('session')
+               or (data or {}).get('sessionId') or '').strip()
+        if not sid:
+            # remote_addr honours X-Forwarded-For only behind PROXY_HOPS trusted proxies
+            addr = request.remote_addr or ''
+            agent = request.headers.get('User-Agent', '')
+            sid = "client-" + hashlib.sha256(f"{addr}|{agent}".encode("utf-8")).hexdigest()[:32]
+        g.doc_session = get_sessions().get(sid[:128])
+    return g.doc_session
 
 # ─── PDF + RAG Utility ─────────────────────────────────────────────────────────
-def process_text(selection: str):
-    return {"analysis": get_contextual_definition(selection)}
+def process_text(selection: str, doc_id: str):
+    return {"analysis": get_contextual_definition(selection, doc_id)}
+
+# ─── Server-Sent Events ────────────────────────────────────────────────────────
+def wants_stream(data: dict) -> bool:
+    """Opt-in streaming: ?stream=1, {"stream": true} or Accept: text/event-stream."""
+    flag = str(request.args.get('stream') or data.get('stream') or '').strip().lower()
+    return flag in ('1', 'true', 'yes') or 'text/event-stream' in (request.headers.get('Accept') or '')
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def loading_response(e: DocumentLoading):
+    """503 for a document that is re-indexing; the client retries."""
+    return jsonify(error=str(e), status="loading"), 503, {"Retry-After": "5"}
+
+def sse_response(events):
+    """Wrap an iterator of (event, data) pairs as a text/event-stream response."""
+    def generate():
+        try:
+            for event, data in events:
+                yield sse_event(event, data)
+        except DocumentLoading as e:
+            yield sse_event("error", {"error": str(e), "status": "loading"})
+        except Exception as e:
+            logging.exception("SSE stream failed")
+            yield sse_event("error", {"error": str(e)})
+
+    headers = {
+        "Cache-Control": "no-cache",
+        # keep proxies (nginx, Cloud Run) from buffering the stream
+        "X-Accel-Buffering": "no",
+    }
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
 
 # ─── PDF / RAG Routes ──────────────────────────────────────────────────────────
 @app.route('/pdf')
 def serve_pdf():
-    if model_loading or current_pdf_path is None:
+    session = current_session()
+    if session.loading or session.pdf_path is None:
         # client can retry after a bit
         return jsonify({"status": "loading"}), 202
     
     try:
         # Add proper headers for PDF serving
-        response = send_file(current_pdf_path, mimetype='application/pdf')
+        get_disk_cache().touch(session.pdf_path)
+        response = send_file(session.pdf_path, mimetype='application/pdf')
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = 'inline; filename="research_paper.pdf"'
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
@@ -120,7 +178,29 @@ def handle_selection():
     if not selection:
         return jsonify(error="Empty selection"), 400
     try:
-        return jsonify(process_text(selection))
+        return jsonify(process_text(selection, current_session().doc_id))
+    except DocumentLoading as e:
+        return loading_response(e)
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+
+# Upper bound on highlights explained by one /process-selections request
+MAX_BATCH_SELECTIONS = 50
+
+@app.route('/process-selections', methods=['POST'])
+def handle_selections():
+    """Batch /process-selection: {"texts": [...]} -> {"results": [{term, analysis, page, cached}]}"""
+    data  = request.get_json(silent=True) or {}
+    texts = data.get('texts') or []
+    if not isinstance(texts, list) or not any(isinstance(t, str) and t.strip() for t in texts):
+        return jsonify(error="Provide a non-empty 'texts' list"), 400
+    texts = [t for t in texts if isinstance(t, str)]
+    if len(texts) > MAX_BATCH_SELECTIONS:
+        return jsonify(error=f"At most {MAX_BATCH_SELECTIONS} selections per request"), 400
+    try:
+        return jsonify(results=get_contextual_definitions(texts, current_session().doc_id))
+    except DocumentLoading as e:
+        return loading_response(e)
     except Exception as e:
         return jsonify(error=str(e)), 500
 
@@ -128,18 +208,24 @@ def handle_selection():
 def ask_question():
     data     = request.get_json(silent=True) or {}
     question = data.get('question','').strip()
-    pdf_url  = data.get('pdfUrl', current_pdf_link).strip()
+    session  = current_session()
 
     if not question:
         return jsonify(error="Question cannot be empty"), 400
 
+    if wants_stream(data):
+        # meta (page/snippet/anchors) -> token... -> done (timing)
+        return sse_response(stream_chat_with_doc(question, session.doc_id))
+
     try:
-        answer = chat_with_doc(question)
+        answer = chat_with_doc(question, session.doc_id)
         # Support both legacy string and new dict reply with page number
         if isinstance(answer, dict):
-            return jsonify(answer=answer.get("text"), page=answer.get("page"), snippet=answer.get("snippet"), anchors=answer.get("anchors"))
+            return jsonify(answer=answer.get("text"), page=answer.get("page"), snippet=answer.get("snippet"), anchors=answer.get("anchors"), coverage=answer.get("coverage"))
         else:
             return jsonify(answer=answer, page=None)
+    except DocumentLoading as e:
+        return loading_response(e)
     except Exception as e:
         return jsonify(error=str(e)), 500
 
@@ -153,23 +239,64 @@ def update_pdf():
     if not new_link:
         return jsonify(error="Missing 'link'"), 400
 
-    # synchronously download + reload
+    # Shares the download + reload with any request already loading this URL;
+    # the session switches to the paper once it is searchable
+    session = current_session()
     try:
-        downloaded = download_pdf(new_link)
-        abs_path   = os.path.abspath(downloaded)
-        if not os.path.isfile(abs_path):
-            return jsonify(error=f"PDF missing at {abs_path}"), 500
-
-        global current_pdf_link, current_pdf_path
-        current_pdf_link = new_link
-        current_pdf_path = abs_path
-        reload_rag_model(current_pdf_path)
-        logging.info("✅ RAG model reloaded.")
-        return jsonify(message="PDF & model updated"), 200
+        job = get_sessions().load(session, new_link, on_ready=_on_document_opened)
+    except LoadQueueFull as e:
+        return jsonify(error=str(e)), 503, {"Retry-After": "5"}
 
-    except Exception as e:
-        logging.exception("Error updating PDF")
-        return jsonify(error=str(e)), 500
+    if wants_stream(data):
+        # progress... -> done | failed | cancelled
+        return sse_response(job.events())
+
+    if not wants_blocking(data):
+        # Poll /load-jobs/<id> or stream /load-jobs/<id>/events for progress
+        return jsonify(
+            message="PDF load started",
+            job_id=job.job_id,
+            status_url=url_for('load_job_status', job_id=job.job_id),
+            events_url=url_for('load_job_events', job_id=job.job_id),
+        ), 202
+
+    # Legacy behaviour: answer once the document is searchable
+    job.ready.wait()
+    if job.state == "cancelled" or session.pending_url not in (None, new_link):
+        return jsonify(error="Superseded by a newer /update-pdf", job_id=job.job_id), 409
+    if job.state == "failed":
+        status = 413 if isinstance(job.exception, PDFTooLarge) else 500
+        return jsonify(error=job.error, job_id=job.job_id), status
+    logging.info("✅ RAG model reloaded.")
+    return jsonify(message="PDF & model updated", job_id=job.job_id), 200
+
+def wants_blocking(data: dict) -> bool:
+    """Opt-in synchronous /update-pdf: ?wait=1 or {"wait": true}."""
+    flag = str(request.args.get('wait') or data.get('wait') or '').strip().lower()
+    return flag in ('1', 'true', 'yes')
+
+def _on_document_opened(job):
+    """A session has switched to the job's document."""
+    prefetcher = get_prefetcher()
+    if prefetcher:
+        prefetcher.on_open(job)
+
+@app.route('/load-jobs/<job_id>', methods=['GET'])
+def load_job_status(job_id):
+    """Poll a document load: state plus per-stage progress (download, extract, embed, index)."""
+    # Answers for jobs running in any worker, not just this one
+    status = get_load_jobs().status(job_id)
+    if status is None:
+        return jsonify(error="Unknown job id"), 404
+    return jsonify(status)
+
+@app.route('/load-jobs/<job_id>/events', methods=['GET'])
+def load_job_events(job_id):
+    """SSE feed of a document load: progress events, then done | failed | cancelled."""
+    events = get_load_jobs().events(job_id)
+    if events is None:
+        return jsonify(error="Unknown job id"), 404
+    return sse_response(events)
 
 @app.route('/')
 def index():
@@ -177,32 +304,46 @@ def index():
     return jsonify({
         "message": "ResearchAI Backend API",
         "status": "running",
-        "pdf_loaded": current_pdf_path is not None,
-        "pdf_path": current_pdf_path,
+        "pdf_loaded": current_session().pdf_path is not None,
+        "pdf_path": current_session().pdf_path,
         "frontend": "Please use the React frontend at http://localhost:3000",
         "endpoints": {
             "search": "/search",
             "pdf": "/pdf", 
             "process-selection": "/process-selection",
+            "process-selections": "/process-selections",
             "ask": "/ask",
             "mindmap": "/mindmap",
             "update-pdf": "/update-pdf",
+            "load-jobs": "/load-jobs/<job_id>",
             "log-click": "/log-click",
             "transcribe": "/transcribe",
-            "tts": "/tts"
+            "tts": "/tts",
+            "tts-metrics": "/tts-metrics/<request_id>"
         }
     })
 
 @app.route('/health')
 def health_check():
+    session = current_session()
     return jsonify({
         "status": "healthy",
-        "pdf_loaded": current_pdf_path is not None,
-        "model_loading": model_loading,
-        "pdf_path": current_pdf_path
+        "pdf_loaded": session.pdf_path is not None,
+        "model_loading": session.loading,
+        "pdf_path": session.pdf_path,
+        "sessions": get_sessions().stats(),
+        "mindmap_cache": get_mindmap_cache().stats(),
+        "tts_cache": get_tts_cache().stats(),
+        "tts": get_tts_metrics().stats()
     })
 
 # ─── Mind Map Generation Route ────────────────────────────────────────────────
+# Document mind maps are cached per (content hash, scope, prompt version,
+# model); bump a version whenever its prompt or parsing changes.
+MINDMAP_MODEL = "gemini-2.5-flash-lite"
+MINDMAP_DOCUMENT_PROMPT_VERSION = "2"     # /mindmap scope=document
+MINDMAP_STRUCTURE_PROMPT_VERSION = "2"    # /generate-mindmap
+
 @app.route('/mindmap', methods=['POST'])
 @cross_origin()
 def generate_mindmap_route():
@@ -288,25 +429,43 @@ def generate_mindmap_route():
                 root = (summary_text.split(".")[0] or "Paper").strip() or "Paper"
                 return {"nodes": [{"id": root, "group": 0, "label": root}], "links": []}
 
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
+        model = genai.GenerativeModel(MINDMAP_MODEL)
 
         if scope == 'document':
-            if current_pdf_path is None:
+            session = current_session()
+            if session.pdf_path is None:
                 return jsonify(error="No PDF loaded"), 400
-            try:
-                full_text = extract_pdf_text(current_pdf_path)
+
+            def build():
+                try:
+                    doc = get_parsed_document(session.pdf_path, session.doc_id)
+                    full_text = doc.full_text()
+                except Exception as e:
+                    logging.exception("PDF text extraction failed: %s", e)
+                    raise ValueError("Failed to extract text from PDF") from e
                 if not full_text or len(full_text.strip()) < 50:
-                    return jsonify(error="Unable to extract sufficient text from PDF"), 500
-            except Exception as e:
-                logging.exception("PDF text extraction failed: %s", e)
-                return jsonify(error="Failed to extract text from PDF"), 500
-
-            prompt = build_prompt_from_text(full_text[:6000])
-            resp = model.generate_content(prompt)
-            output_text = (resp.text or '').strip()
-            summary, mindmap_md = parse_summary_and_md(output_text)
-            graph = parse_mindmap_to_graph(mindmap_md, summary)
-            return jsonify(summary=summary, mindmap_md=mindmap_md, graph=graph)
+                    raise ValueError("Unable to extract sufficient text from PDF")
+
+                # Long papers: summarise every section instead of cutting at 6000 chars
+                if use_map_reduce(full_text, 6000):
+                    prompt = build_prompt_from_text(summarize_sections(doc, MINDMAP_MODEL))
+                else:
+                    prompt = build_prompt_from_text(full_text[:6000])
+                resp = model.generate_content(prompt)
+                output_text = (resp.text or '').strip()
+                summary, mindmap_md = parse_summary_and_md(output_text)
+                graph = parse_mindmap_to_graph(mindmap_md, summary)
+                # An empty reply only produced the placeholder map; try again next time
+                return {"summary": summary, "mindmap_md": mindmap_md, "graph": graph}, bool(output_text)
+
+            doc_id = session.doc_id or file_sha256(session.pdf_path)
+            try:
+                result, cached = get_mindmap_cache().get_or_create(
+                    doc_id, "document", MINDMAP_DOCUMENT_PROMPT_VERSION, MINDMAP_MODEL, build
+                )
+            except ValueError as e:
+                return jsonify(error=str(e)), 500
+            return jsonify(cached=cached, **result)
 
         # selection flow
         text = (data.get('text') or '').strip()
@@ -335,6 +494,10 @@ def search_arxiv():
     # 1) shorten prompt, 2) run arxiv query
     short_q = generate_short_query(searchTerm)
     results = search_arxiv_papers(short_q)
+    prefetcher = get_prefetcher()
+    if prefetcher:
+        # Most users open one of the top results; start on them now
+        prefetcher.on_search(results)
     return jsonify(results=results, user_prompt=searchTerm)
 
 @app.route("/log-click", methods=["POST"])
@@ -347,9 +510,18 @@ def log_click():
         global search_link
         search_link = url
         logging.info("User clicked on: %s - %s", title, url)
+        prefetcher = get_prefetcher()
+        if prefetcher:
+            prefetcher.on_click(url)
         return jsonify(message="Click logged"), 200
     return jsonify(error="Missing url/title"), 400
 
+@app.route("/prefetch-stats", methods=["GET"])
+def prefetch_stats():
+    """Prefetch hit rate, latency saved and budget usage."""
+    prefetcher = get_prefetcher()
+    return jsonify(prefetcher.stats() if prefetcher else {"enabled": False})
+
 @app.route("/transcribe", methods=["POST"])
 @cross_origin()
 def transcribe_audio():
@@ -494,60 +666,54 @@ def transcribe_audio():
         return jsonify(error=f"Server error: {str(e)}"), 500
 
 
-def _translate_text(text: str, target_lang: str) -> str:
-    try:
-        tgt = (target_lang or '').strip().lower()
-        if not text:
-            return ''
-        # Simple translate prompt; model already configured in rag.py import
-        prompt = f"""
-You are a translator. Translate the following text into {tgt}.
-Preserve meaning and tone. Output only the translated text with no notes.
-
-Text:
-{text}
-"""
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
-        resp = model.generate_content(prompt)
-        return (resp.text or '').strip()
-    except Exception:
-        logging.exception("Translation failed")
-        return text
-
-
 @app.route('/ask-hindi', methods=['POST'])
 def ask_hindi():
     data = request.get_json(silent=True) or {}
     question_hi = (data.get('question_hi') or '').strip()
     if not question_hi:
         return jsonify(error="Question cannot be empty"), 400
+    # One retrieval and one generation that returns the Hindi and English
+    # answers together, instead of translate -> answer -> translate
+    if wants_stream(data):
+        return sse_response(stream_chat_with_doc_hindi(question_hi, current_session().doc_id))
     try:
-        # hi -> en
-        question_en = _translate_text(question_hi, 'en')
-        ans = chat_with_doc(question_en)
-        if isinstance(ans, dict):
-            answer_en = ans.get('text') or ''
-            page = ans.get('page')
-            snippet = ans.get('snippet')
-            anchors = ans.get('anchors')
-        else:
-            answer_en = str(ans)
-            page = None
-            snippet = None
-            anchors = None
-        # en -> hi
-        answer_hi = _translate_text(answer_en, 'hi')
+        ans = chat_with_doc_hindi(question_hi, current_session().doc_id)
         return jsonify(
-            answer_hi=answer_hi,
-            answer_en=answer_en,
-            page=page,
-            snippet=snippet,
-            anchors=anchors
+            answer_hi=ans['answer_hi'],
+            answer_en=ans['answer_en'],
+            page=ans.get('page'),
+            snippet=ans.get('snippet'),
+            anchors=ans.get('anchors'),
+            coverage=ans.get('coverage'),
+            timing=ans.get('timing')
         )
+    except DocumentLoading as e:
+        return loading_response(e)
     except Exception as e:
         logging.exception("/ask-hindi failed")
         return jsonify(error=str(e)), 500
 
+# TTS_CLIENT=standin swaps ElevenLabs for an offline stand-in (tests, benchmarks)
+TTS_CLIENT = os.environ.get("TTS_CLIENT", "elevenlabs").strip().lower()
+# How long browsers may replay a cached clip without revalidating
+TTS_CLIENT_MAX_AGE = int(os.environ.get("TTS_CLIENT_MAX_AGE", "86400"))
+
+def tts_client():
+    if TTS_CLIENT == "standin":
+        return StandInTTSClient()
+    return ElevenLabs(api_key=ELEVENLABS_API_KEY)
+
+def _tts_headers(record, **extra):
+    """Response headers naming the request's metrics record (/tts-metrics/<id>)."""
+    headers = {
+        "X-TTS-Request-Id": record["request_id"],
+        "X-TTS-Mode": record["mode"],
+        "X-TTS-Segments": str(record["segments"]),
+        "Access-Control-Expose-Headers": "X-TTS-Request-Id, X-TTS-Mode, X-TTS-Segments, X-TTS-Cache, X-Voice-Id",
+    }
+    headers.update(extra)
+    return headers
+
 @app.route("/tts", methods=["POST", "GET"])
 @cross_origin()
 def synthesize_tts():
@@ -558,6 +724,7 @@ def synthesize_tts():
                         os.environ.get("ELEVENLABS_VOICE_ID") or
                         "21m00Tcm4TlvDq8ikWAM")
             model_id = (request.args.get('model_id') or 'eleven_multilingual_v2')
+            pipeline = request.args.get('pipeline')
         else:
             data = request.get_json(silent=True) or {}
             text = (data.get('text') or '').strip()
@@ -565,30 +732,62 @@ def synthesize_tts():
                         os.environ.get("ELEVENLABS_VOICE_ID") or
                         "21m00Tcm4TlvDq8ikWAM")  # Default: Rachel
             model_id = (data.get('model_id') or 'eleven_multilingual_v2')
+            pipeline = data.get('pipeline')
 
         if not text:
             return jsonify(error="Missing 'text'"), 400
 
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+        # lower bitrate for faster start/playback
+        output_format = "mp3_22050_32"
+        key = tts_key(text, voice_id, model_id, output_format)
+        tts_cache = get_tts_cache()
+        metrics = get_tts_metrics()
+
+        # Replays come from disk: strong ETag (304 on revalidation) and Range
+        cached_path = tts_cache.lookup(key, output_format)
+        if cached_path:
+            record = metrics.start("hit", len(text))
+            response = send_file(cached_path, mimetype="audio/mpeg", conditional=True, etag=key,
+                                 max_age=TTS_CLIENT_MAX_AGE)
+            response.cache_control.public = False
+            response.cache_control.private = True
+            response.headers.update(_tts_headers(record, **{"X-Voice-Id": voice_id, "X-TTS-Cache": "hit"}))
+            metrics.first_byte(record)
+            metrics.finish(record)
+            return response
+
+        client = tts_client()
+        # Not cacheable by the client until the clip is complete on disk
+        headers = {"Cache-Control": "no-cache", "X-Voice-Id": voice_id, "X-TTS-Cache": "miss"}
+
+        # Long texts: sentence groups synthesized ahead, streamed in order, cached per
+        # segment; the stitched clip is also cached under the whole text's key, so a
+        # replay is a file hit (and is finished in the background if the client leaves)
+        if pipeline is not None:
+            pipeline = str(pipeline).strip().lower() in ('1', 'true', 'yes')
+        if use_pipeline(text, pipeline):
+            segments = split_segments(text)
+            if len(segments) > 1:
+                record = metrics.start("pipeline", len(text), len(segments))
+                audio = pipelined_audio(client, tts_cache, segments, voice_id, model_id, output_format,
+                                        metrics=metrics, record=record)
+                audio = tts_cache.tee(key, output_format, audio)
+                return Response(metrics.observe(record, audio), mimetype="audio/mpeg",
+                                headers=_tts_headers(record, **headers))
 
         try:
+            record = metrics.start("single", len(text))
             audio_stream = client.text_to_speech.convert(
                 voice_id=voice_id,
                 model_id=model_id,
                 text=text,
-                # lower bitrate for faster start/playback
-                output_format="mp3_22050_32",
+                output_format=output_format,
             )
 
-            def generate():
-                for chunk in audio_stream:
-                    yield chunk
-
-            headers = {
-                "Cache-Control": "no-store",
-                "X-Voice-Id": voice_id,
-            }
-            return Response(generate(), mimetype="audio/mpeg", headers=headers)
+            # Streamed as it is synthesized and written to the cache at the same time
+            audio = tts_cache.tee(key, output_format, audio_stream)
+            return Response(metrics.observe(record, audio), mimetype="audio/mpeg",
+                            headers=_tts_headers(record, **headers))
 
         except Exception as e:
             logging.error(f"ElevenLabs TTS error: {e}")
@@ -598,25 +797,41 @@ def synthesize_tts():
         logging.error(f"TTS endpoint error: {e}")
         return jsonify(error=f"Server error: {str(e)}"), 500
 
+@app.route("/tts-metrics", methods=["GET"])
+@app.route("/tts-metrics/<request_id>", methods=["GET"])
+def tts_metrics(request_id=None):
+    """Timings of one /tts request (id from its X-TTS-Request-Id header), or the recent summary."""
+    metrics = get_tts_metrics()
+    if request_id is None:
+        return jsonify(metrics.stats())
+    record = metrics.get(request_id)
+    if record is None:
+        return jsonify(error="Unknown request id"), 404
+    return jsonify(record)
+
 @app.route("/generate-mindmap", methods=["POST"])
 @cross_origin()
 def generate_mindmap_json():
     """Generate a mind map structure from the research paper"""
     try:
         data = request.get_json(silent=True) or {}
-        pdf_url = data.get('pdfUrl', current_pdf_path)
+        session = current_session()
         
-        logging.info(f"Mind map generation requested. PDF path: {current_pdf_path}")
-        logging.info(f"PDF exists: {os.path.exists(current_pdf_path) if current_pdf_path else False}")
+        logging.info(f"Mind map generation requested. PDF path: {session.pdf_path}")
+        logging.info(f"PDF exists: {os.path.exists(session.pdf_path) if session.pdf_path else False}")
         
-        if not current_pdf_path:
+        if not session.pdf_path:
             return jsonify(error="No PDF loaded. Please load a PDF first."), 400
             
-        if not os.path.exists(current_pdf_path):
+        if not os.path.exists(session.pdf_path):
             return jsonify(error="PDF file not found. Please reload the PDF."), 400
         
+        # Progressive mode: nodes are sent as soon as the model has written them
+        if wants_stream(data):
+            return sse_response(stream_mindmap_structure(session.pdf_path, session.doc_id))
+        
         # Generate mind map structure using AI
-        mindmap_data = generate_mindmap_structure(current_pdf_path)
+        mindmap_data = generate_mindmap_structure(session.pdf_path, session.doc_id)
         
         logging.info(f"Mind map generated successfully with {len(mindmap_data.get('children', []))} main nodes")
         return jsonify(mindMap=mindmap_data), 200
@@ -627,179 +842,206 @@ def generate_mindmap_json():
         logging.error(f"Full traceback: {traceback.format_exc()}")
         return jsonify(error=f"Failed to generate mind map: {str(e)}"), 500
 
-def generate_mindmap_structure(pdf_path):
-    """Generate a hierarchical mind map structure from PDF content"""
+def generate_mindmap_structure(pdf_path, doc_id=None):
+    """Hierarchical mind map for a PDF, served from the mind map cache when possible"""
+    try:
+        mindmap_data, cached = get_mindmap_cache().get_or_create(
+            doc_id or file_sha256(pdf_path), "structure", MINDMAP_STRUCTURE_PROMPT_VERSION, MINDMAP_MODEL,
+            lambda: build_mindmap_structure(pdf_path, doc_id),
+        )
+        if cached:
+            logging.info("Mind map served from cache")
+        return mindmap_data
+    except Exception as e:
+        logging.error(f"Error generating mind map structure: {e}")
+        import traceback
+        logging.error(f"Full traceback: {traceback.format_exc()}")
+        return create_fallback_mindmap("")
+
+def mindmap_structure_prompt(pdf_path, doc_id=None):
+    """(full text, mind map prompt) for a PDF; the prompt is None when there is too little text"""
+    logging.info(f"Extracting text from PDF: {pdf_path}")
+    
+    # Page texts come from the shared parsed artifact; no PDF parsing on repeat calls
+    doc = get_parsed_document(pdf_path, doc_id)
+    full_text = doc.full_text(page_markers=True)
+    
+    logging.info(f"Extracted {len(full_text)} characters from PDF")
+    
+    if len(full_text.strip()) < 100:
+        logging.warning("PDF text extraction resulted in very little text, using fallback")
+        return full_text, None
+    
+    # Papers longer than the prompt window are mapped section by section
+    # and the model builds the mind map from the summaries
+    if use_map_reduce(full_text, 10000):
+        content_label = "Paper content (section-by-section summaries of the full paper)"
+        content = summarize_sections(doc, MINDMAP_MODEL)
+    else:
+        content_label = "Paper content (first 10000 characters)"
+        content = full_text[:10000]
+    
+    # Use AI to analyze and structure the content
+    prompt = f"""
+    Analyze this research paper and create a comprehensive mind map with 9-10 detailed nodes covering 
+    the most important concepts, methods, findings, and contributions. Extract specific concepts, 
+    techniques, algorithms, datasets, results, and their relationships.
+    
+    Create nodes for:
+    1. Main research problem/objective
+    2. Key methodology/approach used
+    3. Specific techniques/algorithms mentioned
+    4. Datasets or experimental setup
+    5. Main results/findings
+    6. Performance metrics/evaluation
+    7. Novel contributions
+    8. Applications/use cases
+    9. Limitations/challenges
+    10. Future work/improvements
+    
+    Return ONLY a valid JSON object with this structure:
+    {{
+        "id": "root",
+        "title": "Research Paper Title",
+        "description": "Brief description of the paper's main contribution",
+        "importance": 1.0,
+        "color": "#1e40af",
+        "bulletPoints": ["Main contribution 1", "Main contribution 2", "Key innovation"],
+        "keyPoints": ["Primary research goal", "Novel approach"],
+        "connections": ["problem_statement", "methodology", "results"],
+        "children": [
+            {{
+                "id": "problem_statement",
+                "title": "Research Problem",
+                "description": "The specific problem being addressed",
+                "importance": 0.95,
+                "color": "#7c3aed",
+                "bulletPoints": ["Specific problem description", "Why this problem matters", "Current challenges", "Research motivation"],
+                "keyPoints": ["Core research question", "Problem significance", "Gap in existing work"],
+                "connections": ["related_work", "methodology", "contributions"]
+            }},
+            {{
+                "id": "related_work",
+                "title": "Related Work",
+                "description": "Previous research and literature",
+                "importance": 0.7,
+                "color": "#a855f7",
+                "bulletPoints": ["Previous approaches", "Literature gaps", "Building upon existing work", "State-of-the-art methods"],
+                "keyPoints": ["Research foundation", "Literature gaps"],
+                "connections": ["problem_statement", "methodology"]
+            }},
+            {{
+                "id": "methodology",
+                "title": "Methodology",
+                "description": "Research approach and methods",
+                "importance": 0.9,
+                "color": "#0891b2",
+                "bulletPoints": ["Research framework", "Data collection methods", "Analysis techniques", "Tools and frameworks used"],
+                "keyPoints": ["Novel methodological approach", "Research design", "Technical approach"],
+                "connections": ["problem_statement", "experimental_setup", "algorithms", "results"]
+            }},
+            {{
+                "id": "algorithms",
+                "title": "Algorithms/Techniques",
+                "description": "Specific algorithms or techniques used",
+                "importance": 0.85,
+                "color": "#06b6d4",
+                "bulletPoints": ["Specific algorithms mentioned", "Technical implementation", "Computational methods", "Processing steps"],
+                "keyPoints": ["Technical contributions", "Algorithm details"],
+                "connections": ["methodology", "experimental_setup", "results"]
+            }},
+            {{
+                "id": "experimental_setup",
+                "title": "Experimental Setup",
+                "description": "Datasets, experiments, and evaluation",
+                "importance": 0.8,
+                "color": "#0ea5e9",
+                "bulletPoints": ["Datasets used", "Experimental configuration", "Evaluation metrics", "Baseline comparisons"],
+                "keyPoints": ["Experimental design", "Data sources"],
+                "connections": ["methodology", "algorithms", "results", "performance"]
+            }},
+            {{
+                "id": "results",
+                "title": "Results",
+                "description": "Main findings and outcomes",
+                "importance": 1.0,
+                "color": "#059669",
+                "bulletPoints": ["Primary results", "Key findings", "Unexpected discoveries", "Statistical outcomes"],
+                "keyPoints": ["Main contributions", "Significant outcomes", "Research impact"],
+                "connections": ["methodology", "performance", "contributions", "applications"]
+            }},
+            {{
+                "id": "performance",
+                "title": "Performance Metrics",
+                "description": "Evaluation results and metrics",
+                "importance": 0.85,
+                "color": "#10b981",
+                "bulletPoints": ["Performance metrics", "Accuracy results", "Comparison with baselines", "Statistical significance"],
+                "keyPoints": ["Evaluation results", "Performance analysis"],
+                "connections": ["results", "experimental_setup", "contributions"]
+            }},
+            {{
+                "id": "contributions",
+                "title": "Novel Contributions",
+                "description": "New contributions and innovations",
+                "importance": 0.9,
+                "color": "#ea580c",
+                "bulletPoints": ["Novel contributions", "Innovations", "Technical advances", "Methodological improvements"],
+                "keyPoints": ["Research contributions", "Novel aspects"],
+                "connections": ["results", "applications", "limitations"]
+            }},
+            {{
+                "id": "applications",
+                "title": "Applications",
+                "description": "Practical applications and use cases",
+                "importance": 0.75,
+                "color": "#f59e0b",
+                "bulletPoints": ["Practical applications", "Use cases", "Real-world scenarios", "Industry relevance"],
+                "keyPoints": ["Practical impact", "Application domains"],
+                "connections": ["contributions", "results", "future_work"]
+            }},
+            {{
+                "id": "limitations",
+                "title": "Limitations",
+                "description": "Current limitations and challenges",
+                "importance": 0.6,
+                "color": "#dc2626",
+                "bulletPoints": ["Methodological limitations", "Data constraints", "Scope limitations", "Technical challenges"],
+                "keyPoints": ["Acknowledged limitations", "Research boundaries"],
+                "connections": ["contributions", "future_work"]
+            }},
+            {{
+                "id": "future_work",
+                "title": "Future Work",
+                "description": "Suggested future research directions",
+                "importance": 0.7,
+                "color": "#8b5cf6",
+                "bulletPoints": ["Next steps", "Potential improvements", "Research extensions", "Open problems"],
+                "keyPoints": ["Future research agenda", "Development opportunities"],
+                "connections": ["limitations", "applications"]
+            }}
+        ]
+    }}
+    
+    IMPORTANT: Each node MUST have detailed bulletPoints (at least 3-4 points) that explain the concept in detail.
+    Focus on extracting specific, concrete details from the paper content.
+    
+    {content_label}:
+    {content}
+    """
+    return full_text, prompt
+
+def build_mindmap_structure(pdf_path, doc_id=None):
+    """Generate a hierarchical mind map structure from PDF content; returns (mind map, cacheable)"""
     try:
-        import fitz  # PyMuPDF
         import json
         
-        logging.info(f"Extracting text from PDF: {pdf_path}")
-        
-        # Extract text from PDF
-        doc = fitz.open(pdf_path)
-        full_text = ""
-        for page_num, page in enumerate(doc):
-            page_text = page.get_text()
-            full_text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-        doc.close()
-        
-        logging.info(f"Extracted {len(full_text)} characters from PDF")
-        
-        if len(full_text.strip()) < 100:
-            logging.warning("PDF text extraction resulted in very little text, using fallback")
-            return create_fallback_mindmap("")
-        
-        # Use AI to analyze and structure the content
-        prompt = f"""
-        Analyze this research paper and create a comprehensive mind map with 9-10 detailed nodes covering 
-        the most important concepts, methods, findings, and contributions. Extract specific concepts, 
-        techniques, algorithms, datasets, results, and their relationships.
-        
-        Create nodes for:
-        1. Main research problem/objective
-        2. Key methodology/approach used
-        3. Specific techniques/algorithms mentioned
-        4. Datasets or experimental setup
-        5. Main results/findings
-        6. Performance metrics/evaluation
-        7. Novel contributions
-        8. Applications/use cases
-        9. Limitations/challenges
-        10. Future work/improvements
-        
-        Return ONLY a valid JSON object with this structure:
-        {{
-            "id": "root",
-            "title": "Research Paper Title",
-            "description": "Brief description of the paper's main contribution",
-            "importance": 1.0,
-            "color": "#1e40af",
-            "bulletPoints": ["Main contribution 1", "Main contribution 2", "Key innovation"],
-            "keyPoints": ["Primary research goal", "Novel approach"],
-            "connections": ["problem_statement", "methodology", "results"],
-            "children": [
-                {{
-                    "id": "problem_statement",
-                    "title": "Research Problem",
-                    "description": "The specific problem being addressed",
-                    "importance": 0.95,
-                    "color": "#7c3aed",
-                    "bulletPoints": ["Specific problem description", "Why this problem matters", "Current challenges", "Research motivation"],
-                    "keyPoints": ["Core research question", "Problem significance", "Gap in existing work"],
-                    "connections": ["related_work", "methodology", "contributions"]
-                }},
-                {{
-                    "id": "related_work",
-                    "title": "Related Work",
-                    "description": "Previous research and literature",
-                    "importance": 0.7,
-                    "color": "#a855f7",
-                    "bulletPoints": ["Previous approaches", "Literature gaps", "Building upon existing work", "State-of-the-art methods"],
-                    "keyPoints": ["Research foundation", "Literature gaps"],
-                    "connections": ["problem_statement", "methodology"]
-                }},
-                {{
-                    "id": "methodology",
-                    "title": "Methodology",
-                    "description": "Research approach and methods",
-                    "importance": 0.9,
-                    "color": "#0891b2",
-                    "bulletPoints": ["Research framework", "Data collection methods", "Analysis techniques", "Tools and frameworks used"],
-                    "keyPoints": ["Novel methodological approach", "Research design", "Technical approach"],
-                    "connections": ["problem_statement", "experimental_setup", "algorithms", "results"]
-                }},
-                {{
-                    "id": "algorithms",
-                    "title": "Algorithms/Techniques",
-                    "description": "Specific algorithms or techniques used",
-                    "importance": 0.85,
-                    "color": "#06b6d4",
-                    "bulletPoints": ["Specific algorithms mentioned", "Technical implementation", "Computational methods", "Processing steps"],
-                    "keyPoints": ["Technical contributions", "Algorithm details"],
-                    "connections": ["methodology", "experimental_setup", "results"]
-                }},
-                {{
-                    "id": "experimental_setup",
-                    "title": "Experimental Setup",
-                    "description": "Datasets, experiments, and evaluation",
-                    "importance": 0.8,
-                    "color": "#0ea5e9",
-                    "bulletPoints": ["Datasets used", "Experimental configuration", "Evaluation metrics", "Baseline comparisons"],
-                    "keyPoints": ["Experimental design", "Data sources"],
-                    "connections": ["methodology", "algorithms", "results", "performance"]
-                }},
-                {{
-                    "id": "results",
-                    "title": "Results",
-                    "description": "Main findings and outcomes",
-                    "importance": 1.0,
-                    "color": "#059669",
-                    "bulletPoints": ["Primary results", "Key findings", "Unexpected discoveries", "Statistical outcomes"],
-                    "keyPoints": ["Main contributions", "Significant outcomes", "Research impact"],
-                    "connections": ["methodology", "performance", "contributions", "applications"]
-                }},
-                {{
-                    "id": "performance",
-                    "title": "Performance Metrics",
-                    "description": "Evaluation results and metrics",
-                    "importance": 0.85,
-                    "color": "#10b981",
-                    "bulletPoints": ["Performance metrics", "Accuracy results", "Comparison with baselines", "Statistical significance"],
-                    "keyPoints": ["Evaluation results", "Performance analysis"],
-                    "connections": ["results", "experimental_setup", "contributions"]
-                }},
-                {{
-                    "id": "contributions",
-                    "title": "Novel Contributions",
-                    "description": "New contributions and innovations",
-                    "importance": 0.9,
-                    "color": "#ea580c",
-                    "bulletPoints": ["Novel contributions", "Innovations", "Technical advances", "Methodological improvements"],
-                    "keyPoints": ["Research contributions", "Novel aspects"],
-                    "connections": ["results", "applications", "limitations"]
-                }},
-                {{
-                    "id": "applications",
-                    "title": "Applications",
-                    "description": "Practical applications and use cases",
-                    "importance": 0.75,
-                    "color": "#f59e0b",
-                    "bulletPoints": ["Practical applications", "Use cases", "Real-world scenarios", "Industry relevance"],
-                    "keyPoints": ["Practical impact", "Application domains"],
-                    "connections": ["contributions", "results", "future_work"]
-                }},
-                {{
-                    "id": "limitations",
-                    "title": "Limitations",
-                    "description": "Current limitations and challenges",
-                    "importance": 0.6,
-                    "color": "#dc2626",
-                    "bulletPoints": ["Methodological limitations", "Data constraints", "Scope limitations", "Technical challenges"],
-                    "keyPoints": ["Acknowledged limitations", "Research boundaries"],
-                    "connections": ["contributions", "future_work"]
-                }},
-                {{
-                    "id": "future_work",
-                    "title": "Future Work",
-                    "description": "Suggested future research directions",
-                    "importance": 0.7,
-                    "color": "#8b5cf6",
-                    "bulletPoints": ["Next steps", "Potential improvements", "Research extensions", "Open problems"],
-                    "keyPoints": ["Future research agenda", "Development opportunities"],
-                    "connections": ["limitations", "applications"]
-                }}
-            ]
-        }}
-        
-        IMPORTANT: Each node MUST have detailed bulletPoints (at least 3-4 points) that explain the concept in detail.
-        Focus on extracting specific, concrete details from the paper content.
-        
-        Paper content (first 10000 characters):
-        {full_text[:10000]}
-        """
+        full_text, prompt = mindmap_structure_prompt(pdf_path, doc_id)
+        if prompt is None:
+            return create_fallback_mindmap(""), False
         
         logging.info("Sending prompt to AI model for mind map generation")
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
+        model = genai.GenerativeModel(MINDMAP_MODEL)
         response = model.generate_content(prompt)
         
         logging.info(f"AI response received: {len(response.text)} characters")
@@ -816,18 +1058,76 @@ def generate_mindmap_structure(pdf_path):
             
             mindmap_data = json.loads(response_text)
             logging.info("Successfully parsed AI-generated mind map")
-            return mindmap_data
+            return mindmap_data, True
         except json.JSONDecodeError as e:
             logging.error(f"JSON parsing failed: {e}")
             logging.error(f"Response text: {response.text[:500]}...")
-            # Fallback structure if JSON parsing fails
-            return create_fallback_mindmap(full_text)
+            # Salvage the nodes that do parse, repairing or skipping the broken ones
+            parser = MindMapStreamParser()
+            parser.feed(response.text)
+            mindmap_data = parser.result()
+            if mindmap_data is not None and mindmap_data["children"]:
+                logging.info(f"Recovered {len(mindmap_data['children'])} nodes ({parser.skipped} skipped)")
+                return mindmap_data, False
+            # Fallback structure if nothing can be recovered
+            return create_fallback_mindmap(full_text), False
             
     except Exception as e:
         logging.error(f"Error generating mind map structure: {e}")
         import traceback
         logging.error(f"Full traceback: {traceback.format_exc()}")
-        return create_fallback_mindmap("")
+        return create_fallback_mindmap(""), False
+
+def stream_build_mindmap_structure(pdf_path, doc_id=None):
+    """
+    Streamed build_mindmap_structure: yields ("root"|"node"|"skipped", data)
+    as the model writes the JSON, then returns (mind map, cacheable)
+    """
+    full_text, prompt = mindmap_structure_prompt(pdf_path, doc_id)
+    if prompt is None:
+        return create_fallback_mindmap(""), False
+    
+    parser = MindMapStreamParser()
+    complete = False
+    try:
+        model = genai.GenerativeModel(MINDMAP_MODEL)
+        for chunk in model.generate_content(prompt, stream=True):
+            yield from parser.feed(getattr(chunk, "text", "") or "")
+        complete = True
+    except Exception as e:
+        # Keep whatever nodes already arrived
+        logging.error(f"Mind map stream interrupted: {e}")
+    
+    mindmap_data = parser.result()
+    if mindmap_data is None:
+        logging.error("Streamed mind map had no parseable root, using fallback")
+        return create_fallback_mindmap(full_text), False
+    logging.info(f"Streamed mind map with {len(mindmap_data['children'])} main nodes ({parser.skipped} skipped)")
+    return mindmap_data, complete and not parser.skipped
+
+def replay_mindmap(mindmap_data):
+    """The progressive events for a finished mind map: root first, then each child"""
+    yield "root", dict(mindmap_data, children=[])
+    for child in mindmap_data.get("children") or []:
+        yield "node", child
+
+def stream_mindmap_structure(pdf_path, doc_id=None):
+    """
+    SSE events for /generate-mindmap?stream=1: "root", one "node" per child
+    (or "skipped" for one that could not be repaired), then "done" with the
+    complete mind map, which the client should treat as authoritative
+    """
+    try:
+        for event, data in get_mindmap_cache().stream_or_create(
+            doc_id or file_sha256(pdf_path), "structure", MINDMAP_STRUCTURE_PROMPT_VERSION, MINDMAP_MODEL,
+            lambda: stream_build_mindmap_structure(pdf_path, doc_id), replay_mindmap,
+        ):
+            if event == "done":
+                data = {"mindMap": data["payload"], "cached": data["cached"]}
+            yield event, data
+    except Exception as e:
+        logging.error(f"Error streaming mind map structure: {e}")
+        yield "done", {"mindMap": create_fallback_mindmap(""), "cached": False}
 
 def create_fallback_mindmap(text):
     """Create a comprehensive mind map structure when AI generation fails"""
@@ -972,34 +1272,34 @@ def create_fallback_mindmap(text):
 @cross_origin()
 def test_mindmap():
     """Test endpoint to check mind map generation"""
+    session = current_session()
     try:
-        if not current_pdf_path:
+        if not session.pdf_path:
             return jsonify({
                 "status": "error",
                 "message": "No PDF loaded",
-                "pdf_path": current_pdf_path,
+                "pdf_path": session.pdf_path,
                 "pdf_exists": False
             }), 400
         
-        pdf_exists = os.path.exists(current_pdf_path)
+        pdf_exists = os.path.exists(session.pdf_path)
         return jsonify({
             "status": "success",
             "message": "PDF status check",
-            "pdf_path": current_pdf_path,
+            "pdf_path": session.pdf_path,
             "pdf_exists": pdf_exists,
-            "model_loading": model_loading
+            "model_loading": session.loading
         }), 200
         
     except Exception as e:
         return jsonify({
             "status": "error",
             "message": str(e),
-            "pdf_path": current_pdf_path
+            "pdf_path": session.pdf_path
         }), 500
 
 # ─── Startup ──────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
-      start_cleanup_thread()
       port = int(os.environ.get("PORT", 5001))
       app.run(host="0.0.0.0", port=port)
  
\ No newline at end of file
@@ -0,0 +1,96 @@
+# bm25_index.py
+# Per-document BM25 inverted index, built incrementally at ingest time so
+# queries never re-tokenize passages.
+import math
+import re
+import threading
+from array import array
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower())
+
+
+def top_k_from_scores(scores: np.ndarray, k: int) -> list:
+    """[(chunk_id, score)] of the k highest positive scores, best first."""
+    if not len(scores) or k <= 0:
+        return []
+    k = min(k, len(scores))
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx])]
+    return [(int(i), float(scores[i])) for i in idx if scores[i] > 0]
+
+
+class BM25Index:
+    """
+    Inverted index over a document's chunks.
+
+    Chunk ids are dense ints in insertion order (the same ids used for the
+    vector collection). Postings are two parallel typed arrays per term:
+    chunk ids and term frequencies; chunk lengths live in one array.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}            # term -> (array('I') chunk ids, array('H') tf)
+        self._lengths = array("I")
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, texts: list) -> None:
+        """Append chunks; their ids continue from the current length."""
+        with self._lock:
+            for text in texts:
+                chunk_id = len(self._lengths)
+                counts = {}
+                tokens = tokenize(text)
+                for tok in tokens:
+                    counts[tok] = counts.get(tok, 0) + 1
+                for tok, tf in counts.items():
+                    postings = self._postings.get(tok)
+                    if postings is None:
+                        postings = self._postings[tok] = (array("I"), array("H"))
+                    postings[0].append(chunk_id)
+                    postings[1].append(min(tf, 65535))
+                self._lengths.append(len(tokens))
+                self._total_len += len(tokens)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for the query (zeros for no match)."""
+        with self._lock:
+            n = len(self._lengths)
+            out = np.zeros(n, dtype=np.float32)
+            if not n:
+                return out
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32, count=n).astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / (self._total_len / n or 1.0))
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                ids = np.frombuffer(postings[0], dtype=np.uint32, count=len(postings[0]))
+                tf = np.frombuffer(postings[1], dtype=np.uint16, count=len(postings[1])).astype(np.float32)
+                df = len(ids)
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                out[ids] += idf * tf * (self.k1 + 1.0) / (tf + norm[ids])
+            return out
+
+    def top_k(self, query: str, k: int) -> list:
+        """[(chunk_id, score)] of the k best-scoring chunks with score > 0."""
+        return top_k_from_scores(self.scores(query), k)
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._lengths.itemsize * len(self._lengths) + sum(
+                ids.itemsize * len(ids) + tf.itemsize * len(tf) for ids, tf in self._postings.values()
+            )
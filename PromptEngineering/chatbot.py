@@ -1,6 +1,9 @@
-from rag import chat_with_doc  # Reusing your RAG function
+import sys
 
-def start_chat():
+from rag import chat_with_doc, reload_rag_model  # Reusing your RAG function
+
+def start_chat(pdf_path):
+    doc_id = reload_rag_model(pdf_path)
     print("Welcome to the RAG-powered Chatbot! You can ask questions about your research document.")
     print("Type 'exit' to end the chat.")
     
@@ -14,10 +17,13 @@ def start_chat():
         
         # Get the response from RAG
         try:
-            response = chat_with_doc(user_input)
+            response = chat_with_doc(user_input, doc_id)
             print(f"\nAnswer: {response}")
         except Exception as e:
             print(f"Error: {e}. Please try again.")
 
 if __name__ == "__main__":
-    start_chat()
+    if len(sys.argv) < 2:
+        print("Usage: python chatbot.py <paper.pdf>")
+        sys.exit(1)
+    start_chat(sys.argv[1])
@@ -0,0 +1,231 @@
+# disk_cache.py
+# One byte quota over the files kept on local disk: stored PDFs and the
+# artifacts derived from them (parsed .npz files).
+#
+# index.sqlite   files: path -> (doc_id, kind, nbytes, last_access)
+#                pins:  (pid, doc_id) -> refs
+#
+# The index is shared by every worker process on the host, so the total is
+# summed from it (never a directory walk) inside the eviction transaction.
+# When a new file pushes the total over DISK_CACHE_MAX_MB, the least
+# recently used unpinned files are deleted, oldest first, until the total
+# is back under the quota. Each round reads the next few victims from an
+# index, so the work grows with the number of files evicted rather than
+# with the number of files stored.
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+DISK_CACHE_INDEX = os.environ.get("DISK_CACHE_INDEX", os.path.join("cache", "disk_index.sqlite"))
+DISK_CACHE_MAX_MB = float(os.environ.get("DISK_CACHE_MAX_MB", "2048"))
+# Victims read per eviction round
+_EVICT_BATCH = 16
+# Per-request download folders (pdfs/session_*) written before the PDF store
+LEGACY_PDF_DIR = "pdfs"
+
+
+class DiskCacheManager:
+    """
+    LRU file cache bounded by total bytes.
+
+    Documents are pinned while they are loaded (the current PDF, or a warm
+    index in rag.registry). Pins are reference counts, so independent
+    holders can pin the same document, and its files are only evictable
+    once every holder has unpinned it. Each process counts its own pins in
+    its own rows of the pins table; rows of processes that have exited are
+    dropped, so a crashed worker cannot hold files forever.
+    """
+
+    def __init__(self, index_path: str = DISK_CACHE_INDEX,
+                 max_bytes: int = int(DISK_CACHE_MAX_MB * 1024 * 1024)):
+        self.max_bytes = max(0, int(max_bytes))
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(index_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, doc_id TEXT, kind TEXT NOT NULL, nbytes INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._drop_legacy_refs()
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_access ON files(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_files_doc ON files(doc_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pins ("
+            " pid INTEGER NOT NULL, doc_id TEXT NOT NULL, refs INTEGER NOT NULL,"
+            " PRIMARY KEY (pid, doc_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pins_doc ON pins(doc_id)")
+        # Rows under this pid were left by an earlier process that had it
+        self._conn.execute("DELETE FROM pins WHERE pid = ?", (self._pid,))
+        self._drop_dead_pins()
+
+    def _drop_legacy_refs(self) -> None:
+        """Indexes written before pins moved to their own table kept counts in files.refs."""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(files)")]
+        if "refs" not in columns:
+            return
+        try:
+            self._conn.execute("ALTER TABLE files DROP COLUMN refs")
+            logging.info("💾 Dropped the unused files.refs column from the disk cache index")
+        except sqlite3.OperationalError:
+            # Another worker dropped it first, or SQLite < 3.35; the column is unused either way
+            pass
+
+    def _drop_dead_pins(self) -> None:
+        """Delete the pins of processes that are no longer running."""
+        for (pid,) in self._conn.execute("SELECT DISTINCT pid FROM pins WHERE pid != ?", (self._pid,)).fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self._conn.execute("DELETE FROM pins WHERE pid = ?", (pid,))
+            except OSError:
+                pass                 # alive, owned by another user
+
+    def track(self, path: str, doc_id: str = None, kind: str = "file") -> None:
+        """Record a file written to disk, then evict if the quota is exceeded."""
+        try:
+            nbytes = os.path.getsize(path)
+        except OSError:
+            return
+        path = os.path.abspath(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, doc_id, kind, nbytes, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (path, doc_id, kind, nbytes, time.time()),
+            )
+            self._evict_over_quota(keep=path)
+
+    def touch(self, path: str) -> None:
+        """Mark a file as just used."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE files SET last_access = ? WHERE path = ?", (time.time(), os.path.abspath(path))
+            )
+
+    def forget(self, path: str) -> None:
+        """Drop a file that was deleted by its owner."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def pin(self, doc_id: str) -> None:
+        if not doc_id:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pins (pid, doc_id, refs) VALUES (?, ?, 1)"
+                " ON CONFLICT (pid, doc_id) DO UPDATE SET refs = refs + 1",
+                (self._pid, doc_id),
+            )
+
+    def unpin(self, doc_id: str) -> None:
+        if not doc_id:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE pins SET refs = refs - 1 WHERE pid = ? AND doc_id = ?", (self._pid, doc_id)
+                )
+                self._conn.execute("DELETE FROM pins WHERE pid = ? AND doc_id = ? AND refs <= 0",
+                                   (self._pid, doc_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            # Files that were held over the quota become evictable now
+            self._evict_over_quota()
+
+    def _evict_over_quota(self, keep: str = None) -> None:
+        """
+        Delete LRU unpinned files until under quota; `keep` (the file just
+        added) is spared. Runs as one write transaction, so the total and
+        the pins it reads cannot change under it from another process.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            total = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM files").fetchone()[0]
+            if total > self.max_bytes:
+                self._drop_dead_pins()
+            while total > self.max_bytes:
+                victims = self._conn.execute(
+                    "SELECT path, nbytes FROM files"
+                    " WHERE path != ? AND (doc_id IS NULL OR doc_id NOT IN (SELECT doc_id FROM pins))"
+                    " ORDER BY last_access LIMIT ?",
+                    (keep or "", _EVICT_BATCH),
+                ).fetchall()
+                if not victims:
+                    logging.warning("💾 Disk cache over quota (%d bytes) but every file is pinned", total)
+                    break
+                for path, nbytes in victims:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        logging.exception("Failed to evict %s", path)
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                    total -= nbytes
+                    self.evictions += 1
+                    self.evicted_bytes += nbytes
+                    logging.info(f"🧹 Evicted {path} ({nbytes} bytes)")
+                    if total <= self.max_bytes:
+                        break
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            files, nbytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM files"
+            ).fetchone()
+            pinned = self._conn.execute("SELECT COUNT(DISTINCT doc_id) FROM pins").fetchone()[0]
+            return {
+                "files": files,
+                "bytes": nbytes,
+                "max_bytes": self.max_bytes,
+                "pinned_docs": pinned,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+            }
+
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+
+def sweep_legacy_pdf_dirs(base_dir: str = LEGACY_PDF_DIR) -> None:
+    """
+    Delete the session_* download folders of the old layout. Nothing reads
+    them any more and they were never tracked by the quota, so they would
+    otherwise stay on disk forever.
+    """
+    if not os.path.isdir(base_dir):
+        return
+    for name in os.listdir(base_dir):
+        path = os.path.join(base_dir, name)
+        if name.startswith("session_") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            logging.info(f"🧹 Deleted legacy PDF folder: {path}")
+
+
+def get_disk_cache() -> DiskCacheManager:
+    """Process-wide manager instance."""
+    global _shared_manager
+    with _shared_lock:
+        if _shared_manager is None:
+            _shared_manager = DiskCacheManager()
+            sweep_legacy_pdf_dirs()
+        return _shared_manager
@@ -0,0 +1,150 @@
+# doc_registry.py
+# Documents are identified by the sha256 of their PDF bytes. The registry
+# remembers where each known document lives and keeps a bounded LRU of
+# "warm" indexes (one vector collection per document).
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RAG_WARM_DOCS = int(os.environ.get("RAG_WARM_DOCS", "4"))
+RAG_WARM_MAX_MB = float(os.environ.get("RAG_WARM_MAX_MB", "256"))
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class WarmIndex:
+    """
+    A per-document index plus the bookkeeping used for eviction. While the
+    document is still streaming in, pages_indexed is the watermark: every
+    page up to it is searchable.
+    """
+
+    def __init__(self, doc_id: str, index, nbytes: int = 0):
+        self.doc_id = doc_id
+        self.index = index
+        self.lexical = None              # BM25Index over the same chunk ids
+        self.nbytes = nbytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.pages_total = None
+        self.pages_extracted = 0
+        self.pages_indexed = 0
+        self.chunks = 0
+        self.complete = False
+        self.cancelled = False
+        self.error = None
+        self.ready = threading.Event()   # first batch searchable (or ingest ended)
+        self.done = threading.Event()    # ingest ended
+
+    def progress(self) -> dict:
+        total = self.pages_total
+        return {
+            "pages_extracted": self.pages_extracted,
+            "pages_indexed": self.pages_indexed,
+            "pages_total": total,
+            "chunks": self.chunks,
+            "complete": self.complete,
+            "fraction": round(self.pages_indexed / total, 3) if total else (1.0 if self.complete else 0.0),
+        }
+
+
+class DocumentRegistry:
+    """
+    LRU of warm document indexes bounded by count and estimated bytes.
+    `on_evict(WarmIndex)` is called outside the lock to release resources.
+    """
+
+    def __init__(self, max_warm: int = RAG_WARM_DOCS, max_bytes: int = int(RAG_WARM_MAX_MB * 1024 * 1024),
+                 on_evict=None):
+        self.max_warm = max(1, int(max_warm))
+        self.max_bytes = max(0, int(max_bytes))
+        self.on_evict = on_evict
+        self._warm = OrderedDict()   # doc_id -> WarmIndex, least recent first
+        self._paths = {}             # doc_id -> pdf path; survives eviction
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def register(self, doc_id: str, pdf_path: str) -> None:
+        with self._lock:
+            self._paths[doc_id] = pdf_path
+
+    def path_for(self, doc_id: str):
+        with self._lock:
+            return self._paths.get(doc_id)
+
+    def get(self, doc_id: str):
+        """Return the WarmIndex for doc_id (marking it recently used) or None."""
+        with self._lock:
+            entry = self._warm.get(doc_id)
+            if entry is not None:
+                self._warm.move_to_end(doc_id)
+                entry.last_used = time.time()
+            return entry
+
+    def put(self, doc_id: str, index, nbytes: int = 0) -> WarmIndex:
+        with self._lock:
+            entry = WarmIndex(doc_id, index, nbytes)
+            self._warm[doc_id] = entry
+            self._warm.move_to_end(doc_id)
+            evicted = self._evict_over_budget(keep=doc_id)
+        self._release(evicted)
+        return entry
+
+    def evict(self, doc_id: str, expected: WarmIndex = None) -> None:
+        """Drop doc_id's warm index; with `expected`, only if it is still that entry."""
+        with self._lock:
+            entry = self._warm.get(doc_id)
+            if entry is None or (expected is not None and entry is not expected):
+                return
+            del self._warm[doc_id]
+        self._release([entry])
+
+    def _total_bytes(self) -> int:
+        return sum(e.nbytes for e in self._warm.values())
+
+    def _evict_over_budget(self, keep: str) -> list:
+        evicted = []
+        total = self._total_bytes()
+        for doc_id in list(self._warm):
+            over_count = len(self._warm) > self.max_warm
+            over_bytes = self.max_bytes and total > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            if doc_id == keep:
+                continue
+            entry = self._warm.pop(doc_id)
+            total -= entry.nbytes
+            evicted.append(entry)
+        return evicted
+
+    def _release(self, entries: list) -> None:
+        for entry in entries:
+            # Stops a still-running ingest between batches
+            entry.cancelled = True
+            self.evictions += 1
+            logging.info("🧊 Evicted warm index for %s (%d bytes)", entry.doc_id[:12], entry.nbytes)
+            if self.on_evict:
+                try:
+                    self.on_evict(entry)
+                except Exception:
+                    logging.exception("Failed to release index for %s", entry.doc_id[:12])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "warm": list(self._warm),
+                "warm_bytes": self._total_bytes(),
+                "known": len(self._paths),
+                "evictions": self.evictions,
+                "max_warm": self.max_warm,
+                "max_bytes": self.max_bytes,
+            }
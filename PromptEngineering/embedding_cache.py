@@ -0,0 +1,176 @@
+# embedding_cache.py
+# Disk-backed, content-addressed embedding cache shared across reloads.
+#
+# Layout under `cache_dir`:
+#   index.sqlite   key -> (slot, last_access)      key = sha256(model + text)
+#   vectors.f32    memory-mapped float32 matrix, one row per slot
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+EMBED_CACHE_DIR = os.environ.get("EMBED_CACHE_DIR", os.path.join("cache", "embeddings"))
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("EMBED_CACHE_MAX_ENTRIES", "50000"))
+
+
+def cache_key(model: str, text: str) -> str:
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Fixed-capacity LRU cache of embedding vectors.
+
+    Slots are always the contiguous range 0..count-1: new entries take the
+    next slot until the cap is reached, after which the least recently used
+    entry is evicted and its slot reused.
+    """
+
+    def __init__(self, cache_dir: str = EMBED_CACHE_DIR, dim: int = 768,
+                 max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"),
+            check_same_thread=False, isolation_level=None, timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+
+        row = self._conn.execute("SELECT v FROM meta WHERE k = 'dim'").fetchone()
+        if row and int(row[0]) != dim:
+            logging.warning("Embedding cache dim changed (%s -> %s); clearing.", row[0], dim)
+            self._conn.execute("DELETE FROM embeddings")
+        self._conn.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('dim', ?)", (str(dim),))
+        # Shrinking the cap drops the tail slots; the remainder stays contiguous
+        self._conn.execute("DELETE FROM embeddings WHERE slot >= ?", (self.max_entries,))
+
+        path = os.path.join(cache_dir, "vectors.f32")
+        nbytes = self.max_entries * dim * 4
+        with open(path, "ab") as f:
+            if f.tell() != nbytes:
+                f.truncate(nbytes)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(self.max_entries, dim))
+
+    def get_many(self, model: str, texts: list) -> list:
+        """Return a cached vector (list of floats) or None for each text."""
+        keys = [cache_key(model, t) for t in texts]
+        found = {}
+        with self._lock:
+            # Slots and rows are read under the write lock, so another
+            # worker's put_many cannot reuse a slot between lookup and read
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for start in range(0, len(keys), 500):
+                    part = keys[start:start + 500]
+                    marks = ",".join("?" * len(part))
+                    for key, slot in self._conn.execute(
+                        f"SELECT key, slot FROM embeddings WHERE key IN ({marks})", part
+                    ):
+                        found[key] = slot
+                out = [self._vectors[found[k]].tolist() if k in found else None for k in keys]
+                if found:
+                    now = time.time()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, k) for k in found],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            hits = sum(1 for v in out if v is not None)
+            self.hits += hits
+            self.misses += len(out) - hits
+        return out
+
+    def put_many(self, model: str, texts: list, vectors: list) -> None:
+        if not texts:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                now = time.time()
+                batch_slots = []             # slots written by this batch are never its victims
+                for text, vec in zip(texts, vectors):
+                    key = cache_key(model, text)
+                    row = self._conn.execute("SELECT slot FROM embeddings WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        slot = row[0]
+                    elif count < self.max_entries:
+                        slot = count
+                        count += 1
+                    else:
+                        marks = ",".join("?" * len(batch_slots))
+                        row = self._conn.execute(
+                            f"SELECT key, slot FROM embeddings WHERE slot NOT IN ({marks})"
+                            " ORDER BY last_access LIMIT 1", batch_slots
+                        ).fetchone()
+                        if row is None:
+                            break                # batch larger than the cache: keep what fits
+                        victim, slot = row
+                        self._conn.execute("DELETE FROM embeddings WHERE key = ?", (victim,))
+                        self.evictions += 1
+                    batch_slots.append(slot)
+                    self._vectors[slot] = np.asarray(vec, dtype=np.float32)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, slot, last_access) VALUES (?, ?, ?)",
+                        (key, slot, now),
+                    )
+                # Rows must be readable before the index points at them
+                self._vectors.flush()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache instance; None when EMBED_CACHE_DIR is set to empty."""
+    global _shared_cache
+    if not EMBED_CACHE_DIR:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = EmbeddingCache()
+            except Exception:
+                logging.exception("Embedding cache unavailable; embedding without it")
+                return None
+        return _shared_cache
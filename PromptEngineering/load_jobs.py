@@ -0,0 +1,440 @@
+# load_jobs.py
+# Document load jobs: download -> extract -> embed -> index for one URL.
+#
+# A URL has at most one running job; every request for it joins that job.
+# Each owner (a client slot such as the app's current document) follows one
+# job at a time. When an owner moves on to another URL, its previous job is
+# cancelled at the next stage boundary unless another owner still wants it.
+#
+# Jobs run in the worker process that accepted them, but their snapshots
+# (state plus per-stage progress) are written to SQLite, so a status or
+# events request that lands on any other worker, or instance sharing the
+# cache directory, can still answer for the job.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from pdf_store import get_pdf_store
+from rag import registry, reload_rag_model
+
+# Jobs that download/index at the same time; the rest wait in the queue
+LOAD_JOB_WORKERS = int(os.environ.get("LOAD_JOB_WORKERS", "2"))
+# Jobs allowed to wait for a worker before new loads are refused
+LOAD_JOB_MAX_PENDING = int(os.environ.get("LOAD_JOB_MAX_PENDING", "16"))
+# Finished jobs kept for polling
+LOAD_JOB_HISTORY = int(os.environ.get("LOAD_JOB_HISTORY", "64"))
+LOAD_JOB_DB = os.environ.get("LOAD_JOB_DB", os.path.join("cache", "load_jobs.sqlite"))
+# A running job refreshes its snapshot this often; one silent for
+# LOAD_JOB_STALE_SECONDS (queued: LOAD_JOB_QUEUED_SECONDS) died with its worker
+_SNAPSHOT_INTERVAL = 1.0
+LOAD_JOB_STALE_SECONDS = int(os.environ.get("LOAD_JOB_STALE_SECONDS", "60"))
+LOAD_JOB_QUEUED_SECONDS = int(os.environ.get("LOAD_JOB_QUEUED_SECONDS", "600"))
+# Snapshots older than this are deleted
+_SNAPSHOT_TTL = 24 * 3600
+_FINAL_STATES = ("done", "failed", "cancelled")
+
+STAGES = ("download", "extract", "embed", "index")
+
+
+class JobCancelled(Exception):
+    """The job was superseded and stopped between stages."""
+
+
+class LoadQueueFull(RuntimeError):
+    """Every worker is busy and LOAD_JOB_MAX_PENDING jobs are already waiting."""
+
+
+def _fraction(done, total):
+    return round(min(done / total, 1.0), 3) if total else None
+
+
+class LoadJob:
+    """
+    One document load. `ready` is set once the document is searchable (or
+    the job ended without getting there); `finished` once indexing is done.
+    """
+
+    def __init__(self, url: str):
+        self.job_id = uuid4().hex[:12]
+        self.url = url
+        self.state = "queued"        # queued | running | done | failed | cancelled
+        self.doc_id = None
+        self.pdf_path = None
+        self.error = None
+        self.exception = None
+        self.entry = None            # rag.registry WarmIndex once indexing starts
+        self.owners = set()
+        self.created_at = time.time()
+        self.ready_at = None
+        self.finished_at = None
+        self.download_bytes = 0
+        self.download_total = None
+        self.downloaded = False
+        self.ready = threading.Event()
+        self.finished = threading.Event()
+        self._cancel = threading.Event()
+        self._callbacks = {}         # owner -> on_ready(job)
+        self._fired = False
+        self._lock = threading.Lock()
+        self._saved_at = 0.0         # last snapshot written to the shared store
+        self.on_change = None        # manager hook: persist a snapshot
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(self.job_id)
+
+    def _changed(self, force: bool = False) -> None:
+        if self.on_change and (force or time.time() - self._saved_at >= _SNAPSHOT_INTERVAL):
+            self._saved_at = time.time()
+            self.on_change(self)
+
+    def _on_download(self, written: int, expected) -> None:
+        self.download_bytes = written
+        self.download_total = expected
+        self._changed()
+        # Lets a superseded job stop mid-transfer
+        self.check()
+
+    def _add_callback(self, owner: str, on_ready) -> None:
+        with self._lock:
+            if not self._fired:
+                self._callbacks[owner] = on_ready
+                return
+        on_ready(self)
+
+    def _drop_callback(self, owner: str) -> None:
+        with self._lock:
+            self._callbacks.pop(owner, None)
+
+    def _fire_ready(self) -> None:
+        self.ready_at = time.time()
+        with self._lock:
+            self._fired = True
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logging.exception("Load job %s ready callback failed", self.job_id)
+        self.ready.set()
+        self._changed(force=True)
+
+    def stages(self) -> dict:
+        entry = self.entry
+        out = {
+            "download": {
+                "state": "done" if self.downloaded else ("running" if self.state == "running" else "pending"),
+                "bytes": self.download_bytes,
+                "total": self.download_total,
+                "fraction": 1.0 if self.downloaded else _fraction(self.download_bytes, self.download_total),
+            }
+        }
+        if entry is None:
+            for stage in STAGES[1:]:
+                out[stage] = {"state": "pending", "fraction": 0.0}
+            return out
+        total = entry.pages_total
+        finished = entry.done.is_set()
+        for stage, pages in (("extract", entry.pages_extracted), ("embed", entry.pages_indexed)):
+            complete = entry.complete or (finished and total is not None and pages >= total)
+            out[stage] = {
+                "state": "done" if complete else "running",
+                "pages": pages,
+                "pages_total": total,
+                "fraction": 1.0 if complete else (_fraction(pages, total) or 0.0),
+            }
+        out["index"] = {
+            "state": "done" if entry.complete else ("running" if entry.ready.is_set() else "pending"),
+            "chunks": entry.chunks,
+            "searchable": entry.ready.is_set() and entry.chunks > 0,
+            "fraction": 1.0 if entry.complete else (_fraction(entry.pages_indexed, total) or 0.0),
+        }
+        return out
+
+    def events(self, interval: float = 0.25):
+        """
+        Yield ("progress", job dict) whenever a stage changes state or its
+        fraction moves, then one final (state, job dict) event where state
+        is "done", "failed" or "cancelled".
+        """
+        def snapshots():
+            first = True
+            while True:
+                finished = self.finished.wait(0 if first else interval)
+                first = False
+                yield self.to_dict(), finished
+
+        return _progress_events(snapshots())
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "url": self.url,
+            "state": self.state,
+            "doc_id": self.doc_id,
+            "error": self.error,
+            "ready": self.ready.is_set(),
+            "stages": self.stages(),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _progress_events(snapshots):
+    """(job dict, finished) pairs -> progress events on change, then the final state event."""
+    last = None
+    for snapshot, finished in snapshots:
+        key = (snapshot["state"], snapshot["ready"],
+               tuple((s["state"], s.get("fraction")) for s in snapshot["stages"].values()))
+        if finished:
+            yield snapshot["state"], snapshot
+            return
+        if key != last:
+            last = key
+            yield "progress", snapshot
+
+
+class LoadJobManager:
+    """
+    Single-flight load jobs on a bounded worker pool. Jobs live in this
+    process; their snapshots are shared through SQLite for status requests
+    served by other workers.
+    """
+
+    def __init__(self, workers: int = LOAD_JOB_WORKERS, db_path: str = LOAD_JOB_DB):
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="load-job")
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._jobs = OrderedDict()   # job_id -> LoadJob, oldest first
+        self._active = {}            # url -> LoadJob not yet finished
+        self._owned = {}             # owner -> job_id it currently follows
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS load_jobs ("
+            " job_id TEXT PRIMARY KEY, url TEXT NOT NULL, state TEXT NOT NULL,"
+            " snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_load_jobs_updated ON load_jobs(updated_at)")
+
+    def _save(self, job: LoadJob) -> None:
+        """Write the job's snapshot for other workers; never fails the job."""
+        try:
+            snapshot = json.dumps(job.to_dict())
+            now = time.time()
+            with self._db_lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO load_jobs (job_id, url, state, snapshot, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (job.job_id, job.url, job.state, snapshot, now),
+                )
+                if job.state in _FINAL_STATES:
+                    self._conn.execute("DELETE FROM load_jobs WHERE updated_at < ?", (now - _SNAPSHOT_TTL,))
+        except Exception:
+            logging.exception("Could not save load job %s", job.job_id)
+
+    def _stored(self, job_id: str):
+        """Snapshot of a job run by another worker, or None if unknown."""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT state, snapshot, updated_at FROM load_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        state, snapshot, updated_at = row
+        snapshot = json.loads(snapshot)
+        limit = LOAD_JOB_QUEUED_SECONDS if state == "queued" else LOAD_JOB_STALE_SECONDS
+        if state not in _FINAL_STATES and time.time() - updated_at > limit:
+            # Its worker stopped writing: it died with the job
+            snapshot.update(state="failed", error="Load job was abandoned by its worker")
+        return snapshot
+
+    def status(self, job_id: str):
+        """The job's dict, from this process or the shared store; None if unknown."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self._stored(job_id)
+
+    def events(self, job_id: str, interval: float = 0.5):
+        """LoadJob.events for a job in any worker; None if unknown."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.events()
+        if self._stored(job_id) is None:
+            return None
+
+        def snapshots():
+            first = True
+            while True:
+                if not first:
+                    time.sleep(interval)
+                first = False
+                snapshot = self._stored(job_id)
+                if snapshot is None:
+                    return
+                yield snapshot, snapshot["state"] in _FINAL_STATES
+
+        return _progress_events(snapshots())
+
+    def submit(self, url: str, owner: str = "default", on_ready=None) -> LoadJob:
+        """
+        Return the job loading `url`, starting one only if none is running.
+        Raises LoadQueueFull rather than queueing without bound.
+        `on_ready(job)` runs once the document is searchable, or once the
+        job has failed without getting there (check job.state), unless
+        `owner` has moved on to another job by then.
+        """
+        with self._lock:
+            job = self._active.get(url)
+            if job is not None and job.cancelled:
+                # Still unwinding to its next stage boundary: start a new load
+                # rather than join one that is about to report "cancelled"
+                job = None
+            fresh = job is None
+            if fresh and len(self._active) >= self.workers + LOAD_JOB_MAX_PENDING:
+                raise LoadQueueFull(f"{len(self._active)} document loads already in progress")
+            if fresh:
+                job = LoadJob(url)
+                job.on_change = self._save
+                self._active[url] = job
+                self._jobs[job.job_id] = job
+                self._trim()
+                self.started += 1
+            else:
+                self.joined += 1
+            previous = self._jobs.get(self._owned.get(owner))
+            self._owned[owner] = job.job_id
+            job.owners.add(owner)
+            superseded = None
+            if previous is not None and previous is not job:
+                previous.owners.discard(owner)
+                previous._drop_callback(owner)
+                if not previous.owners and not previous.finished.is_set():
+                    superseded = previous
+
+        if superseded is not None:
+            self.cancel(superseded.job_id)
+        if on_ready:
+            job._add_callback(owner, on_ready)
+        if fresh:
+            self._save(job)
+            self._pool.submit(self._run, job)
+            logging.info(f"📋 Load job {job.job_id} queued for {url}")
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a job to stop at its next stage boundary."""
+        job = self.get(job_id)
+        if job is None or job.finished.is_set():
+            return False
+        job._cancel.set()
+        logging.info(f"✋ Cancelling load job {job.job_id} ({job.url})")
+        return True
+
+    def _trim(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j.finished.is_set()]
+        for jid in finished[:max(0, len(finished) - LOAD_JOB_HISTORY)]:
+            del self._jobs[jid]
+
+    def _run(self, job: LoadJob) -> None:
+        try:
+            job.check()
+            job.state = "running"
+            job._changed(force=True)
+            job.pdf_path, job.doc_id = get_pdf_store().fetch(job.url, on_progress=job._on_download)
+            job.downloaded = True
+            job.check()
+
+            # Returns once the first pages are searchable
+            reload_rag_model(job.pdf_path, doc_id=job.doc_id, background=True)
+            job.entry = registry.get(job.doc_id)
+            if job.entry is None or job.entry.error:
+                raise RuntimeError(job.entry.error if job.entry else "indexing failed")
+            job.check()
+            job._fire_ready()
+
+            # Follow the rest of the ingest so progress reaches 100% and the
+            # pool bound covers the embedding work too
+            while not job.entry.done.wait(0.25):
+                job._changed()
+                job.check()
+            if job.entry.error:
+                raise RuntimeError(job.entry.error)
+            job.state = "done"
+        except JobCancelled:
+            job.state = "cancelled"
+            self.cancelled += 1
+            self._stop_ingest(job)
+        except Exception as e:
+            logging.exception(f"Load job {job.job_id} failed")
+            job.state = "failed"
+            job.error = str(e)
+            job.exception = e
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active.get(job.url) is job:
+                    del self._active[job.url]
+            if not job.ready.is_set():
+                job._fire_ready()
+            job.finished.set()
+            job._changed(force=True)
+            logging.info(f"📋 Load job {job.job_id} {job.state} "
+                         f"in {job.finished_at - job.created_at:.1f}s")
+
+    def _stop_ingest(self, job: LoadJob) -> None:
+        """Drop a half-built index nobody else is loading."""
+        entry = job.entry or (registry.get(job.doc_id) if job.doc_id else None)
+        if entry is None or entry.done.is_set():
+            return
+        with self._lock:
+            # A fresh job for the same URL may not know its doc_id yet
+            shared = any(j.doc_id == job.doc_id or j.url == job.url
+                         for j in self._active.values() if j is not job)
+        if not shared:
+            registry.evict(job.doc_id, expected=entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": [j.job_id for j in self._active.values()],
+                "started": self.started,
+                "joined": self.joined,
+                "cancelled": self.cancelled,
+                "workers": self.workers,
+            }
+
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+
+def get_load_jobs() -> LoadJobManager:
+    """Process-wide manager instance."""
+    global _shared_manager
+    with _shared_lock:
+        if _shared_manager is None:
+            _shared_manager = LoadJobManager()
+        return _shared_manager
@@ -0,0 +1,300 @@
+# mindmap_cache.py
+# Generated mind maps, keyed by what they depend on.
+#
+# key = sha256(doc_id, scope, prompt version, model)
+#
+# doc_id is the content hash of the PDF, so a changed paper is a new key, and
+# bumping a prompt version or switching model retires the old entries without
+# a manual flush. Entries live in SQLite so every worker shares them; they
+# expire after MINDMAP_CACHE_TTL seconds and the least recently used are
+# dropped once the cache outgrows MINDMAP_CACHE_MAX_ENTRIES/MAX_MB.
+#
+# Generation is single-flight per process: concurrent requests for a missing
+# key wait on one LLM call instead of each starting their own. A streamed
+# generation is shared the same way, its events replayed to late joiners.
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+MINDMAP_CACHE_DB = os.environ.get("MINDMAP_CACHE_DB", os.path.join("cache", "mindmaps.sqlite"))
+MINDMAP_CACHE_TTL = int(os.environ.get("MINDMAP_CACHE_TTL", str(7 * 24 * 3600)))
+MINDMAP_CACHE_MAX_ENTRIES = int(os.environ.get("MINDMAP_CACHE_MAX_ENTRIES", "500"))
+MINDMAP_CACHE_MAX_MB = float(os.environ.get("MINDMAP_CACHE_MAX_MB", "64"))
+
+
+def mindmap_key(doc_id: str, scope: str, prompt_version: str, model: str) -> str:
+    h = hashlib.sha256()
+    for part in (doc_id, scope, prompt_version, model):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class _Flight:
+    """
+    One generation in progress; followers wait on `done`. A streamed
+    generation also publishes its events so late joiners can replay them.
+    """
+
+    def __init__(self, streaming: bool = False):
+        self.streaming = streaming
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    def publish(self, event: str, data) -> None:
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def finish(self) -> None:
+        with self._cond:
+            self.done.set()
+            self._cond.notify_all()
+
+    def follow(self):
+        """Yield every published event, old and new, until the flight finishes."""
+        seen = 0
+        while True:
+            with self._cond:
+                while seen == len(self.events) and not self.done.is_set():
+                    self._cond.wait()
+                batch = self.events[seen:]
+                seen = len(self.events)
+                finished = self.done.is_set() and seen == len(self.events)
+            yield from batch
+            if finished:
+                return
+
+
+class MindMapCache:
+    """
+    TTL + LRU cache of JSON-serialisable mind map payloads.
+
+    `build()` returns (payload, cacheable). Fallback results (the model
+    failed or returned something unparseable) are handed to every waiter
+    but not stored, so the next request tries the model again.
+    """
+
+    def __init__(self, db_path: str = MINDMAP_CACHE_DB, ttl: int = MINDMAP_CACHE_TTL,
+                 max_entries: int = MINDMAP_CACHE_MAX_ENTRIES,
+                 max_bytes: int = int(MINDMAP_CACHE_MAX_MB * 1024 * 1024)):
+        self.ttl = max(0, int(ttl))
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.evictions = 0
+        self._flights = {}           # key -> _Flight
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mindmaps ("
+            " key TEXT PRIMARY KEY, doc_id TEXT, scope TEXT, prompt_version TEXT, model TEXT,"
+            " payload TEXT NOT NULL, nbytes INTEGER NOT NULL, created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_mindmaps_access ON mindmaps(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_mindmaps_created ON mindmaps(created_at)")
+
+    def get(self, key: str):
+        """The cached payload, or None if missing or expired."""
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str):
+        row = self._conn.execute(
+            "SELECT payload, created_at FROM mindmaps WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        payload, created_at = row
+        if self.ttl and time.time() - created_at > self.ttl:
+            self._conn.execute("DELETE FROM mindmaps WHERE key = ?", (key,))
+            return None
+        self._conn.execute("UPDATE mindmaps SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(payload)
+
+    def put(self, doc_id: str, scope: str, prompt_version: str, model: str, payload) -> None:
+        key = mindmap_key(doc_id, scope, prompt_version, model)
+        blob = json.dumps(payload, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mindmaps"
+                " (key, doc_id, scope, prompt_version, model, payload, nbytes, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, doc_id, scope, prompt_version, model, blob, len(blob.encode("utf-8")), now, now),
+            )
+            self._evict(keep=key)
+
+    def _evict(self, keep: str) -> None:
+        """Drop expired entries, then LRU entries while over the count or byte bound."""
+        if self.ttl:
+            expired = self._conn.execute(
+                "DELETE FROM mindmaps WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self.evictions += max(0, expired)
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM mindmaps"
+        ).fetchone()
+        if count <= self.max_entries and (not self.max_bytes or total <= self.max_bytes):
+            return
+        for key, nbytes in self._conn.execute(
+            "SELECT key, nbytes FROM mindmaps WHERE key != ? ORDER BY last_access", (keep,)
+        ).fetchall():
+            if count <= self.max_entries and (not self.max_bytes or total <= self.max_bytes):
+                break
+            self._conn.execute("DELETE FROM mindmaps WHERE key = ?", (key,))
+            count -= 1
+            total -= nbytes
+            self.evictions += 1
+
+    def get_or_create(self, doc_id: str, scope: str, prompt_version: str, model: str, build):
+        """
+        Return (payload, cached). On a miss exactly one caller runs
+        `build()`; the others wait for it and share its result or exception.
+        """
+        key = mindmap_key(doc_id, scope, prompt_version, model)
+        with self._lock:
+            payload = self._get(key)
+            if payload is not None:
+                self.hits += 1
+                return payload, True
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.joined += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, False
+
+        try:
+            started = time.perf_counter()
+            payload, cacheable = build()
+            if cacheable:
+                self.put(doc_id, scope, prompt_version, model, payload)
+            logging.info(f"🗺️ Mind map ({scope}) for {doc_id[:12]} built in "
+                         f"{time.perf_counter() - started:.1f}s{'' if cacheable else ' (not cached)'}")
+            flight.value = payload
+            return payload, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.finish()
+
+    def stream_or_create(self, doc_id: str, scope: str, prompt_version: str, model: str,
+                         build_stream, replay):
+        """
+        Streaming get_or_create. Yields (event, data) pairs: those of
+        `replay(payload)` for a finished map, otherwise those of
+        `build_stream()`, a generator that yields events and returns
+        (payload, cacheable). Always ends with ("done", {"payload",
+        "cached"}). The generation runs on its own thread, so concurrent
+        callers all follow one LLM call and a client that disconnects does
+        not cut it short.
+        """
+        key = mindmap_key(doc_id, scope, prompt_version, model)
+        with self._lock:
+            payload = self._get(key)
+            if payload is not None:
+                self.hits += 1
+            else:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight(streaming=True)
+                    self.misses += 1
+                else:
+                    self.joined += 1
+        if payload is not None:
+            yield from replay(payload)
+            yield "done", {"payload": payload, "cached": True}
+            return
+
+        if leader:
+            def run():
+                try:
+                    started = time.perf_counter()
+                    gen = build_stream()
+                    while True:
+                        try:
+                            event, data = next(gen)
+                        except StopIteration as stop:
+                            value, cacheable = stop.value
+                            break
+                        flight.publish(event, data)
+                    if cacheable:
+                        self.put(doc_id, scope, prompt_version, model, value)
+                    logging.info(f"🗺️ Mind map ({scope}) for {doc_id[:12]} streamed in "
+                                 f"{time.perf_counter() - started:.1f}s{'' if cacheable else ' (not cached)'}")
+                    flight.value = value
+                except Exception as e:
+                    logging.exception("Streamed mind map generation failed")
+                    flight.error = e
+                finally:
+                    with self._lock:
+                        self._flights.pop(key, None)
+                    flight.finish()
+
+            threading.Thread(target=run, name="mindmap-stream", daemon=True).start()
+
+        if flight.streaming:
+            yield from flight.follow()
+        else:
+            # Joined a non-streamed generation: replay its result
+            flight.done.wait()
+            if flight.error is None:
+                yield from replay(flight.value)
+        if flight.error is not None:
+            raise flight.error
+        yield "done", {"payload": flight.value, "cached": False}
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, nbytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM mindmaps"
+            ).fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "joined": self.joined,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": nbytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "in_flight": len(self._flights),
+            }
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_mindmap_cache() -> MindMapCache:
+    """Process-wide cache instance."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = MindMapCache()
+        return _shared_cache
@@ -0,0 +1,121 @@
+# mindmap_mapreduce.py
+# Map-reduce input for document mind maps.
+#
+# A single mind map prompt only sees the first few thousand characters, so
+# on long papers the results, limitations and future-work nodes are guessed.
+# Instead the paper is split along the sections found by extract_sections
+# (ParsedDocument.sections), each part is summarised by its own LLM call
+# (map, on a bounded pool), and the compact summaries replace the truncated
+# text in the existing mind map prompt (reduce).
+#
+# Latency stays roughly flat as papers grow: the number of map calls is
+# capped at MINDMAP_MAX_UNITS, so a longer paper gives each call more input
+# rather than adding calls, and every call's output is a fixed-size summary.
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+# auto: map-reduce only when the text does not fit the single-prompt window
+MINDMAP_MODE = os.environ.get("MINDMAP_MODE", "auto").strip().lower()
+# Concurrent section-summary calls; matching MAX_UNITS runs the map in one wave
+MINDMAP_MAP_WORKERS = int(os.environ.get("MINDMAP_MAP_WORKERS", "8"))
+# Upper bound on section-summary calls per document
+MINDMAP_MAX_UNITS = int(os.environ.get("MINDMAP_MAX_UNITS", "8"))
+# Preferred characters per summary call; grows once MAX_UNITS is reached
+MINDMAP_UNIT_CHARS = int(os.environ.get("MINDMAP_UNIT_CHARS", "8000"))
+MINDMAP_SUMMARY_WORDS = 120
+
+
+def use_map_reduce(text: str, window: int) -> bool:
+    """Whether a document of this text should be mapped rather than truncated to `window`."""
+    if MINDMAP_MODE == "single":
+        return False
+    if MINDMAP_MODE == "mapreduce":
+        return True
+    return len(text.strip()) > window
+
+
+def _pieces(doc) -> list:
+    """(label, text) in document order: detected sections, or pages if detection missed most text."""
+    sections = [(h, t) for h, t in doc.sections.items() if t.strip()]
+    page_chars = sum(len(t) for t in doc.page_texts)
+    if len(sections) > 1 and sum(len(t) for _, t in sections) >= 0.5 * page_chars:
+        return sections
+    return [(f"Page {i}", t) for i, t in enumerate(doc.page_texts, start=1) if t.strip()]
+
+
+def section_units(doc, max_units: int = MINDMAP_MAX_UNITS, unit_chars: int = MINDMAP_UNIT_CHARS) -> list:
+    """
+    Pack sections into at most `max_units` texts for the map step. Short
+    neighbouring sections share a unit and long ones are split, each part
+    keeping its "## heading" line so the summary can name it.
+    """
+    pieces = _pieces(doc)
+    total = sum(len(t) for _, t in pieces)
+    if not total:
+        return []
+    # Greedy packing leaves each pair of neighbouring units over `size`
+    size = max(unit_chars, math.ceil(2 * total / max(1, max_units)))
+
+    units, current = [], ""
+    for label, text in pieces:
+        parts = [text[i:i + size] for i in range(0, len(text), size)]
+        for n, part in enumerate(parts, start=1):
+            heading = f"## {label}" + (f" (part {n}/{len(parts)})" if len(parts) > 1 else "")
+            block = f"{heading}\n{part.strip()}\n"
+            if current and len(current) + len(block) > size:
+                units.append(current)
+                current = ""
+            current += block
+    if current:
+        units.append(current)
+    while len(units) > max(1, max_units):
+        # Packing can overshoot by one; fold the shortest neighbouring pair
+        i = min(range(len(units) - 1), key=lambda k: len(units[k]) + len(units[k + 1]))
+        units[i:i + 2] = [units[i] + units[i + 1]]
+    return units
+
+
+def _summary_prompt(unit: str) -> str:
+    return f"""
+You are reading one part of a research paper so that a mind map of the whole
+paper can be built later. Summarise the part below in at most
+{MINDMAP_SUMMARY_WORDS} words as terse bullet points, under the section
+headings it contains.
+
+Keep whatever is specific: the problem, methods, algorithms, datasets,
+experimental setup, numbers and metrics, results, contributions,
+limitations and future work. Skip anything generic. Do not add information
+that is not in the text.
+
+{unit}
+"""
+
+
+def summarize_sections(doc, model_name: str, workers: int = MINDMAP_MAP_WORKERS) -> str:
+    """
+    Map step: one summary per unit, in document order, joined into the text
+    the reduce prompt reads. Units whose call fails are left out; raises
+    RuntimeError if every call fails.
+    """
+    units = section_units(doc)
+    if not units:
+        raise RuntimeError("Document has no text to summarise")
+    model = genai.GenerativeModel(model_name)
+
+    def run(unit):
+        try:
+            return (model.generate_content(_summary_prompt(unit)).text or "").strip()
+        except Exception:
+            logging.exception("Section summary call failed")
+            return ""
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(units))), thread_name_prefix="mindmap-map") as pool:
+        summaries = [s for s in pool.map(run, units) if s]
+    if not summaries:
+        raise RuntimeError("Every section summary call failed")
+    logging.info(f"🗺️ Summarised {len(summaries)}/{len(units)} parts of {doc.doc_id[:12]} for the mind map")
+    return "\n\n".join(summaries)
@@ -0,0 +1,147 @@
+# mindmap_stream.py
+# Incremental parsing of a streamed mind map JSON object.
+#
+# The model writes {"id": "root", ..., "children": [{...}, {...}, ...]}.
+# The parser scans the text as it arrives, keeping only string/escape state
+# and nesting depth, and reports
+#   ("root", {...root fields, "children": []})  once the "children" array opens
+#   ("node", {...})                             as each child object closes
+#   ("skipped", {"index", "error"})             for a child that cannot be repaired
+# so a client can draw the root and each branch without waiting for the
+# whole document, and one malformed node does not discard the others.
+import json
+import logging
+import re
+
+# Repairs tried, in order, on a fragment json.loads rejects
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"'})
+
+
+def repair_object(text: str):
+    """Parse a JSON object fragment, fixing common model slips; None if it cannot be saved."""
+    attempts = (
+        lambda t: t,
+        lambda t: _TRAILING_COMMA.sub(r"\1", t),
+        lambda t: _TRAILING_COMMA.sub(r"\1", t.translate(_SMART_QUOTES)),
+    )
+    for fix in attempts:
+        try:
+            # strict=False accepts raw newlines and tabs inside strings
+            value = json.loads(fix(text), strict=False)
+        except ValueError:
+            continue
+        return value if isinstance(value, dict) else None
+    return None
+
+
+def _normalise_node(node: dict, index: int, default_title: str = None) -> dict:
+    """Fill the fields the MindMap component relies on."""
+    title = str(node.get("title") or node.get("id") or default_title or f"Node {index + 1}")
+    node.setdefault("id", re.sub(r"\W+", "_", title.lower()).strip("_") or f"node_{index + 1}")
+    node.setdefault("title", title)
+    for key in ("bulletPoints", "keyPoints", "connections"):
+        if not isinstance(node.get(key), list):
+            node[key] = []
+    return node
+
+
+class MindMapStreamParser:
+    """Feed model output with feed(); read the assembled tree with result()."""
+
+    def __init__(self):
+        self._text = ""              # everything received so far
+        self._pos = 0                # next character to scan
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None     # (value start, end) of the latest depth-1 string
+        self._key = None             # depth-1 key whose value is being read
+        self._key_start = None
+        self._root_start = None
+        self._children_depth = None  # depth inside the root's "children" array
+        self._child_start = None
+        self.root = None
+        self.children = []
+        self.skipped = 0
+
+    def feed(self, text: str) -> list:
+        """Consume more model output; returns the events it completed."""
+        self._text += text
+        events = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = (self._string_start, i + 1)
+                continue
+            if self._root_start is None:
+                # Skip any ```json fence or preamble before the object
+                if ch == "{":
+                    self._root_start = i
+                    self._depth = 1
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and self._depth == 1 and self._last_string:
+                start, end = self._last_string
+                self._key, self._key_start = text[start + 1:end - 1], start
+                self._last_string = None
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._key == "children" and self._children_depth is None:
+                    self._children_depth = 2
+                    events.extend(self._emit_root(text[self._root_start:self._key_start]))
+                elif ch == "{" and self._children_depth and self._depth == self._children_depth + 1:
+                    self._child_start = i
+            elif ch in "}]":
+                if ch == "}" and self._child_start is not None and self._depth == self._children_depth + 1:
+                    events.append(self._emit_child(text[self._child_start:i + 1]))
+                    self._child_start = None
+                self._depth -= 1
+                if self._depth == 1 and ch == "]" and self._children_depth:
+                    self._children_depth = 0   # array closed; later arrays are not children
+        self._pos = len(text)
+        return events
+
+    def _emit_root(self, head: str) -> list:
+        """Root fields written before "children", closed off and parsed."""
+        root = repair_object(head.rstrip().rstrip(",") + "}")
+        if root is None:
+            logging.warning("Mind map stream: could not parse root fields")
+            root = {}
+        root.pop("children", None)
+        self.root = _normalise_node(root, -1, "Research Paper")
+        return [("root", dict(self.root, children=[]))]
+
+    def _emit_child(self, fragment: str):
+        index = len(self.children) + self.skipped
+        node = repair_object(fragment)
+        if node is None:
+            self.skipped += 1
+            logging.warning(f"Mind map stream: skipped malformed node {index}")
+            return "skipped", {"index": index, "error": "unparseable node"}
+        node = _normalise_node(node, index)
+        self.children.append(node)
+        return "node", node
+
+    def result(self):
+        """The whole tree: the full text when it parses, else root plus the good children; None if no root."""
+        if self._root_start is not None and not self.skipped:
+            full = repair_object(self._text[self._root_start:self._text.rfind("}") + 1])
+            if full is not None and isinstance(full.get("children"), list):
+                full["children"] = [_normalise_node(c, i) for i, c in enumerate(full["children"])
+                                    if isinstance(c, dict)]
+                return _normalise_node(full, -1, "Research Paper")
+        if self.root is None:
+            return None
+        return dict(self.root, children=list(self.children))
@@ -0,0 +1,211 @@
+# parsed_document.py
+# Parse each PDF once. The result (page texts, word boxes, font sizes and
+# section boundaries) is saved as one compressed .npz artifact keyed by the
+# document's content hash, and every consumer reads that instead of the PDF.
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from data_extraction import iter_parsed_pages, page_count, sections_from_columns, words_to_columns
+from disk_cache import get_disk_cache
+from doc_registry import file_sha256
+
+PARSED_DOC_DIR = os.environ.get("PARSED_DOC_DIR", os.path.join("cache", "parsed"))
+# Parsed documents kept in memory on top of the on-disk artifacts
+PARSED_DOC_MEMORY = int(os.environ.get("PARSED_DOC_MEMORY", "4"))
+# Bump when the artifact layout or section detection changes
+ARTIFACT_VERSION = 3
+
+
+def _pack_strings(items: list):
+    """Strings -> (utf-8 blob, offsets) so the artifact needs no pickling."""
+    encoded = [s.encode("utf-8") for s in items]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> list:
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class ParsedDocument:
+    """
+    Columnar view of one parsed PDF. Word attributes are parallel arrays;
+    word_page is the 0-based page index of each word.
+    """
+
+    def __init__(self, doc_id: str, page_texts: list, word_text: list, word_page, word_size,
+                 word_font, word_doctop, word_x0, fonts: list, sections: dict):
+        self.doc_id = doc_id
+        self.page_texts = page_texts
+        self.word_text = word_text
+        self.word_page = np.asarray(word_page, dtype=np.int32)
+        self.word_size = np.asarray(word_size, dtype=np.float32)
+        self.word_font = np.asarray(word_font, dtype=np.int32)
+        self.word_doctop = np.asarray(word_doctop, dtype=np.float32)
+        self.word_x0 = np.asarray(word_x0, dtype=np.float32)
+        self.fonts = fonts
+        self.sections = sections
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_texts)
+
+    def full_text(self, page_markers: bool = False) -> str:
+        if page_markers:
+            return "".join(f"\n--- Page {i} ---\n{t}\n" for i, t in enumerate(self.page_texts, start=1))
+        return "\n\n".join(self.page_texts).strip()
+
+    def pages_words(self) -> list:
+        """Per-page lists of pdfplumber-style word dicts."""
+        pages = [[] for _ in self.page_texts]
+        for i, text in enumerate(self.word_text):
+            pages[self.word_page[i]].append({
+                "text": text,
+                "fontname": self.fonts[self.word_font[i]],
+                "size": float(self.word_size[i]),
+                "doctop": float(self.word_doctop[i]),
+                "x0": float(self.word_x0[i]),
+            })
+        return pages
+
+    @classmethod
+    def from_pages(cls, doc_id: str, pages: list) -> "ParsedDocument":
+        """Build from [(text, words)] as produced by data_extraction."""
+        cols = words_to_columns(words for _, words in pages)
+        return cls(doc_id, [text for text, _ in pages], cols["text"], cols["page"], cols["size"],
+                   cols["font"], cols["doctop"], cols["x0"], cols["fonts"], sections_from_columns(**cols))
+
+    def save(self, path: str) -> None:
+        pages_blob, pages_off = _pack_strings(self.page_texts)
+        words_blob, words_off = _pack_strings(self.word_text)
+        fonts_blob, fonts_off = _pack_strings(self.fonts)
+        names_blob, names_off = _pack_strings(list(self.sections))
+        secs_blob, secs_off = _pack_strings(list(self.sections.values()))
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp, version=np.int32(ARTIFACT_VERSION),
+            pages_blob=pages_blob, pages_off=pages_off,
+            words_blob=words_blob, words_off=words_off,
+            fonts_blob=fonts_blob, fonts_off=fonts_off,
+            names_blob=names_blob, names_off=names_off,
+            secs_blob=secs_blob, secs_off=secs_off,
+            word_page=self.word_page, word_size=self.word_size, word_font=self.word_font,
+            word_doctop=self.word_doctop, word_x0=self.word_x0,
+        )
+        # Readers never see a half-written artifact
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, doc_id: str, path: str) -> "ParsedDocument":
+        with np.load(path, allow_pickle=False) as z:
+            if int(z["version"]) != ARTIFACT_VERSION:
+                raise ValueError(f"artifact version {int(z['version'])} != {ARTIFACT_VERSION}")
+            names = _unpack_strings(z["names_blob"], z["names_off"])
+            texts = _unpack_strings(z["secs_blob"], z["secs_off"])
+            return cls(
+                doc_id,
+                _unpack_strings(z["pages_blob"], z["pages_off"]),
+                _unpack_strings(z["words_blob"], z["words_off"]),
+                z["word_page"], z["word_size"], z["word_font"], z["word_doctop"], z["word_x0"],
+                _unpack_strings(z["fonts_blob"], z["fonts_off"]),
+                dict(zip(names, texts)),
+            )
+
+
+_memory = OrderedDict()     # doc_id -> ParsedDocument
+_parse_locks = {}           # doc_id -> Lock held while that document is parsed
+_lock = threading.Lock()
+
+
+def _artifact_path(doc_id: str) -> str:
+    return os.path.join(PARSED_DOC_DIR, f"{doc_id}.npz")
+
+
+def _remember(doc: ParsedDocument) -> ParsedDocument:
+    with _lock:
+        _memory[doc.doc_id] = doc
+        _memory.move_to_end(doc.doc_id)
+        while len(_memory) > max(1, PARSED_DOC_MEMORY):
+            _memory.popitem(last=False)
+    return doc
+
+
+def _cached(doc_id: str):
+    with _lock:
+        doc = _memory.get(doc_id)
+        if doc is not None:
+            _memory.move_to_end(doc_id)
+            return doc
+    path = _artifact_path(doc_id)
+    if os.path.exists(path):
+        try:
+            doc = _remember(ParsedDocument.load(doc_id, path))
+            get_disk_cache().touch(path)
+            return doc
+        except Exception:
+            logging.exception("Discarding unreadable parsed artifact %s", path)
+            os.remove(path)
+            get_disk_cache().forget(path)
+    return None
+
+
+def _parse_lock(doc_id: str) -> threading.Lock:
+    with _lock:
+        return _parse_locks.setdefault(doc_id, threading.Lock())
+
+
+def iter_pages(pdf_path: str, doc_id: str = None, on_total=None):
+    """
+    Yield (page_no, text) for each page. Served from the artifact when one
+    exists; otherwise the PDF is parsed once, streaming pages as they come,
+    and the artifact is written when the last page is done. Concurrent
+    callers for the same document wait for that parse instead of repeating it.
+    """
+    doc_id = doc_id or file_sha256(pdf_path)
+    doc = _cached(doc_id)
+    if doc is None:
+        with _parse_lock(doc_id):
+            doc = _cached(doc_id)
+            if doc is None:
+                total = page_count(pdf_path)
+                if on_total:
+                    on_total(total)
+                pages = []
+                for page_no, text, words in iter_parsed_pages(pdf_path, total=total):
+                    pages.append((text, words))
+                    yield page_no, text
+                doc = _save(ParsedDocument.from_pages(doc_id, pages))
+                return
+    if on_total:
+        on_total(doc.page_count)
+    for page_no, text in enumerate(doc.page_texts, start=1):
+        yield page_no, text
+
+
+def _save(doc: ParsedDocument) -> ParsedDocument:
+    try:
+        os.makedirs(PARSED_DOC_DIR, exist_ok=True)
+        doc.save(_artifact_path(doc.doc_id))
+        get_disk_cache().track(_artifact_path(doc.doc_id), doc.doc_id, "parsed")
+        logging.info("🗂️ Saved parsed artifact for %s (%d pages)", doc.doc_id[:12], doc.page_count)
+    except Exception:
+        logging.exception("Failed to save parsed artifact for %s", doc.doc_id[:12])
+    return _remember(doc)
+
+
+def get_parsed_document(pdf_path: str, doc_id: str = None) -> ParsedDocument:
+    """The parsed artifact for a PDF, parsing it only if nobody has yet."""
+    doc_id = doc_id or file_sha256(pdf_path)
+    doc = _cached(doc_id)
+    if doc is not None:
+        return doc
+    for _ in iter_pages(pdf_path, doc_id):
+        pass
+    return _cached(doc_id)
@@ -0,0 +1,241 @@
+# pdf_store.py
+# Content-addressed store for downloaded PDFs, shared by every session.
+#
+# Layout under `store_dir`:
+#   index.sqlite   url -> (sha256, etag, last_modified), sha256 -> size
+#   objects/       one file per distinct content, named <sha256>.pdf
+#   tmp/           in-flight downloads, moved into objects/ when complete
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+
+import requests
+
+from disk_cache import get_disk_cache
+
+PDF_STORE_DIR = os.environ.get("PDF_STORE_DIR", os.path.join("cache", "pdfs"))
+# Download limits: files above PDF_MAX_MB are refused, the body is written
+# PDF_DOWNLOAD_CHUNK bytes at a time, and a dropped connection is resumed
+# with a Range request up to PDF_DOWNLOAD_RETRIES times.
+PDF_MAX_MB           = int(os.environ.get("PDF_MAX_MB", "100"))
+PDF_DOWNLOAD_CHUNK   = int(os.environ.get("PDF_DOWNLOAD_CHUNK", str(256 * 1024)))
+PDF_DOWNLOAD_RETRIES = int(os.environ.get("PDF_DOWNLOAD_RETRIES", "3"))
+
+
+class PDFTooLarge(ValueError):
+    """The remote PDF is bigger than PDF_MAX_MB."""
+
+
+def _stream_to_file(url: str, part_path: str, timeout: int, max_bytes: int, headers: dict = None,
+                    on_progress=None):
+    """
+    Stream `url` into part_path while hashing it. Returns (sha256 hex,
+    response headers), or None when the server answers a conditional
+    request with 304. Interrupted transfers resume from the bytes on disk,
+    guarded by If-Range so a PDF that changed in between is fetched again
+    from the start instead of spliced onto the old bytes.
+    `on_progress(bytes_written, bytes_expected_or_None)` runs per chunk;
+    an exception it raises aborts the transfer.
+    """
+    hasher = hashlib.sha256()
+    written = 0
+    attempt = 0
+    validators = {}
+    while True:
+        if written:
+            etag = validators.get("ETag") or ""
+            # If-Range needs a strong validator; without one resuming is unsafe
+            if_range = etag if etag and not etag.startswith("W/") else validators.get("Last-Modified")
+            if if_range:
+                req_headers = {"Range": f"bytes={written}-", "If-Range": if_range}
+            else:
+                logging.info("↩️ No validator to resume against; restarting download")
+                hasher, written = hashlib.sha256(), 0
+        if not written:
+            req_headers = dict(headers or {})
+        try:
+            with requests.get(url, headers=req_headers, stream=True, timeout=timeout) as resp:
+                if resp.status_code == 304 and not written:
+                    return None
+                resp.raise_for_status()
+                content_range = resp.headers.get("Content-Range", "")
+                if written and (resp.status_code != 206 or not content_range.startswith(f"bytes {written}-")):
+                    # Range ignored, or the PDF changed (If-Range failed): start over
+                    logging.info("↩️ Server did not resume the download; restarting")
+                    hasher, written = hashlib.sha256(), 0
+                if resp.status_code == 200:
+                    # A resumed (206) body keeps the validators of the full response
+                    validators = resp.headers
+                length = resp.headers.get("Content-Length", "")
+                expected = written + int(length) if length.isdigit() else None
+                if expected is not None and expected > max_bytes:
+                    raise PDFTooLarge(f"PDF is {expected} bytes; limit is {max_bytes}")
+                with open(part_path, "ab" if written else "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=PDF_DOWNLOAD_CHUNK):
+                        if not chunk:
+                            continue
+                        written += len(chunk)
+                        if written > max_bytes:
+                            raise PDFTooLarge(f"PDF exceeds the {max_bytes} byte limit")
+                        hasher.update(chunk)
+                        f.write(chunk)
+                        if on_progress:
+                            on_progress(written, expected)
+                # A short body without an exception still counts as interrupted
+                if expected is not None and written < expected:
+                    raise requests.exceptions.ChunkedEncodingError("connection closed early")
+            return hasher.hexdigest(), validators
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as e:
+            attempt += 1
+            if attempt > PDF_DOWNLOAD_RETRIES:
+                raise
+            logging.warning(f"⚠️ Download interrupted at {written} bytes ({e}); resuming")
+
+
+class PDFStore:
+    """
+    Each distinct PDF is stored once, under its sha256. Objects count
+    against the disk_cache quota and can be evicted once unpinned. Each URL remembers
+    the validators (ETag, Last-Modified) from its last full response, so
+    fetching a known URL again is a conditional GET. A 304 reuses the
+    stored object without transferring the body.
+    """
+
+    def __init__(self, store_dir: str = PDF_STORE_DIR):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, "objects")
+        self.tmp_dir = os.path.join(store_dir, "tmp")
+        self.downloads = 0
+        self.not_modified = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        self._url_locks = {}        # url -> Lock held while that URL is fetched
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(store_dir, "index.sqlite"),
+            check_same_thread=False, isolation_level=None, timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, etag TEXT, last_modified TEXT,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, f"{sha256}.pdf")
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def _known(self, url: str):
+        """
+        (sha256, etag, last_modified) for a URL whose object is still on
+        disk. The object is marked as just used, so the quota sweep leaves
+        it alone while its URL is revalidated.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, etag, last_modified FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row and os.path.exists(self.object_path(row[0])):
+            get_disk_cache().touch(self.object_path(row[0]))
+            return row
+        return None
+
+    def fetch(self, url: str, timeout: int = 15, max_bytes: int = None, on_progress=None):
+        """
+        Return (object_path, sha256) for `url`, downloading only when the
+        server reports new content. Concurrent fetches of one URL share a
+        single transfer.
+        """
+        max_bytes = PDF_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        with self._url_lock(url):
+            known = self._known(url)
+            headers = {}
+            if known:
+                if known[1]:
+                    headers["If-None-Match"] = known[1]
+                if known[2]:
+                    headers["If-Modified-Since"] = known[2]
+
+            part_path = os.path.join(self.tmp_dir, f"{uuid4().hex}.part")
+            try:
+                result = _stream_to_file(url, part_path, timeout, max_bytes, headers, on_progress)
+                if result is None:
+                    if known is not None and os.path.exists(self.object_path(known[0])):
+                        self.not_modified += 1
+                        logging.info(f"♻️ PDF unchanged since last fetch: {url}")
+                        get_disk_cache().touch(self.object_path(known[0]))
+                        return self.object_path(known[0]), known[0]
+                    # 304 without validators of ours, or the object is gone: ask for the body
+                    logging.info(f"↩️ 304 with nothing stored to reuse; fetching {url} unconditionally")
+                    result = _stream_to_file(url, part_path, timeout, max_bytes, None, on_progress)
+                    if result is None:
+                        raise requests.exceptions.HTTPError(f"304 Not Modified to an unconditional GET of {url}")
+                digest, validators = result
+                path = self.object_path(digest)
+                if os.path.exists(path):
+                    # Same bytes under another URL (or a server without validators)
+                    self.deduplicated += 1
+                    os.remove(part_path)
+                else:
+                    os.replace(part_path, path)
+                self.downloads += 1
+            finally:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+
+            now = time.time()
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO objects (sha256, size, created_at) VALUES (?, ?, ?)",
+                    (digest, os.path.getsize(path), now),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO urls (url, sha256, etag, last_modified, fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (url, digest, validators.get("ETag"), validators.get("Last-Modified"), now),
+                )
+            get_disk_cache().track(path, digest, "pdf")
+            return path, digest
+
+    def stats(self) -> dict:
+        with self._lock:
+            urls = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            objects, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects"
+            ).fetchone()
+        return {
+            "downloads": self.downloads,
+            "not_modified": self.not_modified,
+            "deduplicated": self.deduplicated,
+            "urls": urls,
+            "objects": objects,
+            "bytes": size,
+        }
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_pdf_store() -> PDFStore:
+    """Process-wide store instance."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = PDFStore()
+        return _shared_store
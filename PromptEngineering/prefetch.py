@@ -0,0 +1,230 @@
+# prefetch.py
+# Speculative download + parse + embed of the papers a user is likely to open.
+#
+# /search hands over its top results. A small, low-priority pool fetches
+# each PDF into the content-addressed store and fills the parsed-artifact and
+# embedding caches (rag.prefetch_document). Nothing is made warm, so
+# prefetching never evicts a document someone is reading. When the paper is
+# opened, /update-pdf builds its warm index from those caches.
+#
+# Opt-in with PREFETCH_ENABLED=1. It stays within a disk budget (bytes of
+# prefetched PDFs nobody has opened yet) and an hourly embedding API budget.
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from load_jobs import get_load_jobs
+from pdf_store import get_pdf_store
+from rag import prefetch_document, registry
+
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+PREFETCH_TOP_K = int(os.environ.get("PREFETCH_TOP_K", "3"))
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "1"))
+# Bytes of prefetched-but-unopened PDFs allowed on disk
+PREFETCH_MAX_MB = float(os.environ.get("PREFETCH_MAX_MB", "200"))
+# Texts sent to the embedding API per rolling hour
+PREFETCH_EMBED_BUDGET = int(os.environ.get("PREFETCH_EMBED_BUDGET", "2000"))
+# Longest a queued prefetch waits for foreground loads to finish
+PREFETCH_YIELD_SECONDS = float(os.environ.get("PREFETCH_YIELD_SECONDS", "30"))
+# Prefetch records kept for hit accounting
+PREFETCH_HISTORY = 256
+
+
+class Prefetcher:
+    """
+    Each /search supersedes the previous one: prefetches of URLs that are
+    not among its results are dropped, queued ones when a worker reaches
+    them and running ones between embedding batches. A click on a result
+    (/log-click) drops every other URL of that search the same way, so the
+    foreground load has the pool and the API budget to itself; the clicked
+    URL's own prefetch keeps going.
+    """
+
+    def __init__(self, workers: int = PREFETCH_WORKERS, top_k: int = PREFETCH_TOP_K,
+                 max_bytes: int = int(PREFETCH_MAX_MB * 1024 * 1024),
+                 embed_budget: int = PREFETCH_EMBED_BUDGET):
+        self.top_k = top_k
+        self.max_bytes = max_bytes
+        self.embed_budget = embed_budget
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._docs = OrderedDict()   # url -> {"state", "generation", "doc_id", "bytes", "seconds", "opened"}
+        self._spend = deque()        # (timestamp, api items) within the last hour
+        self.queued = 0
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.clicks = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    # ── feeding ───────────────────────────────────────────────────────────
+    def on_search(self, results: list) -> None:
+        """Queue the top-k results ({"url", ...}) of a fresh search."""
+        urls = [r.get("url") for r in results[:self.top_k] if r.get("url")]
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            fresh = []
+            for url in urls:
+                rec = self._docs.get(url)
+                if rec is not None and rec["state"] in ("queued", "running"):
+                    # Still wanted by this search: carry it over
+                    rec["generation"] = generation
+                elif rec is None or rec["state"] != "done":
+                    # New, or skipped or failed earlier: worth another try
+                    self._docs[url] = {"state": "queued", "generation": generation, "doc_id": None,
+                                       "bytes": 0, "seconds": None, "opened": False}
+                    self._trim()
+                    fresh.append(url)
+            self.queued += len(fresh)
+        for url in fresh:
+            self._pool.submit(self._run, url)
+
+    def on_click(self, url: str) -> None:
+        """The user picked a result: keep its prefetch, drop the search's other URLs."""
+        with self._lock:
+            self._generation += 1
+            self.clicks += 1
+            rec = self._docs.get(url)
+            if rec is not None and rec["state"] in ("queued", "running"):
+                rec["generation"] = self._generation
+
+    def on_open(self, job) -> None:
+        """
+        A load job made `job.url` the open document. Counts a hit if the
+        prefetch had finished, a partial hit if it was running or stopped
+        part-way, and
+        credits the prefetch time the user did not have to wait for.
+        """
+        with self._lock:
+            rec = self._docs.get(job.url)
+            if rec is None or rec["state"] not in ("running", "partial", "done"):
+                self.misses += 1
+                return
+            if rec["opened"]:
+                return
+            rec["opened"] = True
+            if rec["state"] == "done":
+                self.hits += 1
+                waited = (job.ready_at or time.time()) - job.created_at
+                self.saved_seconds += max(0.0, rec["seconds"] - waited)
+            else:
+                self.partial_hits += 1
+
+    # ── work ─────────────────────────────────────────────────────────────
+    def _trim(self) -> None:
+        while len(self._docs) > PREFETCH_HISTORY:
+            self._docs.popitem(last=False)
+
+    def _unopened_bytes(self) -> int:
+        return sum(r["bytes"] for r in self._docs.values()
+                   if r["state"] in ("partial", "done") and not r["opened"])
+
+    def _api_items_last_hour(self) -> int:
+        cutoff = time.time() - 3600
+        while self._spend and self._spend[0][0] < cutoff:
+            self._spend.popleft()
+        return sum(n for _, n in self._spend)
+
+    def _stale(self, url: str) -> bool:
+        """Neither the latest search nor the latest click still wants `url`."""
+        rec = self._docs.get(url)
+        return rec is None or rec["generation"] != self._generation
+
+    def _yield_to_foreground(self, url: str) -> None:
+        """Wait (bounded) while user-initiated loads are running."""
+        deadline = time.time() + PREFETCH_YIELD_SECONDS
+        while get_load_jobs().stats()["active"] and time.time() < deadline and not self._stale(url):
+            time.sleep(0.5)
+
+    def _set(self, url: str, **fields) -> None:
+        with self._lock:
+            rec = self._docs.get(url)
+            if rec is not None:
+                rec.update(fields)
+
+    def _run(self, url: str) -> None:
+        self._yield_to_foreground(url)
+        with self._lock:
+            if url not in self._docs:
+                return  # aged out of the history
+            reason = None
+            if self._stale(url):
+                reason = "superseded"
+            elif self._unopened_bytes() >= self.max_bytes:
+                reason = "disk budget"
+            elif self._api_items_last_hour() >= self.embed_budget:
+                reason = "API budget"
+            if reason:
+                self.skipped += 1
+                if url in self._docs:
+                    self._docs[url]["state"] = "skipped"
+                logging.info(f"⏭️ Prefetch skipped ({reason}): {url}")
+                return
+            budget_left = self.embed_budget - self._api_items_last_hour()
+            self._docs[url]["state"] = "running"
+
+        started = time.perf_counter()
+        try:
+            path, doc_id = get_pdf_store().fetch(url)
+            self._set(url, doc_id=doc_id, bytes=os.path.getsize(path))
+            state = "done"
+            if registry.get(doc_id) is None:
+                result = prefetch_document(
+                    path, doc_id, max_items=budget_left,
+                    should_stop=lambda: self._stale(url),
+                )
+                with self._lock:
+                    self._spend.append((time.time(), result["api_items"]))
+                if not result["complete"]:
+                    state = "partial"
+            self._set(url, state=state, seconds=time.perf_counter() - started)
+            with self._lock:
+                self.completed += 1
+            logging.info(f"🔮 Prefetched {url} in {time.perf_counter() - started:.1f}s")
+        except Exception:
+            logging.exception(f"Prefetch failed for {url}")
+            self._set(url, state="failed")
+            with self._lock:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            opened = self.hits + self.partial_hits + self.misses
+            return {
+                "enabled": True,
+                "queued": self.queued,
+                "clicks": self.clicks,
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "failed": self.failed,
+                "hits": self.hits,
+                "partial_hits": self.partial_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / opened, 3) if opened else None,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "unopened_bytes": self._unopened_bytes(),
+                "api_items_last_hour": self._api_items_last_hour(),
+            }
+
+
+_shared_prefetcher = None
+_shared_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Process-wide prefetcher; None unless PREFETCH_ENABLED is set."""
+    global _shared_prefetcher
+    if not PREFETCH_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_prefetcher is None:
+            _shared_prefetcher = Prefetcher()
+        return _shared_prefetcher
@@ -4,17 +4,72 @@ import google.generativeai as genai
 from chromadb import Documents, EmbeddingFunction, Embeddings
 from google.api_core import retry
 import chromadb
-from data_extraction import extract_sections
+from disk_cache import get_disk_cache
+from embedding_cache import get_embedding_cache
+from doc_registry import DocumentRegistry, file_sha256
+from bm25_index import BM25Index, tokenize as _tokenize, top_k_from_scores
+from vector_index import NumpyVectorIndex
+from parsed_document import get_parsed_document, iter_pages
 from API_KEY import API_KEY
 import os
-import pdfplumber
+import queue
+import json
+import hashlib
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(level=logging.INFO)
 genai.configure(api_key=API_KEY)
 
 chroma_client = chromadb.Client()
-db = None
+
+# "chroma" (default) or "numpy" for the in-process NumpyVectorIndex, whose
+# storage is float16 or int8 (RAG_NUMPY_DTYPE)
+RAG_VECTOR_BACKEND = os.environ.get("RAG_VECTOR_BACKEND", "chroma").strip().lower()
+RAG_NUMPY_DTYPE = os.environ.get("RAG_NUMPY_DTYPE", "float16").strip().lower()
+
+
+def _collection_name(doc_id: str) -> str:
+    return f"doc_{doc_id[:40]}"
+
+
+def _new_index(doc_id: str, embedder, backend: str = None):
+    """Create an empty per-document vector index for the configured backend."""
+    backend = backend or RAG_VECTOR_BACKEND
+    if backend == "numpy":
+        return NumpyVectorIndex(embedding_function=embedder, dtype=RAG_NUMPY_DTYPE)
+    name = _collection_name(doc_id)
+    try:
+        chroma_client.delete_collection(name)
+        logging.info("Deleted stale collection %s.", name)
+    except Exception:
+        pass
+    return chroma_client.get_or_create_collection(
+        name=name,
+        embedding_function=embedder
+    )
+
+
+def _drop_collection(entry) -> None:
+    get_disk_cache().unpin(entry.doc_id)
+    if isinstance(entry.index, NumpyVectorIndex):
+        return  # freed with the entry
+    chroma_client.delete_collection(_collection_name(entry.doc_id))
+
+
+# One vector index per document; the least recently used are dropped
+registry = DocumentRegistry(on_evict=_drop_collection)
+
+_load_locks = {}   # doc_id -> Lock held while that document's index is created
+_load_locks_lock = threading.Lock()
+
+
+def _load_lock(doc_id: str) -> threading.Lock:
+    with _load_locks_lock:
+        return _load_locks.setdefault(doc_id, threading.Lock())
 
 def create_documents_from_dict(topic_text_dict):
     documents = []
@@ -26,31 +81,212 @@ def create_documents_from_dict(topic_text_dict):
     
     return documents
 
+# text-embedding-004 output size; also used for the zero-vector fallback
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_DIM = 768
+# batchEmbedContents accepts at most 100 texts per request
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_IN_FLIGHT = int(os.environ.get("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_ITEM_RETRIES = 2
+
+
+def _gemini_embed_batch(texts: list) -> list:
+    """One batchEmbedContents round trip; returns one vector per input text."""
+    resp = genai.embed_content(
+        model=EMBEDDING_MODEL,
+        content=texts,
+        # task_type can be omitted; the model infers it sufficiently well
+        request_options={"retry": retry.Retry(predicate=retry.if_transient_error)},
+    )
+    return resp["embedding"]
+
+
 class GeminiEmbeddingFunction(EmbeddingFunction):
+    """
+    Embeds chunks in provider-sized batches with a bounded number of
+    batches in flight. Output order always matches input order.
+
+    `embed_batch` can be swapped for a local stand-in (see benchmarks.py);
+    it takes a list of strings and returns a list of vectors. Texts found in
+    the persistent embedding cache are never sent to the API.
+    """
+
+    def __init__(self, embed_batch=None, batch_size: int = EMBED_BATCH_SIZE,
+                 max_in_flight: int = EMBED_MAX_IN_FLIGHT, cache="default",
+                 model: str = EMBEDDING_MODEL):
+        self._embed_batch = embed_batch or _gemini_embed_batch
+        self.cache = get_embedding_cache() if cache == "default" else cache
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self.calls = 0
+            self.items = 0
+            self.cache_hits = 0
+            self.call_seconds = 0.0
+            self.wall_seconds = 0.0
+
+    def stats(self) -> dict:
+        """API calls made, texts sent and time spent since the last reset."""
+        with self._stats_lock:
+            return {
+                "calls": self.calls,
+                "items": self.items,
+                "cache_hits": self.cache_hits,
+                "call_seconds": round(self.call_seconds, 4),
+                "wall_seconds": round(self.wall_seconds, 4),
+            }
+
+    def _timed_call(self, texts: list) -> list:
+        start = time.perf_counter()
+        try:
+            return list(self._embed_batch(texts))
+        finally:
+            with self._stats_lock:
+                self.calls += 1
+                self.items += len(texts)
+                self.call_seconds += time.perf_counter() - start
+
+    def _embed_one_batch(self, texts: list) -> list:
+        try:
+            vectors = self._timed_call(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        except Exception:
+            logging.warning("Embedding batch of %d failed; retrying items individually", len(texts))
+            vectors = [None] * len(texts)
+
+        # Only the items that came back empty are sent again
+        for i, vec in enumerate(vectors):
+            attempts = 0
+            while not vec and attempts < EMBED_ITEM_RETRIES:
+                attempts += 1
+                try:
+                    [vec] = self._timed_call([texts[i]])
+                except Exception:
+                    vec = None
+            vectors[i] = vec or None
+        return vectors
+
+    def _embed_uncached(self, items: list) -> list:
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        if len(batches) == 1:
+            results = [self._embed_one_batch(batches[0])]
+        else:
+            workers = min(self.max_in_flight, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # map() yields in submission order, so chunks stay aligned with ids
+                results = list(pool.map(self._embed_one_batch, batches))
+        return [vec for batch in results for vec in batch]
+
     def __call__(self, input: Documents) -> Embeddings:
         # Chroma calls this with a list of strings; return a list of vectors
         items = input if isinstance(input, list) else [input]
-        embeddings: Embeddings = []
-        for text in items:
+        if not items:
+            return []
+        start = time.perf_counter()
+
+        embeddings: Embeddings = [None] * len(items)
+        if self.cache is not None:
             try:
-                resp = genai.embed_content(
-                    model="models/text-embedding-004",
-                    content=text,
-                    # task_type can be omitted; the model infers it sufficiently well
-                    request_options={"retry": retry.Retry(predicate=retry.if_transient_error)},
-                )
-                embeddings.append(resp["embedding"])
+                embeddings = self.cache.get_many(self.model, items)
             except Exception:
-                logging.exception("Embedding failed; using zero vector fallback")
-                embeddings.append([0.0] * 768)
+                logging.exception("Embedding cache lookup failed")
+        # Embed each distinct missing text once
+        missing = list(dict.fromkeys(t for t, vec in zip(items, embeddings) if vec is None))
+        with self._stats_lock:
+            self.cache_hits += len(items) - sum(1 for vec in embeddings if vec is None)
+
+        if missing:
+            fresh = dict(zip(missing, self._embed_uncached(missing)))
+            if self.cache is not None:
+                ok = [t for t in missing if fresh[t] is not None]
+                try:
+                    self.cache.put_many(self.model, ok, [fresh[t] for t in ok])
+                except Exception:
+                    logging.exception("Embedding cache write failed")
+            for i, text in enumerate(items):
+                if embeddings[i] is None:
+                    embeddings[i] = fresh[text]
+
+        for i, vec in enumerate(embeddings):
+            if vec is None:
+                logging.error("Embedding failed; using zero vector fallback")
+                embeddings[i] = [0.0] * EMBEDDING_DIM
+        with self._stats_lock:
+            self.wall_seconds += time.perf_counter() - start
         return embeddings
 
 
-def get_contextual_definition(highlighted_text):
+class DocumentLoading(LookupError):
+    """The document is known but not searchable yet; retry shortly."""
+
+
+def get_document(doc_id: str):
+    """
+    Return the WarmIndex for a document, re-indexing it from its PDF if it
+    was evicted (waiting until its first batch is searchable). Raises
+    LookupError for documents never loaded and DocumentLoading if the
+    re-indexed document is still not available.
+    """
+    if not doc_id:
+        raise LookupError("No document loaded")
+    entry = registry.get(doc_id)
+    if entry is not None:
+        return entry
+    pdf_path = registry.path_for(doc_id)
+    if not pdf_path or not os.path.exists(pdf_path):
+        raise LookupError(f"Document {doc_id[:12]} is not loaded")
+    logging.info("Document %s is cold; re-indexing from %s", doc_id[:12], pdf_path)
+    reload_rag_model(pdf_path, doc_id=doc_id, background=True)
+    entry = registry.get(doc_id)
+    if entry is None:
+        # Evicted again or superseded before its first batch landed
+        raise DocumentLoading(f"Document {doc_id[:12]} is still loading")
+    return entry
+
+
+def get_collection(doc_id: str):
+    return get_document(doc_id).index
+
+
+# Per-(document, term) definition cache so repeat highlights are instant
+DEFINITION_CACHE_SIZE = int(os.environ.get("DEFINITION_CACHE_SIZE", "1024"))
+# Terms explained per LLM call by get_contextual_definitions
+DEFINITIONS_PER_CALL = int(os.environ.get("DEFINITIONS_PER_CALL", "8"))
+_definition_cache = OrderedDict()   # (doc_id, term.lower()) -> (definition, page)
+_definition_lock = threading.Lock()
+
+
+def _cached_definition(doc_id, term):
+    with _definition_lock:
+        hit = _definition_cache.get((doc_id, term.lower()))
+        if hit is not None:
+            _definition_cache.move_to_end((doc_id, term.lower()))
+        return hit
+
+
+def _remember_definition(doc_id, term, definition, page=None):
+    with _definition_lock:
+        _definition_cache[(doc_id, term.lower())] = (definition, page)
+        _definition_cache.move_to_end((doc_id, term.lower()))
+        while len(_definition_cache) > DEFINITION_CACHE_SIZE:
+            _definition_cache.popitem(last=False)
+
+
+def get_contextual_definition(highlighted_text, doc_id):
     search_term = highlighted_text.strip()
     print(f"🔍 Looking up: '{search_term}'")
 
-    results = db.query(query_texts=[search_term], n_results=1)
+    cached = _cached_definition(doc_id, search_term)
+    if cached is not None:
+        return cached[0]
+
+    results = get_collection(doc_id).query(query_texts=[search_term], n_results=1)
 
     if not results["documents"] or not results["documents"][0]:
         print("⚠️ No relevant passage found. Returning fallback.")
@@ -101,112 +337,358 @@ Passage: {passage.replace('\n', ' ')}
     model = genai.GenerativeModel("gemini-2.5-flash-lite")
     response = model.generate_content(prompt)
     s = f"\nContextual meaning of '{search_term}':"
+    _remember_definition(doc_id, search_term, s + response.text)
     return(s + response.text)
 
+
+def _definitions_prompt(groups: list) -> str:
+    """One prompt covering several (passage, [terms]) groups; answers come back as JSON."""
+    blocks = []
+    for n, (passage, terms) in enumerate(groups, start=1):
+        quoted = ", ".join(f"'{t}'" for t in terms)
+        flat = " ".join(passage.split())
+        blocks.append(f"Passage {n} (terms: {quoted}):\n{flat}")
+    joined = "\n\n".join(blocks)
+    return f"""
+Explain the specific meaning and context of each listed term based EXCLUSIVELY on
+the technical document passage it is listed with.
+
+For every term return:
+- "operational_context": one paragraph of no more than 50 words
+- "other_use_cases": one paragraph of no more than 50 words
+Plain text only: no hashtags, bullet points, code blocks or special characters.
+
+Return ONLY a JSON object of the form:
+{{"definitions": [{{"term": "<term exactly as listed>", "operational_context": "...", "other_use_cases": "..."}}]}}
+
+{joined}
+"""
+
+
+def _define_group_call(groups: list) -> dict:
+    """One LLM call for several groups; returns {term.lower(): markdown definition}."""
+    model = genai.GenerativeModel(
+        "gemini-2.5-flash-lite",
+        generation_config={"response_mime_type": "application/json"},
+    )
+    response = model.generate_content(_definitions_prompt(groups))
+    text = (response.text or "").strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("{"):]
+    out = {}
+    for item in json.loads(text).get("definitions", []):
+        term = str(item.get("term", "")).strip()
+        if not term:
+            continue
+        out[term.lower()] = (
+            f"\nContextual meaning of '{term}':"
+            f"\n\n**Operational Context**\n{str(item.get('operational_context', '')).strip()}"
+            f"\n\n**Other Use-cases**\n{str(item.get('other_use_cases', '')).strip()}"
+        )
+    return out
+
+
+def get_contextual_definitions(highlighted_texts: list, doc_id) -> list:
+    """
+    Batch form of get_contextual_definition.
+
+    Cached terms are answered immediately. All other terms are retrieved with
+    one multi-query, terms that land on the same passage share it, and the
+    passages are explained DEFINITIONS_PER_CALL terms per LLM call. Returns
+    one {"term", "analysis", "page", "cached"} dict per distinct input term,
+    in input order; "error" is set for terms that could not be explained.
+    """
+    terms = list(dict.fromkeys(t.strip() for t in highlighted_texts if t and t.strip()))
+    results = {}
+    pending = []
+    for term in terms:
+        cached = _cached_definition(doc_id, term)
+        if cached is not None:
+            results[term] = {"term": term, "analysis": cached[0], "page": cached[1], "cached": True}
+        else:
+            pending.append(term)
+
+    if pending:
+        found = get_collection(doc_id).query(query_texts=pending, n_results=1)
+        by_passage = OrderedDict()   # passage id -> (passage, page, [terms])
+        for i, term in enumerate(pending):
+            docs = found["documents"][i] if found.get("documents") else []
+            if not docs:
+                results[term] = {"term": term, "analysis": None, "page": None, "cached": False,
+                                 "error": f"No relevant passage found for '{term}'."}
+                continue
+            pid = found["ids"][i][0] if found.get("ids") else docs[0]
+            metas = found.get("metadatas") or []
+            page = (metas[i][0] or {}).get("page") if i < len(metas) and metas[i] else None
+            by_passage.setdefault(pid, (docs[0], page, []))[2].append(term)
+
+        # Fold passage groups into as few calls as the per-call term limit allows
+        calls, current, size = [], [], 0
+        for passage, page, group_terms in by_passage.values():
+            if current and size + len(group_terms) > DEFINITIONS_PER_CALL:
+                calls.append(current)
+                current, size = [], 0
+            current.append((passage, page, group_terms))
+            size += len(group_terms)
+        if current:
+            calls.append(current)
+
+        def run(call):
+            try:
+                return call, _define_group_call([(p, ts) for p, _, ts in call]), None
+            except Exception as e:
+                logging.exception("Batch definition call failed")
+                return call, {}, str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(4, len(calls)))) as pool:
+            for call, defined, error in pool.map(run, calls):
+                for _, page, group_terms in call:
+                    for term in group_terms:
+                        analysis = defined.get(term.lower())
+                        if analysis is None:
+                            results[term] = {"term": term, "analysis": None, "page": page, "cached": False,
+                                             "error": error or "Model returned no definition for this term."}
+                            continue
+                        _remember_definition(doc_id, term, analysis, page)
+                        results[term] = {"term": term, "analysis": analysis, "page": page, "cached": False}
+
+    return [results[t] for t in terms]
+
 # Run the interactive lookup
 '''
 for highlighted_text in clipboard_highight_monitor():
     print(get_contextual_definition(highlighted_text))
 '''
 
-def reload_rag_model(pdf_path: str = None) -> None:
-    """
-    Build or rebuild the Chroma collection from scratch.
-    """
-    global db
-    try:
-        chroma_client.delete_collection("googlecardb")
-        logging.info("Deleted existing collection.")
-    except:
-        logging.info("No existing collection to delete; continuing.")
-
-    db = chroma_client.get_or_create_collection(
-        name="googlecardb",
-        embedding_function=GeminiEmbeddingFunction()
-    )
+# Pages per extract -> chunk -> embed -> add step; the first step gates the
+# first answer, so keep it small
+INGEST_BATCH_PAGES = int(os.environ.get("INGEST_BATCH_PAGES", "4"))
+
 
-    # Ingest per page, then chunk to improve recall; keep page metadata
+def _chunk_page(text: str, page_no: int, source: str, chunk_size: int = 900, overlap: int = 150):
+    """Split one page's text into overlapping character chunks with page metadata."""
     docs = []
     metadatas = []
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for idx, page in enumerate(pdf.pages, start=1):
-                # Layout-aware extraction tends to preserve columns/ordering better
-                text = page.extract_text(x_tolerance=2, y_tolerance=2) or ""
-                text = text.strip()
-                if not text:
-                    continue
-                # chunk the page text (approx by characters)
-                chunk_size = 900
-                overlap = 150
+    start = 0
+    chunk_idx = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_size)
+        chunk = text[start:end]
+        # avoid tiny trailing chunks
+        if len(chunk.strip()) < 40 and end != len(text):
+            start = end - overlap
+            if start < 0:
                 start = 0
-                chunk_idx = 0
-                while start < len(text):
-                    end = min(len(text), start + chunk_size)
-                    chunk = text[start:end]
-                    # avoid tiny trailing chunks
-                    if len(chunk.strip()) < 40 and end != len(text):
-                        start = end - overlap
-                        if start < 0:
-                            start = 0
-                        continue
-                    docs.append(chunk)
-                    metadatas.append({
-                        "page": idx,
-                        "source": os.path.basename(pdf_path),
-                        "chunk": chunk_idx
-                    })
-                    chunk_idx += 1
-                    if end == len(text):
-                        break
-                    start = end - overlap
+            continue
+        docs.append(chunk)
+        metadatas.append({
+            "page": page_no,
+            "source": source,
+            "chunk": chunk_idx,
+            # character offset in the page text; lets the context packer merge overlaps
+            "start": start
+        })
+        chunk_idx += 1
+        if end == len(text):
+            break
+        start = end - overlap
+    return docs, metadatas
+
+
+def _extract_pages(pdf_path: str, out: queue.Queue, entry) -> None:
+    """Producer: push (page_no, text) for every page, then None (or the error)."""
+    def set_total(total):
+        entry.pages_total = total
+
+    try:
+        # Reads the shared parsed artifact, or parses the PDF once and saves it
+        for idx, text in iter_pages(pdf_path, entry.doc_id, on_total=set_total):
+            if entry.cancelled or entry.done.is_set():
+                break
+            out.put((idx, text.strip()))
+            entry.pages_extracted = idx
+        out.put(None)
     except Exception as e:
-        logging.exception("Failed to extract pages for RAG: %s", e)
-        docs = []
-        metadatas = []
+        out.put(e)
 
-    if not docs:
-        # Fallback to previous section extraction when pages empty
-        topic_text_dict = extract_sections(pdf_path)
-        docs = create_documents_from_dict(topic_text_dict)
-        metadatas = [{"page": None, "source": os.path.basename(pdf_path)} for _ in docs]
 
-    db.add(documents=docs, metadatas=metadatas, ids=[str(i) for i in range(len(docs))])
-    logging.info(f"✅ RAG model reset from '{pdf_path}', {len(docs)} page-chunks loaded.")
+def _ingest(entry, pdf_path: str, embedder) -> None:
+    """
+    Stream pages through extract -> chunk -> embed -> add in small batches.
+    Extraction runs one step ahead on its own thread while the previous
+    batch is embedded. entry.pages_indexed is the progress watermark.
+    """
+    collection = entry.index
+    source = os.path.basename(pdf_path)
+    # Unbounded: page text is small, and the producer must never block on a
+    # consumer that has already given up
+    pages = queue.Queue()
+    threading.Thread(target=_extract_pages, args=(pdf_path, pages, entry), daemon=True).start()
 
+    def add_batch(docs, metadatas, last_page):
+        if docs:
+            ids = [str(entry.chunks + i) for i in range(len(docs))]
+            collection.add(documents=docs, metadatas=metadatas, ids=ids)
+            entry.lexical.add(docs)
+            entry.chunks += len(docs)
+            if isinstance(collection, NumpyVectorIndex):
+                entry.nbytes = collection.nbytes()
+            else:
+                # Rough resident size: float32 vectors plus the stored chunk text
+                entry.nbytes += len(docs) * EMBEDDING_DIM * 4 + sum(len(d.encode("utf-8")) for d in docs)
+        entry.pages_indexed = last_page
+        if entry.chunks:
+            entry.ready.set()
 
-def _tokenize(text: str) -> list:
-    if not text:
-        return []
-    return re.findall(r"[a-zA-Z0-9]+", text.lower())
+    try:
+        docs, metadatas, batch_pages, last_page = [], [], 0, 0
+        while True:
+            item = pages.get()
+            if isinstance(item, Exception):
+                logging.error("Failed to extract pages for RAG: %s", item)
+                break
+            if item is None or entry.cancelled:
+                break
+            last_page, text = item
+            if text:
+                page_docs, page_metas = _chunk_page(text, last_page, source)
+                docs += page_docs
+                metadatas += page_metas
+            batch_pages += 1
+            if batch_pages >= INGEST_BATCH_PAGES:
+                add_batch(docs, metadatas, last_page)
+                docs, metadatas, batch_pages = [], [], 0
+        add_batch(docs, metadatas, last_page)
 
+        if not entry.chunks and not entry.cancelled:
+            # Fallback to previous section extraction when pages empty
+            topic_text_dict = get_parsed_document(pdf_path, entry.doc_id).sections
+            docs = create_documents_from_dict(topic_text_dict)
+            add_batch(docs, [{"page": None, "source": source} for _ in docs], entry.pages_total)
+        entry.complete = not entry.cancelled
+        logging.info(f"✅ RAG model loaded from '{pdf_path}' as {entry.doc_id[:12]}, {entry.chunks} page-chunks.")
+        logging.info("Embedding stats: %s", embedder.stats())
+    except Exception as e:
+        logging.exception("Ingestion failed for %s", pdf_path)
+        entry.error = str(e)
+        # Don't keep serving a half-built index; the next request rebuilds it.
+        # A newer load of the same document may have replaced this entry already.
+        registry.evict(entry.doc_id, expected=entry)
+    finally:
+        entry.ready.set()
+        entry.done.set()
 
-def _lexical_overlap_score(query_tokens: list, doc_text: str) -> float:
-    if not query_tokens or not doc_text:
-        return 0.0
-    doc_tokens = set(_tokenize(doc_text))
-    if not doc_tokens:
-        return 0.0
-    overlap = sum(1 for t in set(query_tokens) if t in doc_tokens)
-    return overlap / max(1, len(set(query_tokens)))
 
+def reload_rag_model(pdf_path: str = None, doc_id: str = None, background: bool = False) -> str:
+    """
+    Index a PDF into its own vector index (a Chroma collection unless
+    RAG_VECTOR_BACKEND=numpy) and return its document id (sha256 of the
+    file). Documents that are still warm are not rebuilt.
 
-def chat_with_doc(user_question):
-    # Clean the input
-    query = user_question.strip()
+    With background=True this returns as soon as the first batch of pages is
+    searchable and the rest of the document keeps indexing on a thread.
+    """
+    doc_id = doc_id or file_sha256(pdf_path)
+    registry.register(doc_id, pdf_path)
+    # Concurrent cold loads of one document create a single index (and a
+    # single pin); the others wait on its entry below
+    with _load_lock(doc_id):
+        entry = registry.get(doc_id)
+        if entry is None:
+            embedder = GeminiEmbeddingFunction()
+            collection = _new_index(doc_id, embedder)
+            entry = registry.put(doc_id, collection)
+            entry.lexical = BM25Index()
+            # A warm document's PDF and artifacts stay on disk while it is indexed
+            get_disk_cache().pin(doc_id)
+            created = True
+        else:
+            created = False
+    if not created:
+        logging.info("✅ Document %s already indexed; reusing warm collection.", doc_id[:12])
+        (entry.ready if background else entry.done).wait()
+        return doc_id
+
+    if not background:
+        _ingest(entry, pdf_path, embedder)
+        return doc_id
+    threading.Thread(target=_ingest, args=(entry, pdf_path, embedder), daemon=True).start()
+    entry.ready.wait()
+    return doc_id
+
+
+def prefetch_document(pdf_path: str, doc_id: str = None, max_items: int = None, should_stop=None) -> dict:
+    """
+    Parse and embed a PDF into the persistent caches (parsed artifact and
+    embedding cache) without making it warm, so speculative work never
+    evicts a document someone is reading. Opening it later through
+    reload_rag_model builds the warm index from those caches, with no
+    embedding API calls.
 
-    # Query ChromaDB for relevant context
-    query_tokens = _tokenize(query)
-    results = db.query(query_texts=[query], n_results=12)
+    Stops early once `max_items` texts have been sent to the API or
+    `should_stop()` returns true. Returns counts of pages, chunks and API
+    items embedded, and whether the whole document was covered.
+    """
+    doc_id = doc_id or file_sha256(pdf_path)
+    embedder = GeminiEmbeddingFunction()
+    source = os.path.basename(pdf_path)
+    pages = chunks = 0
+    docs = []
+    complete = False
+
+    def flush():
+        nonlocal docs, chunks
+        if docs:
+            embedder(docs)
+            chunks += len(docs)
+            docs = []
+
+    if should_stop and should_stop():
+        return {"doc_id": doc_id, "pages": 0, "chunks": 0, "complete": False, "api_items": 0}
+    # Parse first and embed after: the parse lock is released before the slow
+    # part, so a foreground load of the same paper does not wait behind it
+    parsed = get_parsed_document(pdf_path, doc_id)
+    for page_no, text in enumerate(parsed.page_texts, start=1):
+        if should_stop and should_stop():
+            break
+        if max_items is not None and embedder.stats()["items"] >= max_items:
+            break
+        pages = page_no
+        if text.strip():
+            docs += _chunk_page(text.strip(), page_no, source)[0]
+        if page_no % INGEST_BATCH_PAGES == 0:
+            flush()
+    else:
+        flush()
+        complete = True
+    return {"doc_id": doc_id, "pages": pages, "chunks": chunks, "complete": complete,
+            "api_items": embedder.stats()["items"]}
+
+
+# Candidates taken from each ranking before fusion
+HYBRID_TOP_K = 12
+
+
+def _hybrid_rank(entry, query: str, k: int = HYBRID_TOP_K):
+    """
+    Fuse the vector top-k with the BM25 top-k over the whole document.
+
+    Returns (passages, metadatas, ranked) where ranked holds
+    (combined_score, index_into_passages, passage), best first. Chunks that
+    only the lexical side found get the k-th vector similarity as an upper
+    bound, since they ranked below it.
+    """
+    results = entry.index.query(query_texts=[query], n_results=k)
     if not results.get("documents") or not results["documents"][0]:
-        return {"text": "Sorry, I couldn’t find that in the document.", "page": None}
-    passages = results["documents"][0]
-    metadatas = results.get("metadatas", [[{}]])[0]
-    distances = results.get("distances", [[None]])[0]
+        return [], [], []
+    passages = list(results["documents"][0])
+    ids = list(results.get("ids", [[]])[0])
+    metadatas = list(results.get("metadatas", [[{}]])[0] or [{} for _ in passages])
+    distances = results.get("distances", [[None]])[0] or [None for _ in passages]
 
-    ranked = []
-    for idx, p in enumerate(passages):
-        dist = distances[idx]
+    vec_sims = []
+    for dist in distances:
         # Convert distance to similarity if available; else assume neutral
         vec_sim = 0.0
         if dist is not None:
@@ -214,29 +696,136 @@ def chat_with_doc(user_question):
                 vec_sim = 1.0 / (1.0 + float(dist))
             except Exception:
                 vec_sim = 0.0
-        lex = _lexical_overlap_score(query_tokens, p)
-        combined = 0.65 * vec_sim + 0.35 * lex
-        ranked.append((combined, idx, p))
+        vec_sims.append(vec_sim)
 
+    bm25 = entry.lexical.scores(query) if entry.lexical is not None else None
+    if bm25 is not None and len(bm25):
+        seen = set(ids)
+        extra = [str(cid) for cid, _ in top_k_from_scores(bm25, k) if str(cid) not in seen]
+        if extra:
+            got = entry.index.get(ids=extra, include=["documents", "metadatas"])
+            floor = min(vec_sims) if vec_sims else 0.0
+            for cid, doc, meta in zip(got["ids"], got["documents"], got.get("metadatas") or [{} for _ in got["ids"]]):
+                ids.append(cid)
+                passages.append(doc)
+                metadatas.append(meta or {})
+                vec_sims.append(floor)
+        max_lex = float(bm25.max())
+    else:
+        max_lex = 0.0
+
+    ranked = []
+    for idx, p in enumerate(passages):
+        lex = 0.0
+        if max_lex > 0 and idx < len(ids) and ids[idx].isdigit() and int(ids[idx]) < len(bm25):
+            lex = float(bm25[int(ids[idx])]) / max_lex
+        combined = 0.65 * vec_sims[idx] + 0.35 * lex
+        ranked.append((combined, idx, p))
     ranked.sort(reverse=True, key=lambda x: x[0])
+    return passages, metadatas, ranked
+
+
+# Prompt context budget, estimated at ~4 characters per token
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "900"))
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _text_overlap(left: str, right: str, min_len: int = 30, max_len: int = 400) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for size in range(min(len(left), len(right), max_len), min_len - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def pack_context(candidates: list, budget_tokens: int = CONTEXT_TOKEN_BUDGET):
+    """
+    Greedily pack (score, text, metadata) candidates, best first, into
+    "[Page N] ..." spans within a token budget.
+
+    Chunks from the same page that overlap or touch are merged into a
+    single span, so the chunker's overlap is paid for once. Offsets come
+    from the chunk's "start" metadata, with a text-overlap check for
+    chunks indexed without it. Returns (context, stats).
+    """
+    spans = []   # dicts: page, start, end, text, score
+    used = 0
+    for score, text, meta in candidates:
+        meta = meta if isinstance(meta, dict) else {}
+        page = meta.get("page")
+        start = meta.get("start")
+        end = start + len(text) if start is not None else None
+
+        merged = False
+        for span in spans:
+            if span["page"] != page:
+                continue
+            if start is not None and span["start"] is not None and start <= span["end"] and end >= span["start"]:
+                prefix = text[:max(0, span["start"] - start)]
+                suffix = text[max(0, span["end"] - start):] if end > span["end"] else ""
+            elif text in span["text"]:
+                prefix, suffix = "", ""
+            else:
+                tail = _text_overlap(span["text"], text)
+                head = _text_overlap(text, span["text"]) if not tail else 0
+                if not (tail or head):
+                    continue
+                prefix = text[:len(text) - head] if head else ""
+                suffix = text[tail:] if tail else ""
+            cost = _estimate_tokens(prefix + suffix)
+            if used + cost <= budget_tokens:
+                span["text"] = prefix + span["text"] + suffix
+                if span["start"] is not None and start is not None:
+                    span["start"] = min(span["start"], start)
+                    span["end"] = max(span["end"], end)
+                used += cost
+            merged = True
+            break
+
+        if not merged:
+            cost = _estimate_tokens(f"[Page {page}] {text}\n\n")
+            if used + cost > budget_tokens:
+                continue   # a smaller, lower-ranked chunk may still fit
+            spans.append({"page": page, "start": start, "end": end, "text": text, "score": score})
+            used += cost
+
+    context = "\n\n".join(f"[Page {span['page']}] {span['text']}" for span in spans)
+    stats = {"spans": len(spans), "chars": len(context), "est_tokens": _estimate_tokens(context)}
+    return context, stats
+
+
+NOT_FOUND_TEXT = "Sorry, I couldn’t find that in the document."
+
+
+def retrieve_for_question(user_question, doc_id) -> dict:
+    """
+    Retrieval half of chat_with_doc: rank, pack and build the prompt.
+
+    Returns page, snippet, anchors and coverage (everything a client needs
+    to scroll and highlight) plus the prompt; prompt is None when nothing
+    relevant was found.
+    """
+    # Clean the input
+    query = user_question.strip()
+
+    # Query ChromaDB for relevant context; may still be indexing
+    entry = get_document(doc_id)
+    coverage = entry.progress()
+    passages, metadatas, ranked = _hybrid_rank(entry, query) if entry.chunks else ([], [], [])
+    if not ranked:
+        return {"prompt": None, "page": None, "snippet": None, "anchors": [], "coverage": coverage}
+
     # Top chunk determines primary page for scrolling
     best_idx = ranked[0][1]
     top_page = metadatas[best_idx].get("page") if metadatas and isinstance(metadatas[best_idx], dict) else None
     best_chunk = passages[best_idx] if 0 <= best_idx < len(passages) else ""
 
-    # Build compact context from top 4 chunks
-    top_ctx = []
-    for _, i, p in ranked[:4]:
-        m = metadatas[i] if i < len(metadatas) else {}
-        top_ctx.append((m.get("page"), p))
-    try:
-        page_meta = results.get("metadatas", [[{}]])[0][0].get("page")
-    except Exception:
-        page_meta = None
-
-    # Build compact context with citations
-    joined_context = "\n\n".join(
-        [f"[Page {pg}] {p}" for pg, p in top_ctx]
+    # Pack the best chunks into the token budget, merging overlapping neighbours
+    joined_context, ctx_stats = pack_context(
+        [(score, p, metadatas[i] if i < len(metadatas) else {}) for score, i, p in ranked]
     )
 
     prompt = f"""
@@ -254,10 +843,6 @@ Question: {query}
 Answer:
 """
 
-
-
-    model = genai.GenerativeModel("gemini-2.5-flash-lite")
-    response = model.generate_content(prompt)
     # Provide a snippet and n-gram anchors from the best chunk to enable precise client-side location
     snippet = (best_chunk or "").strip()
     if len(snippet) > 220:
@@ -271,4 +856,247 @@ Answer:
             anchors.append(tri)
         if len(anchors) >= 6:
             break
-    return {"text": response.text, "page": top_page, "snippet": snippet, "anchors": anchors}
+    return {"prompt": prompt, "page": top_page, "snippet": snippet, "anchors": anchors,
+            "coverage": coverage, "context": ctx_stats, "context_text": joined_context}
+
+
+def chat_with_doc(user_question, doc_id):
+    found = retrieve_for_question(user_question, doc_id)
+    if found["prompt"] is None:
+        return {"text": NOT_FOUND_TEXT, "page": None, "coverage": found["coverage"]}
+
+    model = genai.GenerativeModel("gemini-2.5-flash-lite")
+    started = time.perf_counter()
+    response = model.generate_content(found["prompt"])
+    logging.info("chat_with_doc: context %s, prompt %d chars, generation %.2fs",
+                 found["context"], len(found["prompt"]), time.perf_counter() - started)
+    return {"text": response.text, "page": found["page"], "snippet": found["snippet"],
+            "anchors": found["anchors"], "coverage": found["coverage"]}
+
+
+def stream_chat_with_doc(user_question, doc_id):
+    """
+    Streaming chat_with_doc. Yields (event, data) pairs:
+      ("meta", {page, snippet, anchors, coverage})  right after ranking
+      ("token", {"text": ...})                      as the model produces text
+      ("done", {"text", "timing"})                  full answer and timings in ms
+    """
+    started = time.perf_counter()
+    found = retrieve_for_question(user_question, doc_id)
+    retrieval_ms = round((time.perf_counter() - started) * 1000, 1)
+    yield "meta", {k: found[k] for k in ("page", "snippet", "anchors", "coverage")}
+
+    first_token_ms = None
+    if found["prompt"] is None:
+        text = NOT_FOUND_TEXT
+        yield "token", {"text": text}
+    else:
+        model = genai.GenerativeModel("gemini-2.5-flash-lite")
+        parts = []
+        for chunk in model.generate_content(found["prompt"], stream=True):
+            piece = getattr(chunk, "text", "") or ""
+            if not piece:
+                continue
+            if first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            parts.append(piece)
+            yield "token", {"text": piece}
+        text = "".join(parts)
+    yield "done", {"text": text, "timing": {
+        "retrieval_ms": retrieval_ms,
+        "first_token_ms": first_token_ms,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+    }}
+
+
+# Query rewrites (hi -> en and back) keyed by (text hash, target language)
+TRANSLATION_CACHE_SIZE = int(os.environ.get("TRANSLATION_CACHE_SIZE", "2048"))
+_translation_cache = OrderedDict()   # (sha256(text), lang) -> translation
+_translation_lock = threading.Lock()
+_DEVANAGARI = re.compile(r"[\u0900-\u097F]")
+
+
+def translate_text(text: str, target_lang: str) -> str:
+    """Translate with one LLM call, remembering the result; returns `text` unchanged on failure."""
+    tgt = (target_lang or '').strip().lower()
+    if not text:
+        return ''
+    key = (hashlib.sha256(text.encode("utf-8")).hexdigest(), tgt)
+    with _translation_lock:
+        hit = _translation_cache.get(key)
+        if hit is not None:
+            _translation_cache.move_to_end(key)
+            return hit
+    try:
+        prompt = f"""
+You are a translator. Translate the following text into {tgt}.
+Preserve meaning and tone. Output only the translated text with no notes.
+
+Text:
+{text}
+"""
+        model = genai.GenerativeModel("gemini-2.5-flash-lite")
+        translated = (model.generate_content(prompt).text or '').strip()
+    except Exception:
+        logging.exception("Translation failed")
+        return text
+    with _translation_lock:
+        _translation_cache[key] = translated
+        _translation_cache.move_to_end(key)
+        while len(_translation_cache) > TRANSLATION_CACHE_SIZE:
+            _translation_cache.popitem(last=False)
+    return translated
+
+
+def _retrieval_query(question_hi: str) -> str:
+    """English query for ranking; Latin-script questions (Hinglish, terms) are used as they are."""
+    letters = [c for c in question_hi if c.isalpha()]
+    devanagari = sum(1 for c in letters if _DEVANAGARI.match(c))
+    if not letters or devanagari < 0.3 * len(letters):
+        return question_hi
+    return translate_text(question_hi, 'en')
+
+
+def _hindi_answer_prompt(question_hi: str, context: str) -> str:
+    return f"""
+You are a helpful assistant answering ONLY from the provided context.
+The context is in English; the question is in Hindi.
+
+Style:
+- Clear, human, single paragraph, 2–4 sentences, ≤80 words.
+- Start with the direct answer. No markdown.
+
+Return ONLY a JSON object with two keys, in this order:
+{{"answer_hi": "<the answer in natural Hindi (Devanagari); keep technical terms in English>",
+ "answer_en": "<the same answer in English>"}}
+
+Context:
+{context}
+
+Question: {question_hi}
+"""
+
+
+def _parse_hindi_answer(text: str) -> tuple:
+    """(answer_hi, answer_en) from the model's JSON; tolerant of code fences and plain text."""
+    raw = (text or "").strip()
+    try:
+        data = json.loads(raw[raw.find("{"):raw.rfind("}") + 1], strict=False)
+        return str(data.get("answer_hi") or "").strip(), str(data.get("answer_en") or "").strip()
+    except ValueError:
+        logging.warning("Hindi answer was not JSON; returning it as the Hindi text")
+        return raw, ""
+
+
+def _hindi_answer_model():
+    return genai.GenerativeModel(
+        "gemini-2.5-flash-lite",
+        generation_config={"response_mime_type": "application/json"},
+    )
+
+
+def chat_with_doc_hindi(question_hi: str, doc_id) -> dict:
+    """
+    /ask-hindi in one generation: retrieval with an English rewrite of the
+    question (cached), then a single call that reads the Hindi question with
+    the English context and returns both answers. Same fields as
+    chat_with_doc plus answer_hi/answer_en and timings in ms.
+    """
+    started = time.perf_counter()
+    found = retrieve_for_question(_retrieval_query(question_hi), doc_id)
+    retrieval_ms = round((time.perf_counter() - started) * 1000, 1)
+    if found["prompt"] is None:
+        answer_hi, answer_en = translate_text(NOT_FOUND_TEXT, 'hi'), NOT_FOUND_TEXT
+    else:
+        response = _hindi_answer_model().generate_content(
+            _hindi_answer_prompt(question_hi, found["context_text"])
+        )
+        answer_hi, answer_en = _parse_hindi_answer(response.text)
+    return {"answer_hi": answer_hi, "answer_en": answer_en, "page": found["page"],
+            "snippet": found["snippet"], "anchors": found["anchors"], "coverage": found["coverage"],
+            "timing": {"retrieval_ms": retrieval_ms,
+                       "total_ms": round((time.perf_counter() - started) * 1000, 1)}}
+
+
+class _JsonStringField:
+    """Incrementally decode one string field ("answer_hi") out of streamed JSON."""
+
+    def __init__(self, name: str):
+        self._opening = re.compile(r'"%s"\s*:\s*"' % re.escape(name))
+        self._text = ""
+        self._start = None
+        self._emitted = 0
+        self.closed = False
+
+    def feed(self, piece: str) -> str:
+        """Add model output; returns newly decoded characters of the field."""
+        self._text += piece
+        if self._start is None:
+            match = self._opening.search(self._text)
+            if not match:
+                return ""
+            self._start = match.end()
+        if self.closed:
+            return ""
+        raw = self._text[self._start:]
+        end = 0
+        while end < len(raw):
+            if raw[end] == "\\":
+                end += 2
+                continue
+            if raw[end] == '"':
+                self.closed = True
+                break
+            end += 1
+        # Never decode a half-received escape sequence
+        body = raw[:min(end, len(raw))]
+        cut = len(body)
+        tail = body.rfind("\\")
+        if not self.closed and tail != -1 and tail + 6 > cut:
+            cut = tail
+        try:
+            decoded = json.loads('"' + body[:cut] + '"', strict=False)
+        except ValueError:
+            return ""
+        fresh = decoded[self._emitted:]
+        self._emitted = len(decoded)
+        return fresh
+
+
+def stream_chat_with_doc_hindi(question_hi: str, doc_id):
+    """
+    Streaming chat_with_doc_hindi. Yields (event, data) pairs:
+      ("meta", {page, snippet, anchors, coverage})  right after ranking
+      ("token", {"text": ...})                      Hindi answer text as it streams
+      ("answer_hi", {"text": ...})                  the complete Hindi answer
+      ("done", {"answer_en", "answer_hi", "timing"})
+    """
+    started = time.perf_counter()
+    found = retrieve_for_question(_retrieval_query(question_hi), doc_id)
+    retrieval_ms = round((time.perf_counter() - started) * 1000, 1)
+    yield "meta", {k: found[k] for k in ("page", "snippet", "anchors", "coverage")}
+
+    first_token_ms = None
+    if found["prompt"] is None:
+        answer_hi, answer_en = translate_text(NOT_FOUND_TEXT, 'hi'), NOT_FOUND_TEXT
+        yield "token", {"text": answer_hi}
+    else:
+        field = _JsonStringField("answer_hi")
+        parts = []
+        for chunk in _hindi_answer_model().generate_content(
+            _hindi_answer_prompt(question_hi, found["context_text"]), stream=True
+        ):
+            piece = getattr(chunk, "text", "") or ""
+            parts.append(piece)
+            fresh = field.feed(piece)
+            if fresh:
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield "token", {"text": fresh}
+        answer_hi, answer_en = _parse_hindi_answer("".join(parts))
+    yield "answer_hi", {"text": answer_hi}
+    yield "done", {"answer_en": answer_en, "answer_hi": answer_hi, "timing": {
+        "retrieval_ms": retrieval_ms,
+        "first_token_ms": first_token_ms,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+    }}
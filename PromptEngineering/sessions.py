@@ -0,0 +1,179 @@
+# sessions.py
+# Per-client document state: which paper each session has open.
+#
+# The mapping session id -> (doc_id, pdf_path, pdf_url, pending load) lives
+# in SQLite, so every worker process on the host sees the same answer and a
+# request can land on any worker. A worker that has never indexed the
+# session's document registers its path with rag.registry and indexes it
+# lazily from the shared caches. Sessions never touch each other's
+# documents, so one user opening a paper cannot force another to reindex.
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from disk_cache import get_disk_cache
+from load_jobs import get_load_jobs
+from rag import registry
+
+SESSION_DB = os.environ.get("SESSION_DB", os.path.join("cache", "sessions.sqlite"))
+# Sessions idle longer than this are forgotten
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", str(6 * 3600)))
+# A load another worker started is treated as abandoned after this long
+SESSION_LOAD_TIMEOUT = int(os.environ.get("SESSION_LOAD_TIMEOUT", "600"))
+# How often idle sessions are swept
+_SWEEP_INTERVAL = 300
+
+
+class DocumentSession:
+    """One client's view: the open document plus any load in flight."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.doc_id = None
+        self.pdf_path = None
+        self.pdf_url = None
+        self.pending_url = None
+        self.pending_since = None
+        self.load_job = None         # latest LoadJob, only in the worker that started it
+
+    @property
+    def loading(self) -> bool:
+        if not self.pending_url:
+            return False
+        job = self.load_job
+        if job is not None and job.url == self.pending_url:
+            return not job.ready.is_set()
+        # Started by another worker, which may have died with it
+        return time.time() - (self.pending_since or 0) < SESSION_LOAD_TIMEOUT
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "doc_id": self.doc_id,
+            "pdf_path": self.pdf_path,
+            "pdf_url": self.pdf_url,
+            "loading": self.loading,
+            "job_id": self.load_job.job_id if self.load_job is not None else None,
+        }
+
+
+class SessionRegistry:
+    """
+    Sessions resolved per request. Each session pins its open document in
+    the disk cache (per process) and owns its own load-job slot, so a new
+    load only supersedes that session's previous load.
+    """
+
+    def __init__(self, db_path: str = SESSION_DB):
+        self._sessions = {}          # session_id -> DocumentSession
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, doc_id TEXT, pdf_path TEXT, pdf_url TEXT,"
+            " pending_url TEXT, pending_since REAL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+
+    def get(self, session_id: str) -> DocumentSession:
+        """The session, refreshed from the shared table (another worker may have changed it)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = DocumentSession(session_id)
+            row = self._conn.execute(
+                "SELECT doc_id, pdf_path, pdf_url, pending_url, pending_since FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE sessions SET updated_at = ? WHERE session_id = ?", (time.time(), session_id)
+                )
+                doc_id, pdf_path, pdf_url, session.pending_url, session.pending_since = row
+                self._adopt(session, doc_id, pdf_path, pdf_url)
+            self._maybe_sweep()
+        return session
+
+    def _adopt(self, session: DocumentSession, doc_id: str, pdf_path: str, pdf_url: str) -> None:
+        """Point the session at a document, moving its disk-cache pin."""
+        if doc_id != session.doc_id:
+            get_disk_cache().pin(doc_id)
+            get_disk_cache().unpin(session.doc_id)
+        session.doc_id, session.pdf_path, session.pdf_url = doc_id, pdf_path, pdf_url
+        if doc_id and pdf_path and registry.path_for(doc_id) is None:
+            # Loaded by another worker: let rag.get_document index it here on demand
+            registry.register(doc_id, pdf_path)
+
+    def _save(self, session: DocumentSession) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions"
+            " (session_id, doc_id, pdf_path, pdf_url, pending_url, pending_since, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session.session_id, session.doc_id, session.pdf_path, session.pdf_url,
+             session.pending_url, session.pending_since, time.time()),
+        )
+
+    def load(self, session: DocumentSession, url: str, on_ready=None):
+        """
+        Start (or join) the load job for `url` on behalf of `session` and
+        return it. The session switches to the document once it is
+        searchable; `on_ready(job)` runs after that switch.
+        """
+        def switch(job):
+            with self._lock:
+                if session.pending_url != job.url:
+                    return  # superseded by a later load in this session
+                session.pending_url = session.pending_since = None
+                if job.state in ("running", "done"):
+                    self._adopt(session, job.doc_id, os.path.abspath(job.pdf_path), job.url)
+                self._save(session)
+            if on_ready and job.state in ("running", "done"):
+                on_ready(job)
+
+        # Recorded first: the job may become ready before submit returns
+        with self._lock:
+            session.pending_url, session.pending_since = url, time.time()
+            self._save(session)
+        job = get_load_jobs().submit(url, owner=f"session:{session.session_id}", on_ready=switch)
+        session.load_job = job
+        return job
+
+    def _maybe_sweep(self) -> None:
+        now = time.time()
+        if now - self._last_sweep < _SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        cutoff = now - SESSION_TTL_SECONDS
+        self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+        live = {sid for (sid,) in self._conn.execute("SELECT session_id FROM sessions")}
+        for sid in [s for s in self._sessions if s not in live and not self._sessions[s].loading]:
+            get_disk_cache().unpin(self._sessions.pop(sid).doc_id)
+        logging.info(f"🧹 Session sweep: {len(self._sessions)} sessions open in this worker")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            return {
+                "sessions": total,
+                "in_this_worker": len(self._sessions),
+                "loading": sum(1 for s in self._sessions.values() if s.loading),
+            }
+
+
+_shared_registry = None
+_shared_lock = threading.Lock()
+
+
+def get_sessions() -> SessionRegistry:
+    """Process-wide session registry."""
+    global _shared_registry
+    with _shared_lock:
+        if _shared_registry is None:
+            _shared_registry = SessionRegistry()
+        return _shared_registry
@@ -0,0 +1,120 @@
+# Shared fixtures. The app's modules are flat files in PromptEngineering/,
+# so that directory goes on sys.path. Every test gets its own disk-cache
+# index, and network code talks to a local stand-in HTTP server.
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import disk_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_disk_cache(tmp_path, monkeypatch):
+    """A fresh process-wide disk cache under tmp_path."""
+    manager = disk_cache.DiskCacheManager(index_path=str(tmp_path / "disk_index.sqlite"))
+    monkeypatch.setattr(disk_cache, "_shared_manager", manager)
+    return manager
+
+
+class StandInServer:
+    """
+    Serves `files` (path -> {"body", "etag", "last_modified"}) with
+    conditional GETs and Range/If-Range. Setting `drop_after` closes the
+    next response after that many body bytes; `after_drop()` then runs,
+    e.g. to change the file before the client resumes. `stray_304s`
+    answers that many requests with 304 whatever they ask.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []        # (path, request headers) in arrival order
+        self.bodies_sent = 0
+        self.drop_after = None
+        self.after_drop = None
+        self.send_length = True
+        self.stray_304s = 0
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self)
+
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_port}{path}"
+
+    def add(self, path: str, body: bytes, etag: str = None, last_modified: str = None) -> None:
+        self.files[path] = {"body": body, "etag": etag, "last_modified": last_modified}
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _handle(self, handler) -> None:
+        self.requests.append((handler.path, dict(handler.headers)))
+        f = self.files.get(handler.path)
+        if f is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        validators = {v for v in (f["etag"], f["last_modified"]) if v}
+        stray = self.stray_304s > 0
+        if stray:
+            self.stray_304s -= 1
+        if stray or (f["etag"] and handler.headers.get("If-None-Match") == f["etag"]):
+            handler.send_response(304)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        body, start = f["body"], 0
+        range_header = handler.headers.get("Range")
+        if_range = handler.headers.get("If-Range")
+        if range_header and (if_range is None or if_range in validators):
+            start = int(range_header.split("=")[1].rstrip("-"))
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            handler.send_response(200)
+        if f["etag"]:
+            handler.send_header("ETag", f["etag"])
+        if f["last_modified"]:
+            handler.send_header("Last-Modified", f["last_modified"])
+        body = body[start:]
+        if self.send_length:
+            handler.send_header("Content-Length", str(len(body)))
+        else:
+            handler.send_header("Connection", "close")
+            handler.close_connection = True
+        handler.end_headers()
+
+        if self.drop_after is not None:
+            handler.wfile.write(body[:self.drop_after])
+            handler.wfile.flush()
+            handler.close_connection = True
+            self.drop_after = None
+            if self.after_drop:
+                self.after_drop()
+            return
+        handler.wfile.write(body)
+        self.bodies_sent += 1
+
+
+@pytest.fixture
+def http_server():
+    server = StandInServer()
+    yield server
+    server.close()
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+
+import disk_cache
+from disk_cache import DiskCacheManager
+
+
+def _write(path, nbytes):
+    with open(path, "wb") as f:
+        f.write(b"x" * nbytes)
+    return str(path)
+
+
+def test_least_recently_used_unpinned_file_is_evicted(tmp_path):
+    cache = DiskCacheManager(index_path=str(tmp_path / "index.sqlite"), max_bytes=250)
+    old = _write(tmp_path / "old.pdf", 100)
+    pinned = _write(tmp_path / "pinned.pdf", 100)
+    cache.track(old, "doc-old", "pdf")
+    cache.track(pinned, "doc-pinned", "pdf")
+    cache.pin("doc-pinned")
+    cache.touch(old)
+
+    cache.track(_write(tmp_path / "new.pdf", 100), "doc-new", "pdf")
+
+    assert not os.path.exists(old)
+    assert os.path.exists(pinned)
+    cache.unpin("doc-pinned")
+    assert cache.stats()["pinned_docs"] == 0
+
+
+def test_old_index_loses_its_refs_column(tmp_path):
+    index = str(tmp_path / "index.sqlite")
+    conn = sqlite3.connect(index)
+    conn.execute(
+        "CREATE TABLE files (path TEXT PRIMARY KEY, doc_id TEXT, kind TEXT NOT NULL,"
+        " nbytes INTEGER NOT NULL, last_access REAL NOT NULL, refs INTEGER NOT NULL DEFAULT 0)"
+    )
+    conn.execute("INSERT INTO files VALUES ('/tmp/a.pdf', 'doc', 'pdf', 10, 1.0, 2)")
+    conn.commit()
+    conn.close()
+
+    cache = DiskCacheManager(index_path=index)
+
+    columns = [row[1] for row in cache._conn.execute("PRAGMA table_info(files)")]
+    assert "refs" not in columns
+    assert cache.stats()["files"] == 1
+
+
+def test_legacy_session_folders_are_swept(tmp_path):
+    base = tmp_path / "pdfs"
+    (base / "session_1700000000_abcd1234").mkdir(parents=True)
+    _write(base / "session_1700000000_abcd1234" / "paper.pdf", 10)
+    (base / "keep").mkdir()
+
+    disk_cache.sweep_legacy_pdf_dirs(str(base))
+
+    assert sorted(os.listdir(base)) == ["keep"]
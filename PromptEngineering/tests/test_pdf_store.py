@@ -0,0 +1,201 @@
+import hashlib
+import os
+
+import pytest
+
+import pdf_store
+from pdf_store import PDFStore, PDFTooLarge
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PDFStore(store_dir=str(tmp_path / "pdfs"))
+
+
+def _sha(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _leftovers(store: PDFStore) -> list:
+    return os.listdir(store.tmp_dir)
+
+
+def test_fetch_stores_object_under_its_sha256(store, http_server):
+    body = os.urandom(700_000)
+    http_server.add("/a.pdf", body, etag='"a1"')
+
+    path, digest = store.fetch(http_server.url("/a.pdf"))
+
+    assert digest == _sha(body)
+    assert os.path.basename(path) == f"{digest}.pdf"
+    with open(path, "rb") as f:
+        assert f.read() == body
+    assert store.stats()["downloads"] == 1
+    assert _leftovers(store) == []
+
+
+def test_same_bytes_under_two_urls_are_stored_once(store, http_server):
+    body = os.urandom(300_000)
+    http_server.add("/a.pdf", body)
+    http_server.add("/mirror/a.pdf", body)
+
+    first, _ = store.fetch(http_server.url("/a.pdf"))
+    second, _ = store.fetch(http_server.url("/mirror/a.pdf"))
+
+    assert first == second
+    stats = store.stats()
+    assert stats["deduplicated"] == 1
+    assert stats["objects"] == 1
+    assert stats["urls"] == 2
+    assert _leftovers(store) == []
+
+
+def test_known_url_is_revalidated_and_304_reuses_the_object(store, http_server):
+    body = os.urandom(200_000)
+    http_server.add("/a.pdf", body, etag='"v1"')
+    url = http_server.url("/a.pdf")
+
+    first = store.fetch(url)
+    second = store.fetch(url)
+
+    assert second == first
+    assert http_server.requests[-1][1].get("If-None-Match") == '"v1"'
+    assert http_server.bodies_sent == 1
+    assert store.stats()["not_modified"] == 1
+
+
+def test_changed_pdf_at_a_known_url_is_downloaded_again(store, http_server):
+    http_server.add("/a.pdf", b"%PDF-old" * 1000, etag='"v1"')
+    url = http_server.url("/a.pdf")
+    store.fetch(url)
+    new_body = b"%PDF-new" * 1000
+    http_server.add("/a.pdf", new_body, etag='"v2"')
+
+    path, digest = store.fetch(url)
+
+    assert digest == _sha(new_body)
+    assert store.stats()["downloads"] == 2
+
+
+def test_size_cap_from_content_length(store, http_server):
+    http_server.add("/big.pdf", os.urandom(50_000))
+
+    with pytest.raises(PDFTooLarge):
+        store.fetch(http_server.url("/big.pdf"), max_bytes=10_000)
+
+    assert os.listdir(store.objects_dir) == []
+    assert _leftovers(store) == []
+
+
+def test_size_cap_while_streaming_without_content_length(store, http_server, monkeypatch):
+    monkeypatch.setattr(pdf_store, "PDF_DOWNLOAD_CHUNK", 4096)
+    http_server.send_length = False
+    http_server.add("/big.pdf", os.urandom(50_000))
+
+    with pytest.raises(PDFTooLarge):
+        store.fetch(http_server.url("/big.pdf"), max_bytes=10_000)
+
+    assert os.listdir(store.objects_dir) == []
+    assert _leftovers(store) == []
+
+
+def test_interrupted_download_resumes_with_if_range(store, http_server, monkeypatch):
+    # Small reads, so the bytes before the drop reach the part file
+    monkeypatch.setattr(pdf_store, "PDF_DOWNLOAD_CHUNK", 4096)
+    body = os.urandom(1_000_000)
+    http_server.add("/a.pdf", body, etag='"v1"')
+    http_server.drop_after = 64 * 4096
+
+    path, digest = store.fetch(http_server.url("/a.pdf"))
+
+    assert digest == _sha(body)
+    resumed = http_server.requests[-1][1]
+    assert resumed.get("Range") == f"bytes={64 * 4096}-"
+    assert resumed.get("If-Range") == '"v1"'
+    with open(path, "rb") as f:
+        assert f.read() == body
+
+
+def test_resume_falls_back_to_last_modified(store, http_server, monkeypatch):
+    monkeypatch.setattr(pdf_store, "PDF_DOWNLOAD_CHUNK", 4096)
+    body = os.urandom(600_000)
+    modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+    http_server.add("/a.pdf", body, etag='W/"weak"', last_modified=modified)
+    http_server.drop_after = 100_000
+
+    _, digest = store.fetch(http_server.url("/a.pdf"))
+
+    assert digest == _sha(body)
+    assert http_server.requests[-1][1].get("If-Range") == modified
+
+
+def test_pdf_changed_mid_download_is_fetched_from_the_start(store, http_server, monkeypatch):
+    monkeypatch.setattr(pdf_store, "PDF_DOWNLOAD_CHUNK", 4096)
+    old, new = os.urandom(800_000), os.urandom(800_000)
+    http_server.add("/a.pdf", old, etag='"v1"')
+    http_server.drop_after = 200_000
+    http_server.after_drop = lambda: http_server.add("/a.pdf", new, etag='"v2"')
+
+    path, digest = store.fetch(http_server.url("/a.pdf"))
+
+    # If-Range no longer matches, so the server sends the new PDF whole
+    assert digest == _sha(new)
+    with open(path, "rb") as f:
+        assert f.read() == new
+
+
+def test_resume_without_validators_restarts(store, http_server, monkeypatch):
+    monkeypatch.setattr(pdf_store, "PDF_DOWNLOAD_CHUNK", 4096)
+    body = os.urandom(500_000)
+    http_server.add("/a.pdf", body)
+    http_server.drop_after = 100_000
+
+    _, digest = store.fetch(http_server.url("/a.pdf"))
+
+    assert digest == _sha(body)
+    assert "Range" not in http_server.requests[-1][1]
+
+
+def test_304_to_a_request_without_validators_is_fetched_again(store, http_server):
+    body = os.urandom(100_000)
+    http_server.add("/a.pdf", body)
+    http_server.stray_304s = 1
+
+    path, digest = store.fetch(http_server.url("/a.pdf"))
+
+    assert digest == _sha(body)
+    assert os.path.exists(path)
+    assert "If-None-Match" not in http_server.requests[-1][1]
+
+
+def test_304_for_an_object_removed_meanwhile_is_fetched_again(store, http_server):
+    body = os.urandom(100_000)
+    http_server.add("/a.pdf", body, etag='"v1"')
+    url = http_server.url("/a.pdf")
+    path, _ = store.fetch(url)
+    known = store._known
+    # Evicted after the lookup, while the conditional request is in flight
+    def known_then_evicted(u):
+        row = known(u)
+        os.remove(path)
+        return row
+    store._known = known_then_evicted
+
+    again, digest = store.fetch(url)
+
+    assert again == path and digest == _sha(body)
+    assert os.path.exists(path)
+    assert store.stats()["not_modified"] == 0
+
+
+def test_known_object_is_touched_before_revalidation(store, http_server, isolated_disk_cache):
+    http_server.add("/a.pdf", os.urandom(10_000), etag='"v1"')
+    url = http_server.url("/a.pdf")
+    path, _ = store.fetch(url)
+    isolated_disk_cache._conn.execute("UPDATE files SET last_access = 0")
+
+    store.fetch(url)
+
+    (last_access,) = isolated_disk_cache._conn.execute(
+        "SELECT last_access FROM files WHERE path = ?", (os.path.abspath(path),)).fetchone()
+    assert last_access > 0
@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+
+from tts_cache import StandInTTSClient, TTSCache, tts_key
+
+ARGS = ("voice", "eleven_multilingual_v2", "mp3_22050_32")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTSCache(cache_dir=str(tmp_path / "tts"), max_bytes=64 * 1024 * 1024)
+
+
+@pytest.fixture
+def client():
+    return StandInTTSClient(first_byte=0, per_chunk=0, first_byte_per_char=0)
+
+
+def _convert(client, text):
+    return client.convert(*ARGS[:2], text=text, output_format=ARGS[2])
+
+
+def _parts(cache):
+    return [f for f in os.listdir(cache.cache_dir) if f.endswith(".part")]
+
+
+def test_key_depends_on_every_field():
+    key = tts_key("hello", *ARGS)
+    assert key == tts_key("hello", *ARGS)
+    assert key != tts_key("hello", "other-voice", *ARGS[1:])
+    assert key != tts_key("hello", *ARGS[:2], "pcm_16000")
+
+
+def test_miss_is_teed_into_the_cache(cache, client):
+    key = tts_key("hello there", *ARGS)
+    assert cache.lookup(key, ARGS[2]) is None
+
+    streamed = []
+    for chunk in cache.tee(key, ARGS[2], _convert(client, "hello there")):
+        # Not a hit until the whole clip is on disk
+        assert not os.path.exists(cache.path_for(key, ARGS[2]))
+        streamed.append(chunk)
+
+    path = cache.lookup(key, ARGS[2])
+    assert path == cache.path_for(key, ARGS[2])
+    with open(path, "rb") as f:
+        assert f.read() == b"".join(streamed)
+    assert cache.stats()["stored"] == 1
+    assert _parts(cache) == []
+
+
+def test_client_leaving_early_still_caches_the_whole_clip(cache):
+    client = StandInTTSClient(first_byte=0, per_chunk=0.01, first_byte_per_char=0, chunk_size=1024)
+    key = tts_key("a longer answer " * 10, *ARGS)
+    stream = cache.tee(key, ARGS[2], _convert(client, "a longer answer " * 10))
+    next(stream)
+    stream.close()
+
+    deadline = time.time() + 5
+    while not os.path.exists(cache.path_for(key, ARGS[2])) and time.time() < deadline:
+        time.sleep(0.02)
+
+    expected = b"".join(_convert(client, "a longer answer " * 10))
+    with open(cache.path_for(key, ARGS[2]), "rb") as f:
+        assert f.read() == expected
+
+
+def test_provider_error_leaves_nothing_cached(cache):
+    def failing():
+        yield b"ID3"
+        raise RuntimeError("provider went away")
+
+    key = tts_key("broken", *ARGS)
+    with pytest.raises(RuntimeError):
+        for _ in cache.tee(key, ARGS[2], failing()):
+            pass
+
+    assert cache.lookup(key, ARGS[2]) is None
+    assert cache.stats()["aborted"] == 1
+    assert _parts(cache) == []
+
+
+def test_least_recently_played_clip_is_evicted_over_quota(tmp_path, client):
+    clip = len(b"".join(_convert(client, "clip 1")))
+    cache = TTSCache(cache_dir=str(tmp_path / "tts"), max_bytes=int(clip * 2.5))
+    keys = [tts_key(f"clip {i}", *ARGS) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        for _ in cache.tee(key, ARGS[2], _convert(client, f"clip {i}")):
+            pass
+    # Replaying clip 0 makes clip 1 the oldest
+    assert cache.lookup(keys[0], ARGS[2])
+    for _ in cache.tee(keys[2], ARGS[2], _convert(client, "clip 2")):
+        pass
+
+    assert cache.lookup(keys[0], ARGS[2])
+    assert cache.lookup(keys[1], ARGS[2]) is None
+    assert cache.lookup(keys[2], ARGS[2])
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+
+from tts_cache import StandInTTSClient, TTSCache, tts_key
+from tts_pipeline import TTSMetrics, pipelined_audio, split_segments
+
+ARGS = ("voice", "eleven_multilingual_v2", "mp3_22050_32")
+TEXT = ("The model reaches 92.4 percent accuracy on the held-out set. "
+        "Ablations show that the retrieval step accounts for most of the gain. ") * 8
+
+
+class SlowHeadClient(StandInTTSClient):
+    """Earlier segments take longer to start, so later ones finish first."""
+
+    def __init__(self, segments, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = {s: 0.05 * (len(segments) - i) for i, s in enumerate(segments)}
+        self.started = []
+
+    def convert(self, voice_id, model_id, text, output_format="mp3_22050_32", **kwargs):
+        self.started.append(text)
+        self.first_byte = self.delays[text]
+        return super().convert(voice_id, model_id, text, output_format, **kwargs)
+
+
+def cache_key(segment: str) -> str:
+    return tts_key(segment, *ARGS)
+
+
+def _expected(segments) -> bytes:
+    reference = StandInTTSClient(first_byte=0, per_chunk=0, first_byte_per_char=0)
+    return b"".join(b"".join(reference.convert(*ARGS[:2], text=s, output_format=ARGS[2])) for s in segments)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTSCache(cache_dir=str(tmp_path / "tts"), max_bytes=64 * 1024 * 1024)
+
+
+def test_split_segments_keeps_every_word_and_a_short_head():
+    segments = split_segments(TEXT, first_chars=80, max_chars=200)
+
+    assert len(segments) > 2
+    assert len(segments[0]) <= 80
+    assert all(len(s) <= 200 for s in segments)
+    assert " ".join(segments) == " ".join(TEXT.split())
+
+
+def test_segments_are_delivered_in_order(cache):
+    segments = split_segments(TEXT, first_chars=80, max_chars=200)
+    client = SlowHeadClient(segments, per_chunk=0, first_byte_per_char=0)
+    metrics = TTSMetrics()
+    record = metrics.start("pipeline", len(TEXT), len(segments))
+
+    audio = b"".join(pipelined_audio(client, cache, segments, *ARGS, metrics=metrics, record=record,
+                                     ahead=len(segments)))
+
+    assert audio == _expected(segments)
+    assert record["segment_misses"] == len(segments)
+
+
+def test_replayed_segments_come_from_the_cache(cache):
+    segments = split_segments(TEXT, first_chars=80, max_chars=200)
+    client = StandInTTSClient(first_byte=0, per_chunk=0, first_byte_per_char=0)
+    first = b"".join(pipelined_audio(client, cache, segments, *ARGS))
+    calls = client.calls
+    metrics = TTSMetrics()
+    record = metrics.start("pipeline", len(TEXT), len(segments))
+
+    again = b"".join(pipelined_audio(client, cache, segments, *ARGS, metrics=metrics, record=record))
+
+    assert again == first
+    assert client.calls == calls
+    assert record["segment_hits"] == len(segments)
+
+
+def test_first_audio_arrives_before_the_synthesis_finishes(cache):
+    segments = split_segments(TEXT, first_chars=80, max_chars=200)
+    client = StandInTTSClient(first_byte=0.05, per_chunk=0.01, first_byte_per_char=0)
+    started = time.perf_counter()
+    stream = pipelined_audio(client, cache, segments, *ARGS, ahead=2)
+
+    next(stream)
+    first_audio = time.perf_counter() - started
+    for _ in stream:
+        pass
+    total = time.perf_counter() - started
+
+    assert first_audio < total / 3
+
+
+def test_closing_the_stream_cancels_segments_not_yet_started(cache):
+    segments = split_segments(TEXT, first_chars=80, max_chars=200)
+    assert len(segments) > 3
+    client = SlowHeadClient(segments, per_chunk=0, first_byte_per_char=0)
+
+    stream = pipelined_audio(client, cache, segments, *ARGS, ahead=2)
+    next(stream)
+    stream.close()
+    time.sleep(0.5)
+
+    # Only the window that was in flight was synthesized, and it was cached
+    assert client.started == segments[:2]
+    for segment in segments[:2]:
+        assert cache.lookup(cache_key(segment), ARGS[2])
+    assert cache.lookup(cache_key(segments[2]), ARGS[2]) is None
+
+
+def test_metrics_time_the_first_byte_and_the_whole_stream(cache):
+    segments = split_segments(TEXT, first_chars=80, max_chars=200)
+    client = StandInTTSClient(first_byte=0.02, per_chunk=0.005, first_byte_per_char=0)
+    metrics = TTSMetrics()
+    record = metrics.start("pipeline", len(TEXT), len(segments))
+
+    for _ in metrics.observe(record, pipelined_audio(client, cache, segments, *ARGS,
+                                                    metrics=metrics, record=record)):
+        pass
+
+    summary = metrics.get(record["request_id"])
+    assert summary["state"] == "done"
+    assert 0 < summary["ttfb_ms"] < summary["total_ms"]
+    assert summary["bytes"] == len(_expected(segments))
+    assert metrics.stats()["pipeline"]["requests"] == 1
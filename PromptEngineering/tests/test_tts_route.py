@@ -0,0 +1,87 @@
+# /tts end to end through the Flask test client, with the offline stand-in
+# instead of ElevenLabs. Needs the app's full dependencies (and API_KEY.py).
+from urllib.parse import quote
+
+import pytest
+
+from tts_cache import StandInTTSClient, TTSCache, tts_key
+
+app_module = pytest.importorskip("app")
+
+VOICE = "21m00Tcm4TlvDq8ikWAM"
+MODEL = "eleven_multilingual_v2"
+FORMAT = "mp3_22050_32"
+LONG_TEXT = " ".join(f"Run {i} reaches {90 + i / 10:.1f} percent accuracy on the held-out set. "
+                     f"Ablation {i} shows that retrieval accounts for most of the gain." for i in range(8))
+
+
+@pytest.fixture
+def tts(tmp_path, monkeypatch):
+    cache = TTSCache(cache_dir=str(tmp_path / "tts"), max_bytes=64 * 1024 * 1024)
+    client = StandInTTSClient(first_byte=0, per_chunk=0, first_byte_per_char=0)
+    monkeypatch.setattr(app_module, "get_tts_cache", lambda: cache)
+    monkeypatch.setattr(app_module, "tts_client", lambda: client)
+    return app_module.app.test_client(), client
+
+
+def _get(test_client, text, **params):
+    """GET /tts and read the whole body, so a streamed miss has reached the cache."""
+    query = "".join(f"&{k}={v}" for k, v in params.items())
+    response = test_client.get(f"/tts?text={quote(text)}{query}")
+    response.get_data()
+    return response
+
+
+def test_miss_streams_and_replay_is_a_hit_with_a_strong_etag(tts):
+    test_client, client = tts
+    first = _get(test_client, "Hello there.")
+    assert first.status_code == 200
+    assert first.headers["X-TTS-Cache"] == "miss"
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = _get(test_client, "Hello there.")
+
+    assert again.status_code == 200
+    assert again.headers["X-TTS-Cache"] == "hit"
+    assert again.headers["ETag"] == f'"{tts_key("Hello there.", VOICE, MODEL, FORMAT)}"'
+    assert again.data == first.data
+    assert client.calls == 1
+
+
+def test_if_none_match_answers_304(tts):
+    test_client, _ = tts
+    _get(test_client, "Hello there.")
+    etag = _get(test_client, "Hello there.").headers["ETag"]
+
+    response = test_client.get(f"/tts?text={quote('Hello there.')}", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_range_answers_206_with_content_range(tts):
+    test_client, _ = tts
+    full = _get(test_client, "Hello there.").data
+
+    response = test_client.get(f"/tts?text={quote('Hello there.')}", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(full)}"
+    assert response.data == full[100:200]
+
+
+def test_pipelined_clip_is_cached_under_the_whole_text(tts):
+    test_client, client = tts
+    first = _get(test_client, LONG_TEXT, pipeline=1)
+    assert first.headers["X-TTS-Mode"] == "pipeline"
+    segments = int(first.headers["X-TTS-Segments"])
+    assert client.calls == segments > 1
+
+    again = _get(test_client, LONG_TEXT, pipeline=1)
+
+    assert again.headers["X-TTS-Cache"] == "hit"
+    assert again.headers["ETag"] == f'"{tts_key(LONG_TEXT, VOICE, MODEL, FORMAT)}"'
+    assert again.data == first.data
+    assert client.calls == segments
+    ranged = test_client.get(f"/tts?text={quote(LONG_TEXT)}&pipeline=1", headers={"Range": "bytes=0-9"})
+    assert ranged.status_code == 206 and ranged.data == first.data[:10]
@@ -0,0 +1,183 @@
+# tts_cache.py
+# Content-addressed cache of synthesized speech.
+#
+# key = sha256(text, voice_id, model_id, output_format)
+# file = TTS_CACHE_DIR/<key>.<ext>
+#
+# A miss streams the TTS provider's audio to the client and tees every chunk
+# into a part file (finished in the background if the client leaves early);
+# only a stream that ran to the end is renamed into place, so a cached file
+# is always a complete clip. Hits are plain files, served
+# with a strong ETag (the key) and Range support. Audio has its own byte
+# quota (a separate DiskCacheManager index), so replaying answers can never
+# evict the PDFs and parsed artifacts people are reading.
+import hashlib
+import logging
+import os
+import threading
+import time
+from uuid import uuid4
+
+from disk_cache import DiskCacheManager
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join("cache", "tts"))
+TTS_CACHE_MAX_MB = float(os.environ.get("TTS_CACHE_MAX_MB", "512"))
+
+
+def tts_key(text: str, voice_id: str, model_id: str, output_format: str) -> str:
+    h = hashlib.sha256()
+    for part in (text, voice_id, model_id, output_format):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _extension(output_format: str) -> str:
+    # ElevenLabs formats look like "mp3_22050_32" or "pcm_16000"
+    return (output_format or "mp3").split("_", 1)[0]
+
+
+class TTSCache:
+    """Audio files bounded by total bytes, least recently played evicted first."""
+
+    def __init__(self, cache_dir: str = TTS_CACHE_DIR, max_bytes: int = int(TTS_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.aborted = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._files = DiskCacheManager(index_path=os.path.join(cache_dir, "index.sqlite"), max_bytes=max_bytes)
+
+    def path_for(self, key: str, output_format: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{_extension(output_format)}")
+
+    def lookup(self, key: str, output_format: str):
+        """Path of the cached clip (marking it recently played), or None."""
+        path = self.path_for(key, output_format)
+        if os.path.exists(path):
+            self._files.touch(path)
+            with self._lock:
+                self.hits += 1
+            return path
+        # Evicted or deleted behind the index's back
+        self._files.forget(path)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def tee(self, key: str, output_format: str, chunks):
+        """
+        Yield `chunks` unchanged while writing them to disk; the clip is
+        cached once the provider's stream is exhausted. A client that goes
+        away early does not waste the synthesis: the rest of the stream is
+        drained into the file on a background thread. A provider error
+        drops the partial file.
+        """
+        path = self.path_for(key, output_format)
+        part = f"{path}.{uuid4().hex[:8]}.part"
+        started = time.perf_counter()
+        f = open(part, "wb")
+        rest = iter(chunks)
+        try:
+            for chunk in rest:
+                if chunk:
+                    f.write(chunk)
+                    yield chunk
+        except GeneratorExit:
+            threading.Thread(target=self._finish, args=(key, f, rest, part, path, started),
+                             name="tts-drain", daemon=True).start()
+            raise
+        except Exception:
+            self._drop(f, part)
+            raise
+        self._finish(key, f, iter(()), part, path, started)
+
+    def _finish(self, key: str, f, rest, part: str, path: str, started: float) -> None:
+        try:
+            with f:
+                for chunk in rest:
+                    if chunk:
+                        f.write(chunk)
+            os.replace(part, path)
+        except Exception:
+            logging.exception(f"TTS clip {key[:12]} could not be completed")
+            self._drop(f, part)
+            return
+        self._files.track(path, kind="tts")
+        with self._lock:
+            self.stored += 1
+        logging.info(f"🔊 Cached TTS clip {key[:12]} ({os.path.getsize(path)} bytes, "
+                     f"{time.perf_counter() - started:.1f}s)")
+
+    def _drop(self, f, part: str) -> None:
+        with self._lock:
+            self.aborted += 1
+        f.close()
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        files = self._files.stats()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "aborted": self.aborted,
+                "files": files["files"],
+                "bytes": files["bytes"],
+                "max_bytes": files["max_bytes"],
+                "evictions": files["evictions"],
+            }
+
+
+class StandInTTSClient:
+    """
+    Offline stand-in for ElevenLabs(...): `text_to_speech.convert(...)`
+    waits `first_byte` seconds plus `first_byte_per_char` per character of
+    text (providers start later on longer inputs), then yields
+    deterministic bytes (a function of the request) in `chunk_size` pieces,
+    `per_chunk` seconds apart.
+    Enable in the app with TTS_CLIENT=standin.
+    """
+
+    def __init__(self, first_byte: float = 0.3, per_chunk: float = 0.01, chunk_size: int = 4096,
+                 bytes_per_char: int = 120, first_byte_per_char: float = 0.0005):
+        self.text_to_speech = self
+        self.first_byte = first_byte
+        self.first_byte_per_char = first_byte_per_char
+        self.per_chunk = per_chunk
+        self.chunk_size = chunk_size
+        self.bytes_per_char = bytes_per_char
+        self.calls = 0
+
+    def convert(self, voice_id: str, model_id: str, text: str, output_format: str = "mp3_22050_32", **kwargs):
+        self.calls += 1
+        seed = hashlib.sha256(tts_key(text, voice_id, model_id, output_format).encode("ascii")).digest()
+        total = max(1, len(text)) * self.bytes_per_char
+
+        def generate():
+            time.sleep(self.first_byte + self.first_byte_per_char * len(text))
+            for start in range(0, total, self.chunk_size):
+                size = min(self.chunk_size, total - start)
+                yield (seed * (size // len(seed) + 1))[:size]
+                time.sleep(self.per_chunk)
+
+        return generate()
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    """Process-wide cache instance."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = TTSCache()
+        return _shared_cache
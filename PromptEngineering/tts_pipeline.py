@@ -0,0 +1,252 @@
+# tts_pipeline.py
+# Sentence-pipelined speech synthesis for long texts.
+#
+# One convert() call on a whole paragraph makes the listener wait for the
+# provider to start on all of it. Instead the text is split into sentence
+# groups (a short first group, so first audio comes quickly), up to
+# TTS_PIPELINE_AHEAD groups are synthesized concurrently, and their MP3
+# segments are streamed strictly in order as one audio/mpeg response. The
+# head segment is forwarded chunk by chunk as it arrives; the ones behind
+# it are buffered until their turn. MP3 is a sequence of independent
+# frames, so the concatenation plays as one clip.
+#
+# Every segment is cached on its own (tts_cache, keyed by the segment's
+# text), so another text sharing sentences is served from disk; /tts also
+# caches the stitched clip under the whole text's key, so a replay is a
+# plain file hit with ETag and Range.
+#
+# Each /tts request gets a metrics record (time to first byte, total time,
+# segment hits/misses), kept for the last TTS_METRICS_HISTORY requests.
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from tts_cache import tts_key
+
+# auto: pipeline texts longer than TTS_PIPELINE_MIN_CHARS
+TTS_PIPELINE_MODE = os.environ.get("TTS_PIPELINE_MODE", "auto").strip().lower()
+TTS_PIPELINE_MIN_CHARS = int(os.environ.get("TTS_PIPELINE_MIN_CHARS", "300"))
+# Segments synthesized at once per request (the head plus those behind it)
+TTS_PIPELINE_AHEAD = int(os.environ.get("TTS_PIPELINE_AHEAD", "3"))
+# Characters in the first segment (first audio) and in the ones after it
+TTS_FIRST_SEGMENT_CHARS = int(os.environ.get("TTS_FIRST_SEGMENT_CHARS", "160"))
+TTS_SEGMENT_CHARS = int(os.environ.get("TTS_SEGMENT_CHARS", "400"))
+TTS_METRICS_HISTORY = 256
+
+# Sentence ends: Latin punctuation and the Devanagari danda, then whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?।॥])[\"'”’)\]]*\s+|\n\s*\n")
+
+
+def use_pipeline(text: str, requested=None) -> bool:
+    """Whether to synthesize `text` in segments; `requested` (a request flag) overrides the mode."""
+    if requested is not None:
+        return bool(requested)
+    if TTS_PIPELINE_MODE == "single":
+        return False
+    if TTS_PIPELINE_MODE == "pipeline":
+        return True
+    return len(text) > TTS_PIPELINE_MIN_CHARS
+
+
+def _split_long(sentence: str, limit: int) -> list:
+    """Cut an over-long sentence at the last comma (else space) before `limit`."""
+    parts = []
+    while len(sentence) > limit:
+        cut = max(sentence.rfind(", ", 0, limit), sentence.rfind("; ", 0, limit))
+        if cut <= 0:
+            cut = sentence.rfind(" ", 0, limit)
+        cut = cut + 1 if cut > 0 else limit
+        parts.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    if sentence:
+        parts.append(sentence)
+    return parts
+
+
+def split_segments(text: str, first_chars: int = TTS_FIRST_SEGMENT_CHARS,
+                   max_chars: int = TTS_SEGMENT_CHARS) -> list:
+    """
+    Group whole sentences into segments of at most `max_chars` (the first
+    at most `first_chars`). Segment boundaries depend only on the text, so
+    the same text always maps to the same cached segments.
+    """
+    sentences = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = " ".join(sentence.split())
+        if sentence:
+            sentences.extend(_split_long(sentence, max_chars))
+
+    segments, current = [], ""
+    for sentence in sentences:
+        limit = first_chars if not segments else max_chars
+        if current and len(current) + 1 + len(sentence) > limit:
+            segments.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+class TTSMetrics:
+    """Per-request timings for /tts, most recent first out of a bounded history."""
+
+    def __init__(self, history: int = TTS_METRICS_HISTORY):
+        self.history = history
+        self._records = OrderedDict()    # request_id -> record
+        self._lock = threading.Lock()
+
+    def start(self, mode: str, chars: int, segments: int = 1) -> dict:
+        record = {
+            "request_id": uuid4().hex[:12],
+            "mode": mode,                # hit | single | pipeline
+            "chars": chars,
+            "segments": segments,
+            "segment_hits": 0,
+            "segment_misses": 0,
+            "bytes": 0,
+            "ttfb_ms": None,
+            "total_ms": None,
+            "state": "running",          # running | done | aborted | failed
+            "started_at": time.time(),
+            "_t0": time.perf_counter(),
+        }
+        with self._lock:
+            self._records[record["request_id"]] = record
+            while len(self._records) > self.history:
+                self._records.popitem(last=False)
+        return record
+
+    def count(self, record: dict, field: str, n: int = 1) -> None:
+        """Add to a counter of `record`; segment workers update it concurrently."""
+        with self._lock:
+            record[field] += n
+
+    @staticmethod
+    def first_byte(record: dict) -> None:
+        if record["ttfb_ms"] is None:
+            record["ttfb_ms"] = round((time.perf_counter() - record["_t0"]) * 1000, 1)
+
+    def finish(self, record: dict, state: str = "done") -> None:
+        record["state"] = state
+        record["total_ms"] = round((time.perf_counter() - record["_t0"]) * 1000, 1)
+        level = logging.INFO if state == "done" else logging.WARNING
+        logging.log(level, f"🔊 TTS {record['request_id']} {record['mode']} {state}: "
+                           f"first byte {record['ttfb_ms']} ms, total {record['total_ms']} ms, "
+                           f"{record['segments']} segment(s), {record['segment_hits']} cached")
+
+    def observe(self, record: dict, chunks):
+        """Yield `chunks` unchanged, timing the first one and the end of the stream."""
+        try:
+            for chunk in chunks:
+                self.first_byte(record)
+                self.count(record, "bytes", len(chunk))
+                yield chunk
+        except GeneratorExit:
+            self.finish(record, "aborted")
+            raise
+        except Exception:
+            self.finish(record, "failed")
+            raise
+        self.finish(record)
+
+    def get(self, request_id: str):
+        with self._lock:
+            record = self._records.get(request_id)
+            return {k: v for k, v in record.items() if not k.startswith("_")} if record else None
+
+    def stats(self) -> dict:
+        """Median and p95 time to first byte per mode over the finished requests in the history."""
+        with self._lock:
+            done = [r for r in self._records.values() if r["state"] == "done" and r["ttfb_ms"] is not None]
+        summary = {"requests": len(done)}
+        for mode in ("hit", "single", "pipeline"):
+            ttfb = sorted(r["ttfb_ms"] for r in done if r["mode"] == mode)
+            total = sorted(r["total_ms"] for r in done if r["mode"] == mode)
+            if ttfb:
+                summary[mode] = {
+                    "requests": len(ttfb),
+                    "ttfb_p50_ms": ttfb[len(ttfb) // 2],
+                    "ttfb_p95_ms": ttfb[min(len(ttfb) - 1, int(len(ttfb) * 0.95))],
+                    "total_p50_ms": total[len(total) // 2],
+                }
+        return summary
+
+
+_END = object()
+
+
+def pipelined_audio(client, cache, segments: list, voice_id: str, model_id: str, output_format: str,
+                    metrics: TTSMetrics = None, record: dict = None, ahead: int = TTS_PIPELINE_AHEAD):
+    """
+    Yield the audio of `segments` in order. Cached segments are read from
+    disk; missing ones are synthesized, at most `ahead` at a time, and
+    tee'd into the cache. Closing the generator early cancels the segments
+    not yet started; those already being synthesized finish into the cache.
+    Segment hits and misses are counted on `record` through `metrics`.
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, ahead), thread_name_prefix="tts-segment")
+    queues = []
+
+    def synthesize(segment: str, out: queue.Queue) -> None:
+        key = tts_key(segment, voice_id, model_id, output_format)
+        try:
+            path = cache.lookup(key, output_format)
+            if path:
+                if record is not None:
+                    metrics.count(record, "segment_hits")
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(16384), b""):
+                        out.put(chunk)
+            else:
+                if record is not None:
+                    metrics.count(record, "segment_misses")
+                stream = client.text_to_speech.convert(voice_id=voice_id, model_id=model_id, text=segment,
+                                                       output_format=output_format)
+                for chunk in cache.tee(key, output_format, stream):
+                    out.put(chunk)
+            out.put(_END)
+        except Exception as e:
+            out.put(e)
+
+    def submit(index: int) -> None:
+        out = queue.Queue()
+        queues.append(out)
+        pool.submit(synthesize, segments[index], out)
+
+    try:
+        for index in range(min(len(segments), max(1, ahead))):
+            submit(index)
+        for index in range(len(segments)):
+            out = queues[index]
+            while True:
+                item = out.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            # The head is done: start the next segment in the window
+            if len(queues) < len(segments):
+                submit(len(queues))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+_shared_metrics = None
+_shared_lock = threading.Lock()
+
+
+def get_tts_metrics() -> TTSMetrics:
+    """Process-wide metrics instance."""
+    global _shared_metrics
+    with _shared_lock:
+        if _shared_metrics is None:
+            _shared_metrics = TTSMetrics()
+        return _shared_metrics
@@ -0,0 +1,123 @@
+# vector_index.py
+# In-process vector index for single papers, a drop-in for the subset of the
+# Chroma collection API that rag.py uses: add / query / get / count.
+import threading
+
+import numpy as np
+
+
+class NumpyVectorIndex:
+    """
+    Embeddings live in one contiguous matrix, stored as float16 or as int8
+    with a per-row scale. A query is one matrix-vector product followed by
+    argpartition. Distances are squared L2, matching Chroma's default space,
+    so callers can treat both backends the same.
+    """
+
+    def __init__(self, embedding_function, dtype: str = "float16", capacity: int = 256):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported dtype {dtype!r}; use 'float16' or 'int8'")
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self._capacity = capacity
+        self._matrix = None           # (capacity, dim) float16 or int8
+        self._scales = None           # (capacity,) float32, int8 only
+        self._sq_norms = None         # (capacity,) float32, of the dequantized rows
+        self._n = 0
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._positions = {}          # id -> row
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        return self._n
+
+    def _grow(self, dim: int, needed: int) -> None:
+        if self._matrix is None:
+            cap = max(self._capacity, needed)
+            self._matrix = np.zeros((cap, dim), dtype=np.int8 if self.dtype == "int8" else np.float16)
+            self._scales = np.ones(cap, dtype=np.float32)
+            self._sq_norms = np.zeros(cap, dtype=np.float32)
+            return
+        cap = self._matrix.shape[0]
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        for attr in ("_matrix", "_scales", "_sq_norms"):
+            old = getattr(self, attr)
+            new = np.zeros((cap,) + old.shape[1:], dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, attr, new)
+
+    def _quantize(self, vectors: np.ndarray):
+        """Return (stored rows, per-row scales, dequantized rows)."""
+        if self.dtype == "float16":
+            rows = vectors.astype(np.float16)
+            return rows, np.ones(len(vectors), dtype=np.float32), rows.astype(np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        rows = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return rows, scales.astype(np.float32), rows.astype(np.float32) * scales[:, None]
+
+    def add(self, documents: list, metadatas: list = None, ids: list = None, embeddings=None) -> None:
+        if not documents:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        metadatas = metadatas or [{} for _ in documents]
+        with self._lock:
+            ids = ids or [str(self._n + i) for i in range(len(documents))]
+            self._grow(vectors.shape[1], self._n + len(documents))
+            rows, scales, approx = self._quantize(vectors)
+            start, end = self._n, self._n + len(documents)
+            self._matrix[start:end] = rows
+            self._scales[start:end] = scales
+            self._sq_norms[start:end] = np.einsum("ij,ij->i", approx, approx)
+            for offset, doc_id in enumerate(ids):
+                self._positions[doc_id] = start + offset
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            self._n = end
+
+    def query(self, query_texts: list = None, n_results: int = 10, query_embeddings=None, include=None) -> dict:
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            n = self._n
+            for q in np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1):
+                if not n:
+                    for key in out:
+                        out[key].append([])
+                    continue
+                dots = self._matrix[:n] @ q
+                if self.dtype == "int8":
+                    dots *= self._scales[:n]
+                dist = self._sq_norms[:n] - 2.0 * dots + float(q @ q)
+                k = min(n_results, n)
+                top = np.argpartition(dist, k - 1)[:k]
+                top = top[np.argsort(dist[top])]
+                out["ids"].append([self._ids[i] for i in top])
+                out["documents"].append([self._documents[i] for i in top])
+                out["metadatas"].append([self._metadatas[i] for i in top])
+                out["distances"].append([float(max(dist[i], 0.0)) for i in top])
+        return out
+
+    def get(self, ids: list = None, include=None) -> dict:
+        with self._lock:
+            rows = range(self._n) if ids is None else [self._positions[i] for i in ids if i in self._positions]
+            return {
+                "ids": [self._ids[r] for r in rows],
+                "documents": [self._documents[r] for r in rows],
+                "metadatas": [self._metadatas[r] for r in rows],
+            }
+
+    def nbytes(self) -> int:
+        if self._matrix is None:
+            return 0
+        return (self._matrix.nbytes + self._scales.nbytes + self._sq_norms.nbytes
+                + sum(len(d.encode("utf-8")) for d in self._documents))
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from "react";
 import { Brain, FileText, Link, ChevronRight, ChevronDown, Loader2, AlertCircle } from "lucide-react";
 import "./MindMap.css";
+import { sessionHeaders } from "../session";
 
 const MindMap = ({ pdfUrl }) => {
   const [mindMapData, setMindMapData] = useState(null);
@@ -16,6 +17,51 @@ const MindMap = ({ pdfUrl }) => {
   const svgRef = useRef(null);
   const containerRef = useRef(null);
 
+  // Read the server-sent events of /generate-mindmap?stream=1, drawing the
+  // root and each node as it arrives; resolves with the final "done" payload
+  const readMindMapStream = async (response) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let result = { error: "Mind map stream ended unexpectedly" };
+
+    const handle = (event, payload) => {
+      if (event === "root") {
+        setMindMapData(payload);
+        setExpandedNodes(new Set([payload.id]));
+        setLoading(false);
+      } else if (event === "node") {
+        setMindMapData(prev => prev && { ...prev, children: [...(prev.children || []), payload] });
+        setExpandedNodes(prev => (prev.size < 5 ? new Set([...prev, payload.id]) : prev));
+      } else if (event === "skipped") {
+        console.warn("Mind map node skipped:", payload);
+      } else if (event === "done") {
+        result = payload;
+      } else if (event === "error") {
+        result = { error: payload.error };
+      }
+    };
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = "message";
+        let payload = "";
+        block.split("\n").forEach(line => {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) payload += line.slice(5).trim();
+        });
+        if (payload) handle(event, JSON.parse(payload));
+      }
+    }
+    return result;
+  };
+
   // Generate mind map data from research paper
   const generateMindMap = async () => {
     setLoading(true);
@@ -23,7 +69,7 @@ const MindMap = ({ pdfUrl }) => {
     
     try {
       // First check if PDF is loaded
-      const testResponse = await fetch("https://vani-backend-311709302102.europe-west1.run.app/test-mindmap");
+      const testResponse = await fetch("https://vani-backend-311709302102.europe-west1.run.app/test-mindmap", { headers: sessionHeaders() });
       const testData = await testResponse.json();
       
       if (!testData.pdf_exists) {
@@ -33,11 +79,13 @@ const MindMap = ({ pdfUrl }) => {
       
       console.log("PDF status:", testData);
       
-      const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/generate-mindmap", {
+      // Streamed: the root and each node arrive as soon as the model writes them
+      const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/generate-mindmap?stream=1", {
         method: "POST",
-        headers: {
+        headers: sessionHeaders({
           "Content-Type": "application/json",
-        },
+          "Accept": "text/event-stream",
+        }),
         body: JSON.stringify({ pdfUrl }),
       });
 
@@ -45,7 +93,9 @@ const MindMap = ({ pdfUrl }) => {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
+      const data = (response.headers.get("Content-Type") || "").includes("text/event-stream")
+        ? await readMindMapStream(response)
+        : await response.json();
       console.log("Mind map response:", data);
       
       if (data.mindMap) {
@@ -382,7 +432,7 @@ const MindMap = ({ pdfUrl }) => {
           <button
             onClick={async () => {
               try {
-                const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/test-mindmap");
+                const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/test-mindmap", { headers: sessionHeaders() });
                 const data = await response.json();
                 console.log("Debug info:", data);
                 alert(`PDF Status: ${data.pdf_exists ? 'Loaded' : 'Not loaded'}\nPath: ${data.pdf_path || 'None'}`);
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from "react";
 import { MessageSquare, FileText, Send, Loader2, AlertCircle, Mic, Square, Share2 } from "lucide-react";
 import "./PDFViewer.css";
 import { useLanguage } from "../lang/LanguageContext";
+import { sessionHeaders, withSession } from "../session";
 
 const PDFViewer = () => {
   const [activeTab, setActiveTab] = useState("analysis");
@@ -67,7 +68,7 @@ const PDFViewer = () => {
 
   const { t, language } = useLanguage();
   // PDF URL from backend
-  const pdfUrl = "https://vani-backend-311709302102.europe-west1.run.app/pdf";
+  const pdfUrl = withSession("https://vani-backend-311709302102.europe-west1.run.app/pdf");
   const pageNumberToDivRef = useRef(new Map());
   const [currentPage, setCurrentPage] = useState(1);
   const [totalPages, setTotalPages] = useState(0);
@@ -111,7 +112,7 @@ const PDFViewer = () => {
 
         // First check if backend is responding
         try {
-          const healthCheck = await fetch("https://vani-backend-311709302102.europe-west1.run.app/pdf", { method: "HEAD" });
+          const healthCheck = await fetch(pdfUrl, { method: "HEAD" });
           if (healthCheck.status === 202) {
             setError("Backend is still loading the PDF. Please wait a moment and refresh the page.");
             return;
@@ -259,9 +260,9 @@ const PDFViewer = () => {
     try {
       const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/process-selection", {
         method: "POST",
-        headers: {
+        headers: sessionHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify({ text }),
       });
 
@@ -285,7 +286,7 @@ const PDFViewer = () => {
       setMindmapError("");
       const res = await fetch("https://vani-backend-311709302102.europe-west1.run.app/mindmap", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: sessionHeaders({ "Content-Type": "application/json" }),
         body: JSON.stringify({ text })
       });
       const data = await res.json();
@@ -446,7 +447,7 @@ document.getElementById('fs').onclick = () => {
         setMindmapError("");
         const res = await fetch("https://vani-backend-311709302102.europe-west1.run.app/mindmap", {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: sessionHeaders({ "Content-Type": "application/json" }),
           body: JSON.stringify({ scope: 'document' })
         });
         const data = await res.json();
@@ -550,6 +551,7 @@ document.getElementById('fs').onclick = () => {
 
       const res = await fetch("https://vani-backend-311709302102.europe-west1.run.app/transcribe", {
         method: "POST",
+        headers: sessionHeaders(),
         body: form,
       });
       const data = await res.json();
@@ -581,6 +583,7 @@ document.getElementById('fs').onclick = () => {
 
       const res = await fetch("https://vani-backend-311709302102.europe-west1.run.app/transcribe", {
         method: "POST",
+        headers: sessionHeaders(),
         body: form,
       });
       const data = await res.json();
@@ -858,9 +861,9 @@ document.getElementById('fs').onclick = () => {
     try {
       const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/ask", {
         method: "POST",
-        headers: {
+        headers: sessionHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify({ question: trimmed }),
       });
       const data = await response.json();
@@ -919,9 +922,9 @@ document.getElementById('fs').onclick = () => {
     try {
       const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/ask-hindi", {
         method: "POST",
-        headers: {
+        headers: sessionHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify({ question_hi: trimmed }),
       });
       const data = await response.json();
@@ -1017,7 +1020,7 @@ document.getElementById('fs').onclick = () => {
       }
 
       // Stream via GET to allow faster start (browser can stream progressively)
-      const url = `https://vani-backend-311709302102.europe-west1.run.app/tts?` + new URLSearchParams({ text });
+      const url = withSession(`https://vani-backend-311709302102.europe-west1.run.app/tts?` + new URLSearchParams({ text }));
       // Set src directly for progressive playback
       audioRef.current.src = url;
       // When playback ends, resume Podcast Mode if it was active
@@ -3,6 +3,7 @@ import { useNavigate } from "react-router-dom";
 import { ExternalLink, FileText, Calendar, User, Loader2 } from "lucide-react";
 import "./ResearchPapers.css";
 import { useLanguage } from "../lang/LanguageContext";
+import { sessionHeaders } from "../session";
 
 const ResearchPapers = () => {
   const [results, setResults] = useState([]);
@@ -27,6 +28,31 @@ const ResearchPapers = () => {
     }
   }, [navigate]);
 
+  const waitForLoadJob = async (jobId) => {
+    // A poll can land on a worker or instance that has not seen the job
+    // yet (404) or be briefly unavailable (5xx); retry those for a while
+    let misses = 0;
+    while (true) {
+      const res = await fetch(`https://vani-backend-311709302102.europe-west1.run.app/load-jobs/${jobId}`, { headers: sessionHeaders() });
+      if (!res.ok) {
+        if ((res.status === 404 || res.status >= 500) && ++misses <= 20) {
+          await new Promise((resolve) => setTimeout(resolve, 500));
+          continue;
+        }
+        throw new Error("Failed to check PDF load status");
+      }
+      misses = 0;
+      const job = await res.json();
+      if (job.state === "failed" || job.state === "cancelled") {
+        throw new Error(job.error || `PDF load ${job.state}`);
+      }
+      if (job.ready) {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 500));
+    }
+  };
+
   const handlePaperClick = async (paper) => {
     setLoading(true);
     setError("");
@@ -35,18 +61,18 @@ const ResearchPapers = () => {
       // Step 1: Log the click
       await fetch("https://vani-backend-311709302102.europe-west1.run.app/log-click", {
         method: "POST",
-        headers: {
+        headers: sessionHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify(paper),
       });
 
       // Step 2: Update PDF and reload model
       const updateResponse = await fetch("https://vani-backend-311709302102.europe-west1.run.app/update-pdf", {
         method: "POST",
-        headers: {
+        headers: sessionHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify({ link: paper.url }),
       });
 
@@ -54,7 +80,13 @@ const ResearchPapers = () => {
         throw new Error("Failed to update PDF");
       }
 
-      // Step 3: Navigate to PDF viewer
+      // Step 3: The backend loads in the background (202); wait until searchable
+      if (updateResponse.status === 202) {
+        const { job_id } = await updateResponse.json();
+        await waitForLoadJob(job_id);
+      }
+
+      // Step 4: Navigate to PDF viewer
       navigate("/pdf-viewer");
     } catch (error) {
       console.error("Error during click or PDF update:", error);
@@ -3,6 +3,7 @@ import { useNavigate } from "react-router-dom";
 import { Search, Loader2, Mic, MicOff, Square } from "lucide-react";
 import "./SearchBar.css";
 import { useLanguage } from "../lang/LanguageContext";
+import { sessionHeaders } from "../session";
 
 const SearchBar = ({ showMic = true }) => {
   const { t, language } = useLanguage();
@@ -50,9 +51,9 @@ const SearchBar = ({ showMic = true }) => {
     try {
       const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/search", {
         method: "POST",
-        headers: {
+        headers: sessionHeaders({
           "Content-Type": "application/json",
-        },
+        }),
         body: JSON.stringify({ searchTerm: queryToUse.trim() }),
       });
 
@@ -157,6 +158,7 @@ const SearchBar = ({ showMic = true }) => {
 
       const response = await fetch("https://vani-backend-311709302102.europe-west1.run.app/transcribe", {
         method: "POST",
+        headers: sessionHeaders(),
         body: formData,
       });
 
@@ -0,0 +1,26 @@
+// Per-tab session id. The backend keeps each client's open paper under this
+// id, so every request to it carries the id: as an X-Session-Id header on
+// fetches, or as ?session= on URLs the browser loads itself (audio, PDF).
+const SESSION_KEY = "vaniSessionId";
+
+const newSessionId = () => {
+  if (window.crypto && typeof window.crypto.randomUUID === "function") {
+    return window.crypto.randomUUID();
+  }
+  const bytes = window.crypto.getRandomValues(new Uint8Array(16));
+  return Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+};
+
+export const getSessionId = () => {
+  let id = sessionStorage.getItem(SESSION_KEY);
+  if (!id) {
+    id = newSessionId();
+    sessionStorage.setItem(SESSION_KEY, id);
+  }
+  return id;
+};
+
+export const sessionHeaders = (headers = {}) => ({ ...headers, "X-Session-Id": getSessionId() });
+
+export const withSession = (url) =>
+  `${url}${url.includes("?") ? "&" : "?"}session=${encodeURIComponent(getSessionId())}`;